@@ -1,92 +1,209 @@
-from flask import Flask, request, jsonify, render_template
+from dotenv import load_dotenv
+
+# Load .env before the project modules, which read their settings at import
+load_dotenv()
+
+from flask import Flask, Response, g, request, jsonify, render_template, stream_with_context
 from flask_cors import CORS
 from html_parser import process_url
-import google.generativeai as genai
+from recipe_cache import get_recipe_cache
+from batch_ingest import ingest_urls, MAX_BATCH_URLS
+from session_store import SessionManager, make_session_backend
+from recipe_store import RecipeStore
+from recipe_index import get_recipe_index
+from recipe_context import get_atomized_steps, build_seed_history, peek_atomized_steps
+from model_client import get_model_client
+from intent_router import answer_locally, router_stats
+from response_cache import cached_response, get_response_cache, store_response
+from single_flight import flight_stats
+from metrics import begin_request, end_request, inc, observe, record_usage, registry, render_metrics, span, timed
 import json
 import os
-from dotenv import load_dotenv
-
-load_dotenv()
+import time
+from collections import deque
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for frontend
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-GEMINI_MODEL = "gemini-2.5-flash-lite"
-
-# Global state to store parsed recipe data
-recipe_data = {
-    'recipe': None,
-    'url': None
-}
+# Parsed recipes keyed by recipe id; identical recipes share one immutable object
+recipes = RecipeStore()
 
-# Store chat sessions per session (simplified - in production use proper sessions)
-chat_sessions = {}
+# Chat sessions keyed by client-supplied session_id and recipe id, bounded by count,
+# idle TTL and history bytes (see session_store for the SESSION_* settings and backends).
+# Each session_id is also bound to the recipe it last parsed.
+chat_sessions = SessionManager(backend=make_session_backend())
 
 
-def create_chat_session(recipe_data):
+def resolve_recipe(data):
     """
-    Create a new Gemini chat session with recipe context.
-    
+    Finds the session and recipe a request is about.
+
+    Uses the request's recipe_id if given (and binds the session to it),
+    otherwise the recipe the session is bound to.
+
     Args:
-        recipe_data: Dict with 'ingredients' and 'instructions' keys
-    
+        data: Request JSON
+
     Returns:
-        chat session object
+        (session_id, ParsedRecipe or None)
     """
-    # Configure Gemini API
-    genai.configure(api_key=GEMINI_API_KEY)
-    model = genai.GenerativeModel(GEMINI_MODEL)
-    
-        # Create initial system-like message with recipe context
-    initial_prompt = f"""
-You are a helpful cooking assistant with conversation memory. You can help users navigate through a recipe step-by-step.
+    session_id = data.get('session_id', 'default')  # Use session_id to track different users
+    recipe_id = data.get('recipe_id')
+    if recipe_id:
+        recipe = recipes.get(recipe_id)
+        if recipe is not None and chat_sessions.bound_recipe(session_id) != recipe_id:
+            chat_sessions.bind(session_id, recipe_id)
+        return session_id, recipe
+    return session_id, recipes.get(chat_sessions.bound_recipe(session_id))
+
+
+def chat_key(session_id, recipe):
+    """Chats are per (session, recipe), so switching recipes never reuses the old context."""
+    return f"{session_id}:{recipe.recipe_id}"
+
+
+def get_chat(session_id, recipe):
+    """Get or create the chat session for a session's recipe."""
+    return chat_sessions.get_or_create(
+        chat_key(session_id, recipe),
+        lambda history: create_chat_session(recipe.as_dict(), history, recipe.recipe_id)
+    )
+
+# Latency of the most recent streamed queries (time to first token and total)
+QUERY_METRICS_WINDOW = int(os.getenv("QUERY_METRICS_WINDOW", 500))
+query_metrics = deque(maxlen=QUERY_METRICS_WINDOW)
+
+
+def sse_event(data, event=None):
+    """Formats a dict as one Server-Sent Events frame."""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data)}\n\n"
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (None if empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def streaming_stats():
+    """Summary of time-to-first-token and total latency over recent streamed queries."""
+    ttfts = [m['ttft_ms'] for m in query_metrics if m['ttft_ms'] is not None]
+    totals = [m['total_ms'] for m in query_metrics]
+    return {
+        'queries': len(totals),
+        'ttft_ms_p50': percentile(ttfts, 50),
+        'ttft_ms_p95': percentile(ttfts, 95),
+        'total_ms_p50': percentile(totals, 50),
+        'total_ms_p95': percentile(totals, 95)
+    }
 
-FULL RECIPE DATA:
-{json.dumps(recipe_data, indent=2)}
 
-INSTRUCTIONS FOR YOU:
-CRITICAL FIRST STEP: Before anything else, you MUST atomize the instructions. Break down each instruction into smaller, atomic steps. Each atomic step should be a single action. For example:
-- "Preheat oven to 350°F, then mix flour and eggs" becomes Step 1: "Preheat oven to 350°F" and Step 2: "Mix flour and eggs"
-- Look for conjunctions like "then", "and then", "while", etc. and split on those
-- Each step should be one clear action
+def collect_metrics():
+    """Counters and gauges kept by the cache, session manager, recipe store and router, for /api/metrics."""
+    samples = []
+    cache = get_recipe_cache()
+    if cache is not None:
+        cache_stats = cache.stats()
+        for result in ('hits', 'misses', 'stale', 'revalidated'):
+            samples.append(('cache_lookups_total', 'counter', 'Recipe cache lookups, by result',
+                            {'result': result}, cache_stats[result]))
+        samples.append(('cache_evictions_total', 'counter', 'Recipes evicted from the cache', {}, cache_stats['evictions']))
+        samples.append(('cache_entries', 'gauge', 'URLs in the recipe cache', {}, cache_stats['entries']))
+        samples.append(('cache_bytes', 'gauge', 'Bytes of recipes in the cache', {}, cache_stats['bytes']))
 
-After atomizing, you will use ONLY these atomized steps for the entire conversation. Renumber them starting from 1.
+    session_stats = chat_sessions.stats()
+    samples.append(('sessions', 'gauge', 'Live chat sessions in this process', {}, session_stats['sessions']))
+    samples.append(('session_history_bytes', 'gauge', 'Bytes of chat history held', {}, session_stats['history_bytes']))
+    samples.append(('session_history_tokens', 'gauge', 'Estimated tokens of chat history held', {},
+                    session_stats['history_tokens']))
+    for event in ('created', 'restored', 'evicted', 'expired', 'compacted'):
+        samples.append(('session_events_total', 'counter', 'Chat sessions created, restored, evicted, expired and compacted',
+                        {'event': event}, session_stats[event]))
 
-Then follow these rules:
-- Track which step the user is currently on based on our conversation
-- If they say "start", "begin", or "start recipe", begin at step 1 of the ATOMIZED steps
-- If they say "next" or "n", move to the next atomized step
-- If they say "back", "b", or "previous", go to the previous atomized step
-- If they say "repeat" or "again", repeat the current atomized step
-- If they ask "step X", jump to that step number in the atomized steps
-- When presenting a step, format it clearly: "Step X: [instruction text]"
-- After showing a step, remind them they can say 'next', 'back', or ask questions
-- If they ask contextual questions like "how much of that?", "what temperature?", "how long?", refer to the current step based on our conversation
-- If asking about ingredients without context, provide exact quantities from the recipe
-- If the answer isn't in the recipe, say so politely and provide general cooking advice if appropriate
-- If the user query is asking for a guide on some action, technique, cooking term, or ingredient, explain it to them providing a google link or youtube link as necessary. Make sure the link is available.
-- Keep track of where they are in the recipe throughout our conversation
+    samples.append(('recipes', 'gauge', 'Parsed recipes held in memory', {}, recipes.stats()['recipes']))
 
-You should maintain context and remember which step the user is on as we talk.
+    response_cache = get_response_cache()
+    if response_cache is not None:
+        response_stats = response_cache.stats()
+        for result in ('hits', 'misses'):
+            samples.append(('response_cache_lookups_total', 'counter', 'Response cache lookups, by result',
+                            {'result': result}, response_stats[result]))
+        samples.append(('response_cache_evictions_total', 'counter', 'Answers evicted from the response cache', {},
+                        response_stats['evictions'] + response_stats['expired']))
+        samples.append(('response_cache_entries', 'gauge', 'Answers in the response cache', {}, response_stats['entries']))
 
-First, atomize the steps internally, then respond with: "Ready! I've loaded and processed the recipe into [NUMBER] steps. You can ask me questions, or say 'start' to begin the step-by-step walkthrough."
-"""
+    for name, stats in flight_stats().items():
+        for result in ('executed', 'shared'):
+            samples.append(('single_flight_calls_total', 'counter',
+                            'Parse, atomize and session calls run, or coalesced onto one already running',
+                            {'flight': name, 'result': result}, stats[result]))
+
+    model_stats = get_model_client().stats()
+    for event in ('calls', 'retries', 'rate_limited', 'deadline_exceeded', 'errors'):
+        samples.append(('model_calls_total', 'counter', 'Model calls, retries, rate limits, timeouts and errors',
+                        {'event': event}, model_stats[event]))
+    samples.append(('model_calls_active', 'gauge', 'Model calls running now', {}, model_stats['active']))
+    samples.append(('model_calls_queued', 'gauge', 'Model calls waiting for a free slot', {}, model_stats['queued']))
+
+    routed = router_stats.stats()
+    samples.append(('queries_total', 'counter', 'Queries, by who answered them', {'answered_by': 'model'}, routed['model']))
+    samples.append(('queries_total', 'counter', 'Queries, by who answered them', {'answered_by': 'cache'}, routed['cache']))
+    for intent, count in routed['by_intent'].items():
+        samples.append(('queries_total', 'counter', 'Queries, by who answered them',
+                        {'answered_by': 'local', 'intent': intent}, count))
+    return samples
+
+
+registry.add_collector(collect_metrics)
+
+
+@app.before_request
+def start_request_metrics():
+    g.metrics_started = begin_request()
+
+
+@app.after_request
+def finish_request_metrics(response):
+    # Label by route pattern, not the raw path, to keep the number of series bounded
+    path = request.url_rule.rule if request.url_rule else 'unmatched'
+    end_request(g.get('metrics_started'), request.method, path, response.status_code)
+    return response
+
+
+@timed("create_chat_session")
+def create_chat_session(recipe_data, history=None, recipe_id=None):
+    """
+    Create a new Gemini chat session with recipe context.
     
-    # Start chat session
-    chat = model.start_chat(history=[])
+    The recipe's atomized steps are computed once per recipe and cached, and
+    new sessions start from a seeded history built from them, so creating a
+    session does not wait on the model. Every session shares the model
+    client from model_client.
     
-    # Send initial context
-    response = chat.send_message(initial_prompt)
+    Args:
+        recipe_data: Dict with 'ingredients' and 'instructions' keys
+        history: Previously saved chat history to restore instead of starting over
+        recipe_id: Id of the recipe, used to look up its cached atomized steps
     
-    return chat
+    Returns:
+        chat session object
+    """
+    # Restoring a saved session: its history already holds the recipe context
+    if history is not None:
+        return get_model_client().start_chat(history)
+    
+    # Seed the chat with the precomputed steps instead of sending the recipe
+    steps = get_atomized_steps(recipe_data, recipe_id)
+    return get_model_client().start_chat(build_seed_history(recipe_data, steps))
 
 
 @app.route('/api/parse', methods=['POST'])
 def parse_recipe():
-    """Parse a recipe URL and store the results."""
-    global recipe_data
-    
+    """Parse a recipe URL, store the results and bind the session to the recipe."""
     if not request.is_json:
         return jsonify({'error': 'Request must be JSON'}), 400
     
@@ -95,21 +212,21 @@ def parse_recipe():
         return jsonify({'error': 'Invalid JSON data'}), 400
     
     url = data.get('url')
+    session_id = data.get('session_id', 'default')
     
     if not url:
         return jsonify({'error': 'No URL provided'}), 400
     
     try:
-        parsed_recipe = process_url(url)
-        
-        recipe_data['recipe'] = parsed_recipe
-        recipe_data['url'] = url
+        recipe = recipes.add(process_url(url), url)
+        chat_sessions.bind(session_id, recipe.recipe_id)
         
         return jsonify({
             'success': True,
-            'message': f'Successfully parsed recipe with {len(parsed_recipe["ingredients"])} ingredients and {len(parsed_recipe["instructions"])} steps!',
-            'ingredients_count': len(parsed_recipe['ingredients']),
-            'steps_count': len(parsed_recipe['instructions'])
+            'message': f'Successfully parsed recipe with {len(recipe.ingredients)} ingredients and {len(recipe.instructions)} steps!',
+            'recipe_id': recipe.recipe_id,
+            'ingredients_count': len(recipe.ingredients),
+            'steps_count': len(recipe.instructions)
         })
     except Exception as e:
         import traceback
@@ -119,14 +236,79 @@ def parse_recipe():
         return jsonify({'error': f'Error parsing recipe: {str(e)}'}), 500
 
 
+@app.route('/api/parse/batch', methods=['POST'])
+def parse_recipe_batch():
+    """Parse many recipe URLs concurrently, streaming one JSON line per URL."""
+    if not request.is_json:
+        return jsonify({'error': 'Request must be JSON'}), 400
+    
+    data = request.get_json()
+    if not data:
+        return jsonify({'error': 'Invalid JSON data'}), 400
+    
+    urls = data.get('urls')
+    
+    if not urls or not isinstance(urls, list):
+        return jsonify({'error': 'No URLs provided'}), 400
+    
+    if len(urls) > MAX_BATCH_URLS:
+        return jsonify({'error': f'Too many URLs (max {MAX_BATCH_URLS})'}), 400
+    
+    if not all(isinstance(url, str) for url in urls):
+        return jsonify({'error': 'Every URL must be a string'}), 400
+    
+    include_recipes = bool(data.get('include_recipes', False))
+    
+    def generate():
+        stats = {}
+        for result in ingest_urls(urls, include_recipes=include_recipes, stats=stats):
+            yield json.dumps(result) + '\n'
+        # Final line summarizes the batch, including throughput
+        yield json.dumps({'summary': stats}) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+def search_recipes(args):
+    """
+    Runs a /api/search request against the recipe index.
+
+    Returns:
+        (response dict, HTTP status)
+    """
+    query = (args.get('q') or '').strip()
+    if not query:
+        return {'error': 'No query provided'}, 400
+    field = args.get('field') or None
+    if field not in (None, 'ingredients', 'instructions'):
+        return {'error': "field must be 'ingredients' or 'instructions'"}, 400
+    try:
+        limit = int(args.get('limit', 10))
+    except ValueError:
+        return {'error': 'limit must be a number'}, 400
+    
+    index = get_recipe_index()
+    start = time.perf_counter()
+    results = index.search(query, field=field, limit=limit, match_all=args.get('mode', 'all') != 'any')
+    return {
+        'success': True,
+        'query': query,
+        'results': results,
+        'took_ms': round((time.perf_counter() - start) * 1000, 2),
+        'indexed_recipes': len(index)
+    }, 200
+
+
+@app.route('/api/search', methods=['GET'])
+def search():
+    """Search parsed recipes (?q=salmon soy sauce&field=ingredients&limit=10&mode=all|any)."""
+    response, status = search_recipes(request.args)
+    return jsonify(response), status
+
+
 @app.route('/api/query', methods=['POST'])
 def query_recipe():
     """Process a query about the recipe."""
-    global recipe_data, chat_sessions
-    
-    if not recipe_data['recipe']:
-        return jsonify({'error': 'No recipe loaded. Please parse a recipe first.'}), 400
-    
     if not request.is_json:
         return jsonify({'error': 'Request must be JSON'}), 400
     
@@ -135,18 +317,36 @@ def query_recipe():
         return jsonify({'error': 'Invalid JSON data'}), 400
     
     query = data.get('query')
-    session_id = data.get('session_id', 'default')  # Use session_id to track different users
+    session_id, recipe = resolve_recipe(data)
+    
+    if recipe is None:
+        return jsonify({'error': 'No recipe loaded. Please parse a recipe first.'}), 400
     
     if not query:
         return jsonify({'error': 'No query provided'}), 400
     
     # Get or create chat session for this session
-    if session_id not in chat_sessions:
-        chat_sessions[session_id] = create_chat_session(recipe_data['recipe'])
+    chat = get_chat(session_id, recipe)
+    
+    # Navigation and lookup queries are answered from the parsed recipe, and
+    # questions other sessions already asked about it from the response cache
+    answer = answer_locally(chat, query, recipe.ingredients, peek_atomized_steps(recipe.recipe_id, recipe.as_dict()))
+    key = None
+    if answer is None:
+        answer, key = cached_response(chat, recipe.recipe_id, query)
+    if answer is not None:
+        chat_sessions.save(chat_key(session_id, recipe))
+        return jsonify({
+            'success': True,
+            'response': answer
+        })
     
     try:
-        chat = chat_sessions[session_id]
-        response = chat.send_message(query)
+        with span("model"):
+            response = get_model_client().send(chat, query)
+        record_usage(response)
+        store_response(key, response.text)
+        chat_sessions.save(chat_key(session_id, recipe), response)
         
         return jsonify({
             'success': True,
@@ -156,22 +356,110 @@ def query_recipe():
         return jsonify({'error': f'Error processing query: {str(e)}'}), 500
 
 
+@app.route('/api/query/stream', methods=['POST'])
+def query_recipe_stream():
+    """Process a query about the recipe, streaming the answer as Server-Sent Events."""
+    if not request.is_json:
+        return jsonify({'error': 'Request must be JSON'}), 400
+    
+    data = request.get_json()
+    if not data:
+        return jsonify({'error': 'Invalid JSON data'}), 400
+    
+    query = data.get('query')
+    session_id, recipe = resolve_recipe(data)
+    
+    if recipe is None:
+        return jsonify({'error': 'No recipe loaded. Please parse a recipe first.'}), 400
+    
+    if not query:
+        return jsonify({'error': 'No query provided'}), 400
+    
+    start = time.perf_counter()
+    
+    # Get or create chat session for this session
+    chat = get_chat(session_id, recipe)
+    
+    # Navigation and lookup queries are answered from the parsed recipe, and
+    # questions other sessions already asked about it from the response cache
+    answer = answer_locally(chat, query, recipe.ingredients, peek_atomized_steps(recipe.recipe_id, recipe.as_dict()))
+    key = None
+    if answer is None:
+        answer, key = cached_response(chat, recipe.recipe_id, query)
+    
+    def generate():
+        first_token_at = None
+        error = None
+        try:
+            if answer is not None:
+                first_token_at = time.perf_counter()
+                yield sse_event({'token': answer})
+                chat_sessions.save(chat_key(session_id, recipe))
+                chunks = []
+            else:
+                chunks = get_model_client().send(chat, query, stream=True)
+            texts = []
+            for chunk in chunks:
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunk without text parts (e.g. only a finish reason)
+                    continue
+                if not text:
+                    continue
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                texts.append(text)
+                yield sse_event({'token': text})
+            if answer is None:
+                record_usage(chunks)
+                store_response(key, ''.join(texts))
+                chat_sessions.save(chat_key(session_id, recipe), chunks)
+        except Exception as e:
+            error = str(e)
+            inc("errors_total", stage="model_stream")
+        
+        ttft_ms = round((first_token_at - start) * 1000, 1) if first_token_at else None
+        total_ms = round((time.perf_counter() - start) * 1000, 1)
+        if answer is None:
+            observe("model_stream", total_ms / 1000)
+            if ttft_ms is not None:
+                observe("model_first_token", ttft_ms / 1000)
+        query_metrics.append({
+            'session_id': session_id,
+            'ttft_ms': ttft_ms,
+            'total_ms': total_ms,
+            'error': error is not None,
+            'local': answer is not None,
+            'timestamp': time.time()
+        })
+        
+        if error is not None:
+            yield sse_event({'error': f'Error processing query: {error}'}, event='error')
+        else:
+            yield sse_event({'ttft_ms': ttft_ms, 'total_ms': total_ms}, event='done')
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
 @app.route('/api/reset', methods=['POST'])
 def reset_conversation():
     """Reset the conversation by creating a new chat session."""
-    global chat_sessions, recipe_data
-    
     if not request.is_json:
         return jsonify({'error': 'Request must be JSON'}), 400
     
     data = request.get_json()
-    session_id = data.get('session_id', 'default')
+    session_id, recipe = resolve_recipe(data)
     
-    if not recipe_data['recipe']:
+    if recipe is None:
         return jsonify({'error': 'No recipe loaded. Please parse a recipe first.'}), 400
     
     # Create new chat session
-    chat_sessions[session_id] = create_chat_session(recipe_data['recipe'])
+    chat_sessions.put(chat_key(session_id, recipe), create_chat_session(recipe.as_dict(), recipe_id=recipe.recipe_id))
     
     return jsonify({
         'success': True,
@@ -181,19 +469,42 @@ def reset_conversation():
 
 @app.route('/api/status', methods=['GET'])
 def get_status():
-    """Get the current status of the recipe."""
-    global recipe_data
+    """Get the current status of a session's recipe (?session_id=...&recipe_id=...)."""
+    session_id, recipe = resolve_recipe(request.args)
     
-    if recipe_data['recipe']:
+    cache = get_recipe_cache()
+    cache_stats = cache.stats() if cache else None
+    response_cache = get_response_cache()
+    response_cache_stats = response_cache.stats() if response_cache else None
+
+    if recipe is not None:
         return jsonify({
             'has_recipe': True,
-            'url': recipe_data['url'],
-            'ingredients_count': len(recipe_data['recipe']['ingredients']),
-            'steps_count': len(recipe_data['recipe']['instructions'])
+            'recipe_id': recipe.recipe_id,
+            'url': recipe.url,
+            'ingredients_count': len(recipe.ingredients),
+            'steps_count': len(recipe.instructions),
+            'session_usage': chat_sessions.usage(chat_key(session_id, recipe)),
+            'cache': cache_stats,
+            'streaming': streaming_stats(),
+            'sessions': chat_sessions.stats(),
+            'recipes': recipes.stats(),
+            'router': router_stats.stats(),
+            'response_cache': response_cache_stats,
+            'single_flight': flight_stats(),
+            'model': get_model_client().stats()
         })
     else:
         return jsonify({
-            'has_recipe': False
+            'has_recipe': False,
+            'cache': cache_stats,
+            'streaming': streaming_stats(),
+            'sessions': chat_sessions.stats(),
+            'recipes': recipes.stats(),
+            'router': router_stats.stats(),
+            'response_cache': response_cache_stats,
+            'single_flight': flight_stats(),
+            'model': get_model_client().stats()
         })
 
 
@@ -203,6 +514,12 @@ def index():
     return render_template('index.html')
 
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics: stage timings, request and error counters, cache and session numbers."""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint."""
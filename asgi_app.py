@@ -0,0 +1,369 @@
+import asyncio
+import contextvars
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+# Load .env before the project modules, which read their settings at import
+load_dotenv()
+
+from quart import Quart, Response, g, request, jsonify, render_template
+
+# The async API shares its recipes, sessions and helpers with the Flask app,
+# so both serve the same data and report the same /api/status numbers.
+from app import (
+    recipes, chat_sessions, resolve_recipe, chat_key, get_chat, create_chat_session,
+    sse_event, query_metrics, streaming_stats, search_recipes
+)
+from html_parser import process_url
+from recipe_cache import get_recipe_cache
+from batch_ingest import ingest_urls, MAX_BATCH_URLS
+from recipe_context import peek_atomized_steps
+from intent_router import answer_locally, router_stats
+from response_cache import cached_response, get_response_cache, store_response
+from single_flight import flight_stats
+from model_client import get_model_client
+from metrics import begin_request, end_request, inc, observe, record_usage, render_metrics, span
+
+# Threads for the work that is still blocking: page fetch and parse, session
+# and recipe lookups (SQLite or Redis) and one-off recipe atomization. Model calls in the query
+# handlers are awaited on the event loop and never hold one of these.
+ASYNC_BLOCKING_WORKERS = int(os.getenv("ASYNC_BLOCKING_WORKERS", 32))
+
+app = Quart(__name__)
+
+_blocking_pool = None
+
+
+@app.before_serving
+async def start_blocking_pool():
+    global _blocking_pool
+    _blocking_pool = ThreadPoolExecutor(max_workers=ASYNC_BLOCKING_WORKERS, thread_name_prefix="blocking")
+
+
+@app.after_serving
+async def stop_blocking_pool():
+    if _blocking_pool is not None:
+        _blocking_pool.shutdown(wait=False)
+
+
+@app.before_request
+async def start_request_metrics():
+    g.metrics_started = begin_request()
+
+
+@app.after_request
+async def add_cors_headers(response):
+    """Same open CORS policy as flask_cors's CORS(app) on the Flask app."""
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
+    path = request.url_rule.rule if request.url_rule else 'unmatched'
+    end_request(g.get('metrics_started'), request.method, path, response.status_code)
+    return response
+
+
+async def run_blocking(func, *args):
+    """Runs a blocking call on the bounded thread pool and awaits its result."""
+    # Carry the request's context over so spans in the thread land in its timing log
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(_blocking_pool, context.run, func, *args)
+
+
+async def request_json():
+    """Returns (data, error response) for a JSON request body."""
+    if not request.is_json:
+        return None, (jsonify({'error': 'Request must be JSON'}), 400)
+    data = await request.get_json()
+    if not data:
+        return None, (jsonify({'error': 'Invalid JSON data'}), 400)
+    return data, None
+
+
+@app.route('/api/parse', methods=['POST'])
+async def parse_recipe():
+    """Parse a recipe URL, store the results and bind the session to the recipe."""
+    data, error = await request_json()
+    if error:
+        return error
+
+    url = data.get('url')
+    session_id = data.get('session_id', 'default')
+
+    if not url:
+        return jsonify({'error': 'No URL provided'}), 400
+
+    try:
+        recipe = recipes.add(await run_blocking(process_url, url), url)
+        chat_sessions.bind(session_id, recipe.recipe_id)
+
+        return jsonify({
+            'success': True,
+            'message': f'Successfully parsed recipe with {len(recipe.ingredients)} ingredients and {len(recipe.instructions)} steps!',
+            'recipe_id': recipe.recipe_id,
+            'ingredients_count': len(recipe.ingredients),
+            'steps_count': len(recipe.instructions)
+        })
+    except Exception as e:
+        print(f"DEBUG: Error parsing recipe: {str(e)}")
+        return jsonify({'error': f'Error parsing recipe: {str(e)}'}), 500
+
+
+@app.route('/api/parse/batch', methods=['POST'])
+async def parse_recipe_batch():
+    """Parse many recipe URLs concurrently, streaming one JSON line per URL."""
+    data, error = await request_json()
+    if error:
+        return error
+
+    urls = data.get('urls')
+
+    if not urls or not isinstance(urls, list):
+        return jsonify({'error': 'No URLs provided'}), 400
+
+    if len(urls) > MAX_BATCH_URLS:
+        return jsonify({'error': f'Too many URLs (max {MAX_BATCH_URLS})'}), 400
+
+    if not all(isinstance(url, str) for url in urls):
+        return jsonify({'error': 'Every URL must be a string'}), 400
+
+    include_recipes = bool(data.get('include_recipes', False))
+
+    async def generate():
+        stats = {}
+        results = ingest_urls(urls, include_recipes=include_recipes, stats=stats)
+        # Only one thread may run the generator at a time, so closing it waits for a pending next()
+        lock = threading.Lock()
+
+        def pull():
+            with lock:
+                return next(results, None)
+
+        def close():
+            with lock:
+                results.close()
+
+        # ingest_urls runs its own fetch and parse pools; only wait for each result here
+        try:
+            while True:
+                result = await run_blocking(pull)
+                if result is None:
+                    break
+                yield json.dumps(result) + '\n'
+            yield json.dumps({'summary': stats}) + '\n'
+        finally:
+            # Also reached when the client disconnects: stop fetching and shut the pools down,
+            # off the event loop and without waiting for it
+            _blocking_pool.submit(close)
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+
+@app.route('/api/search', methods=['GET'])
+async def search():
+    """Search parsed recipes (?q=salmon soy sauce&field=ingredients&limit=10&mode=all|any)."""
+    # The first search builds the index from the recipe cache, so keep it off the event loop
+    response, status = await run_blocking(search_recipes, request.args)
+    return jsonify(response), status
+
+
+@app.route('/api/query', methods=['POST'])
+async def query_recipe():
+    """Process a query about the recipe."""
+    data, error = await request_json()
+    if error:
+        return error
+
+    query = data.get('query')
+    session_id, recipe = await run_blocking(resolve_recipe, data)
+
+    if recipe is None:
+        return jsonify({'error': 'No recipe loaded. Please parse a recipe first.'}), 400
+
+    if not query:
+        return jsonify({'error': 'No query provided'}), 400
+
+    chat = await run_blocking(get_chat, session_id, recipe)
+
+    steps = await run_blocking(peek_atomized_steps, recipe.recipe_id, recipe.as_dict())
+    answer = answer_locally(chat, query, recipe.ingredients, steps)
+    key = None
+    if answer is None:
+        answer, key = cached_response(chat, recipe.recipe_id, query)
+    if answer is not None:
+        await run_blocking(chat_sessions.save, chat_key(session_id, recipe))
+        return jsonify({
+            'success': True,
+            'response': answer
+        })
+
+    try:
+        with span("model"):
+            response = await get_model_client().send_async(chat, query)
+        record_usage(response)
+        store_response(key, response.text)
+        await run_blocking(chat_sessions.save, chat_key(session_id, recipe), response)
+
+        return jsonify({
+            'success': True,
+            'response': response.text
+        })
+    except Exception as e:
+        return jsonify({'error': f'Error processing query: {str(e)}'}), 500
+
+
+@app.route('/api/query/stream', methods=['POST'])
+async def query_recipe_stream():
+    """Process a query about the recipe, streaming the answer as Server-Sent Events."""
+    data, error = await request_json()
+    if error:
+        return error
+
+    query = data.get('query')
+    session_id, recipe = await run_blocking(resolve_recipe, data)
+
+    if recipe is None:
+        return jsonify({'error': 'No recipe loaded. Please parse a recipe first.'}), 400
+
+    if not query:
+        return jsonify({'error': 'No query provided'}), 400
+
+    start = time.perf_counter()
+    chat = await run_blocking(get_chat, session_id, recipe)
+    steps = await run_blocking(peek_atomized_steps, recipe.recipe_id, recipe.as_dict())
+    answer = answer_locally(chat, query, recipe.ingredients, steps)
+    key = None
+    if answer is None:
+        answer, key = cached_response(chat, recipe.recipe_id, query)
+
+    async def generate():
+        first_token_at = None
+        error = None
+        try:
+            if answer is not None:
+                first_token_at = time.perf_counter()
+                yield sse_event({'token': answer})
+            else:
+                response = await get_model_client().send_async(chat, query, stream=True)
+                texts = []
+                async for chunk in response:
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        # Chunk without text parts (e.g. only a finish reason)
+                        continue
+                    if not text:
+                        continue
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    texts.append(text)
+                    yield sse_event({'token': text})
+                record_usage(response)
+                store_response(key, ''.join(texts))
+            await run_blocking(chat_sessions.save, chat_key(session_id, recipe), response if answer is None else None)
+        except Exception as e:
+            error = str(e)
+            inc("errors_total", stage="model_stream")
+
+        ttft_ms = round((first_token_at - start) * 1000, 1) if first_token_at else None
+        total_ms = round((time.perf_counter() - start) * 1000, 1)
+        if answer is None:
+            observe("model_stream", total_ms / 1000)
+            if ttft_ms is not None:
+                observe("model_first_token", ttft_ms / 1000)
+        query_metrics.append({
+            'session_id': session_id,
+            'ttft_ms': ttft_ms,
+            'total_ms': total_ms,
+            'error': error is not None,
+            'local': answer is not None,
+            'timestamp': time.time()
+        })
+
+        if error is not None:
+            yield sse_event({'error': f'Error processing query: {error}'}, event='error')
+        else:
+            yield sse_event({'ttft_ms': ttft_ms, 'total_ms': total_ms}, event='done')
+
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.route('/api/reset', methods=['POST'])
+async def reset_conversation():
+    """Reset the conversation by creating a new chat session."""
+    data, error = await request_json()
+    if error:
+        return error
+
+    session_id, recipe = await run_blocking(resolve_recipe, data)
+
+    if recipe is None:
+        return jsonify({'error': 'No recipe loaded. Please parse a recipe first.'}), 400
+
+    chat = await run_blocking(create_chat_session, recipe.as_dict(), None, recipe.recipe_id)
+    await run_blocking(chat_sessions.put, chat_key(session_id, recipe), chat)
+
+    return jsonify({
+        'success': True,
+        'message': 'Conversation reset'
+    })
+
+
+def status_for(args):
+    """Builds the /api/status response for a session's recipe."""
+    session_id, recipe = resolve_recipe(args)
+
+    cache = get_recipe_cache()
+    response_cache = get_response_cache()
+    status = {
+        'has_recipe': recipe is not None,
+        'cache': cache.stats() if cache else None,
+        'streaming': streaming_stats(),
+        'sessions': chat_sessions.stats(),
+        'recipes': recipes.stats(),
+        'router': router_stats.stats(),
+        'response_cache': response_cache.stats() if response_cache else None,
+        'single_flight': flight_stats(),
+        'model': get_model_client().stats()
+    }
+    if recipe is not None:
+        status.update({
+            'recipe_id': recipe.recipe_id,
+            'url': recipe.url,
+            'ingredients_count': len(recipe.ingredients),
+            'steps_count': len(recipe.instructions),
+            'session_usage': chat_sessions.usage(chat_key(session_id, recipe))
+        })
+    return status
+
+
+@app.route('/api/status', methods=['GET'])
+async def get_status():
+    """Get the current status of a session's recipe (?session_id=...&recipe_id=...)."""
+    # Session and recipe lookups and the cache counts read SQLite, so keep them off the event loop
+    return jsonify(await run_blocking(status_for, request.args))
+
+
+@app.route('/')
+async def index():
+    """Serve the main frontend page."""
+    return await render_template('index.html')
+
+
+@app.route('/api/metrics', methods=['GET'])
+async def metrics():
+    """Prometheus metrics: stage timings, request and error counters, cache and session numbers."""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/health', methods=['GET'])
+async def health_check():
+    """Health check endpoint."""
+    return jsonify({'status': 'ok', 'message': 'Server is running'})
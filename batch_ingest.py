@@ -0,0 +1,242 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from dotenv import load_dotenv
+
+# Load .env before the project modules, which read their settings at import
+load_dotenv()
+
+from html_parser import get_website_config, fetch_page, parse_recipe_html, build_recipe
+from recipe_cache import get_recipe_cache
+from recipe_index import index_recipe
+from snapshot_store import get_snapshot_store, set_snapshot_mode, snapshot_mode
+
+FETCH_WORKERS = int(os.getenv("BATCH_FETCH_WORKERS", 16))
+PARSE_WORKERS = int(os.getenv("BATCH_PARSE_WORKERS", os.cpu_count() or 1))
+MAX_BATCH_URLS = int(os.getenv("BATCH_MAX_URLS", 1000))
+
+# Marks the end of the URL iterator (a None URL is reported as an error)
+_END = object()
+
+# Process pool shared by every batch in this process, created on first use
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+
+def get_parse_pool(workers=PARSE_WORKERS):
+    """
+    Returns the shared process pool used to parse HTML on all cores.
+
+    Workers are started from a forkserver (where available) so they do not
+    inherit the fetch threads or the open cache connection of the caller.
+    """
+    global _parse_pool
+    if _parse_pool is None:
+        with _parse_pool_lock:
+            if _parse_pool is None:
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+                _parse_pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    return _parse_pool
+
+
+def read_urls(lines):
+    """Yields non-empty, non-comment URLs from an iterable of lines."""
+    for line in lines:
+        url = line.strip()
+        if url and not url.startswith("#"):
+            yield url
+
+
+@contextmanager
+def _cancel_on_exit(futures):
+    """Cancels the futures still queued when the block exits, e.g. when the generator is closed early."""
+    try:
+        yield
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def _fetch(url, entry, replay):
+    response = fetch_page(url, entry.revalidation_headers() if entry else None, replay=replay)
+    return response.status_code, response.ok, response.content, response.headers
+
+
+def _parse(content, url):
+    # Extraction, atomization and step annotation all run where this is
+    # submitted (a parser process, or a fetch thread with parse_workers=0)
+    return build_recipe(*parse_recipe_html(content, url))
+
+
+def ingest_urls(urls, fetch_workers=FETCH_WORKERS, parse_workers=PARSE_WORKERS,
+                use_cache=True, include_recipes=True, stats=None, replay=None):
+    """
+    Fetches and parses many recipe URLs concurrently, yielding a result per URL as it finishes.
+
+    Pages are downloaded on a thread pool and parsed on a process pool, so
+    network waits overlap and extraction, step atomization and annotation are
+    spread over every core.
+    Results are yielded in completion order, not input order.
+
+    Args:
+        urls (iterable): Recipe URLs
+        fetch_workers (int): Number of concurrent downloads
+        parse_workers (int): Number of parser processes, 0 to parse on the fetch threads
+        use_cache (bool): Serve fresh results from and store new results in the recipe cache
+        include_recipes (bool): Include the parsed recipe in each result
+        stats (dict): If given, filled with counts, elapsed seconds and urls_per_sec
+        replay (bool): Parse stored snapshots instead of fetching (implies use_cache=False);
+            defaults to SNAPSHOT_MODE == "replay"
+
+    Yields:
+        dict: {'url', 'status' ('ok', 'cached', 'not_modified' or 'error'), 'elapsed_ms',
+               'ingredients_count', 'steps_count', and 'recipe' or 'error'}
+    """
+    if replay is None:
+        replay = snapshot_mode() == "replay"
+    recording = snapshot_mode() == "record"
+    cache = get_recipe_cache() if use_cache and not replay else None
+    parse_pool = get_parse_pool(parse_workers) if parse_workers else None
+    counts = {"ok": 0, "cached": 0, "not_modified": 0, "error": 0}
+    started = time.perf_counter()
+
+    def result(url, status, t0, recipe=None, error=None):
+        counts[status] += 1
+        out = {"url": url, "status": status, "elapsed_ms": round((time.perf_counter() - t0) * 1000, 2)}
+        if recipe is not None:
+            out["ingredients_count"] = len(recipe["ingredients"])
+            out["steps_count"] = len(recipe["instructions"])
+            if include_recipes:
+                out["recipe"] = recipe
+        if error is not None:
+            out["error"] = error
+        return out
+
+    pending = {}  # future -> (stage, url, start time, cache entry, response headers)
+    url_iter = iter(urls)
+    # Keep a bounded number of pages in flight so huge batches don't pile up in memory
+    max_in_flight = fetch_workers * 4
+
+    # If the consumer stops early (a client that went away), queued fetches and
+    # parses are dropped and the pool only waits for the ones already running
+    with ThreadPoolExecutor(max_workers=fetch_workers) as fetch_pool, _cancel_on_exit(pending):
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < max_in_flight:
+                url = next(url_iter, _END)
+                if url is _END:
+                    exhausted = True
+                    break
+                t0 = time.perf_counter()
+                try:
+                    if not isinstance(url, str):
+                        raise ValueError(f"URL must be a string, got {type(url).__name__}")
+                    if get_website_config(url) is None:
+                        raise ValueError(f"Unsupported website. URL: {url}")
+                    # While recording, every page is fetched in full so it gets a snapshot
+                    entry = cache.get(url) if cache and not recording else None
+                except Exception as e:
+                    yield result(url, "error", t0, error=str(e))
+                    continue
+                if entry is not None and entry.is_fresh(cache.ttl):
+                    yield result(url, "cached", t0, recipe=entry.recipe)
+                    continue
+                pending[fetch_pool.submit(_fetch, url, entry, replay)] = ("fetch", url, t0, entry, None)
+
+            if not pending:
+                continue
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, url, t0, entry, headers = pending.pop(future)
+                try:
+                    if stage == "fetch":
+                        status_code, ok, content, headers = future.result()
+                        if entry is not None and status_code == 304:
+                            cache.touch(url)
+                            yield result(url, "not_modified", t0, recipe=entry.recipe)
+                            continue
+                        if not ok:
+                            raise ValueError(f"HTTP {status_code}")
+                        next_future = (parse_pool or fetch_pool).submit(_parse, content, url)
+                        pending[next_future] = ("parse", url, t0, entry, headers)
+                        continue
+
+                    recipe = future.result()
+                    stored = None
+                    if cache is not None:
+                        stored = cache.put(url, recipe, etag=headers.get("ETag"),
+                                           last_modified=headers.get("Last-Modified"))
+                    index_recipe(recipe, url, cached=stored is not None)
+                    yield result(url, "ok", t0, recipe=recipe)
+                except Exception as e:
+                    yield result(url, "error", t0, error=str(e))
+
+    if stats is not None:
+        elapsed = time.perf_counter() - started
+        total = sum(counts.values())
+        stats.update(counts)
+        stats["total"] = total
+        stats["elapsed_sec"] = round(elapsed, 3)
+        stats["urls_per_sec"] = round(total / elapsed, 2) if elapsed > 0 else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch and parse many recipe URLs, streaming JSONL results.")
+    parser.add_argument("inputs", nargs="*", help="Recipe URLs, or files of URLs (one per line, '-' for stdin)")
+    parser.add_argument("-o", "--output", help="Write JSONL results here instead of stdout")
+    parser.add_argument("--fetch-workers", type=int, default=FETCH_WORKERS)
+    parser.add_argument("--parse-workers", type=int, default=PARSE_WORKERS,
+                        help="Parser processes (0 parses on the fetch threads)")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the recipe cache")
+    parser.add_argument("--status-only", action="store_true", help="Omit parsed recipes from the output")
+    snapshots = parser.add_mutually_exclusive_group()
+    snapshots.add_argument("--record", action="store_true", help="Also store every fetched page as a snapshot")
+    snapshots.add_argument("--replay", action="store_true",
+                           help="Parse stored snapshots instead of fetching (every snapshot if no inputs are given)")
+    args = parser.parse_args()
+    if args.record or args.replay:
+        set_snapshot_mode("record" if args.record else "replay")
+
+    def all_urls():
+        if args.replay and not args.inputs:
+            yield from get_snapshot_store().urls()
+            return
+        for item in args.inputs or ["-"]:
+            if item == "-":
+                yield from read_urls(sys.stdin)
+            elif os.path.isfile(item):
+                with open(item) as f:
+                    yield from read_urls(f)
+            else:
+                yield item
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    stats = {}
+    try:
+        for result in ingest_urls(all_urls(), fetch_workers=args.fetch_workers,
+                                  parse_workers=args.parse_workers, use_cache=not args.no_cache,
+                                  include_recipes=not args.status_only, stats=stats):
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print(
+        f"Processed {stats['total']} URLs in {stats['elapsed_sec']}s "
+        f"({stats['urls_per_sec']} URLs/sec): {stats['ok']} parsed, {stats['cached']} cached, "
+        f"{stats['not_modified']} not modified, {stats['error']} errors",
+        file=sys.stderr
+    )
+
+
+if __name__ == "__main__":
+    main()
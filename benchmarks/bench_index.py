@@ -0,0 +1,156 @@
+"""
+Build time, memory and query latency of the recipe search index.
+
+Recipes are synthesized from a small cooking vocabulary (the lasagna in
+recipe_output.json is added as one of them), so the index can be measured
+at the 100k-recipe scale without a crawl. Queries are timed end to end,
+including query analysis.
+
+    python benchmarks/bench_index.py --recipes 100000
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from recipe_index import RecipeIndex  # noqa: E402
+
+INGREDIENTS = [
+    "salmon fillets", "soy sauce", "garlic", "ginger", "onion", "tomatoes", "olive oil", "butter", "flour",
+    "sugar", "brown sugar", "eggs", "milk", "heavy cream", "parmesan cheese", "mozzarella cheese",
+    "ricotta cheese", "ground beef", "chicken breasts", "chicken thighs", "pork shoulder", "shrimp", "rice",
+    "lasagna noodles", "spaghetti", "basil", "oregano", "thyme", "rosemary", "cumin", "paprika", "chili flakes",
+    "lemon juice", "lime juice", "honey", "maple syrup", "vanilla extract", "baking soda", "baking powder",
+    "carrots", "celery", "potatoes", "spinach", "mushrooms", "bell peppers", "zucchini", "black beans",
+    "chickpeas", "coconut milk", "sesame oil", "rice vinegar", "scallions", "cilantro", "parsley", "tofu",
+]
+UNITS = ["cup", "cups", "tablespoons", "teaspoon", "pound", "ounces", "cloves", ""]
+STEPS = [
+    "Preheat the oven to {temperature} degrees F.",
+    "Heat the {a} in a large skillet over medium heat.",
+    "Whisk together the {a} and {b} in a small bowl.",
+    "Add the {a} and cook, stirring often, until softened, about {minutes} minutes.",
+    "Stir in the {a} and {b}; simmer for {minutes} minutes.",
+    "Bake at {temperature}°F until golden, {minutes} to {more} minutes.",
+    "Season with {a} and serve topped with {b}.",
+    "Marinate the {a} in the {b} for {minutes} minutes.",
+    "Bring a pot of salted water to a boil and cook the {a}.",
+    "Let rest for {minutes} minutes before slicing.",
+]
+QUERIES = [
+    ("salmon soy sauce", None),
+    ("recipes using chickpeas and coconut milk", None),
+    ("steps mentioning 350°F", None),
+    ("simmer tomatoes", "instructions"),
+    ("garlic", "ingredients"),
+    ("whisk eggs milk flour", None),
+]
+
+
+def synthesize(count, seed=0):
+    """Yields (recipe_id, url, recipe) for count random recipes."""
+    rng = random.Random(seed)
+    for number in range(count):
+        names = rng.sample(INGREDIENTS, rng.randint(5, 14))
+        ingredients = [f"{rng.randint(1, 4)} {rng.choice(UNITS)} {name}".replace("  ", " ") for name in names]
+        instructions = [
+            rng.choice(STEPS).format(
+                a=rng.choice(names), b=rng.choice(names), minutes=rng.randint(2, 30), more=rng.randint(31, 45),
+                temperature=rng.choice((325, 350, 375, 400, 425))
+            )
+            for _ in range(rng.randint(4, 10))
+        ]
+        yield f"synthetic-{number}", f"https://example.com/recipe/{number}", {
+            "ingredients": ingredients, "instructions": instructions
+        }
+
+
+def load_fixture():
+    with open(os.path.join(REPO_ROOT, "recipe_output.json"), encoding="utf-8") as f:
+        data = json.load(f)
+    ingredients = [
+        " ".join(part for part in (item["quantity"], item["measurement_unit"], item["name"]) if part)
+        for item in data["ingredients"]
+    ]
+    return data["url"], {"ingredients": ingredients, "instructions": [step["description"] for step in data["steps"]]}
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure recipe search index build and query times.")
+    parser.add_argument("--recipes", type=int, default=100000, help="Number of synthetic recipes to index")
+    parser.add_argument("--repeat", type=int, default=50, help="Timed runs per query")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    index = RecipeIndex()
+    recipes = list(synthesize(args.recipes))
+
+    # Peak RSS growth over the build (ru_maxrss is in KB on Linux); tracemalloc would slow the build down
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    for offset in range(0, len(recipes), 1000):
+        index.add_many(recipes[offset:offset + 1000])
+    build_seconds = time.perf_counter() - start
+    index_bytes = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) * 1024
+
+    url, fixture = load_fixture()
+    start = time.perf_counter()
+    fixture_id = index.add(fixture, url)
+    add_ms = (time.perf_counter() - start) * 1000
+    assert index.search("cottage cheese pasta sauce", limit=1)[0]["recipe_id"] == fixture_id
+    start = time.perf_counter()
+    index.remove(fixture_id)
+    remove_ms = (time.perf_counter() - start) * 1000
+
+    queries = []
+    for query, field in QUERIES:
+        index.search(query, field=field)  # warm up
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            results = index.search(query, field=field)
+            timings.append((time.perf_counter() - start) * 1000)
+        queries.append({
+            "query": query,
+            "field": field,
+            "results": len(results),
+            "p50_ms": round(percentile(timings, 0.5), 2),
+            "p95_ms": round(percentile(timings, 0.95), 2)
+        })
+
+    summary = {
+        "recipes": len(index),
+        "lemmatizer": index.stats()["lemmatizer"],
+        "build_seconds": round(build_seconds, 1),
+        "recipes_per_sec": round(args.recipes / build_seconds),
+        "build_rss_mb": round(index_bytes / 1e6, 1),
+        "add_ms": round(add_ms, 2),
+        "remove_ms": round(remove_ms, 2),
+        "queries": queries
+    }
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+
+    print(f"{summary['recipes']} recipes ({summary['lemmatizer']} lemmas), built in {summary['build_seconds']} s "
+          f"({summary['recipes_per_sec']} recipes/s), +{summary['build_rss_mb']} MB peak RSS")
+    print(f"add one recipe: {summary['add_ms']} ms, remove: {summary['remove_ms']} ms")
+    print(f"{'query':<45}{'field':>14}{'p50 ms':>9}{'p95 ms':>9}")
+    for query in queries:
+        print(f"{query['query']:<45}{query['field'] or 'all':>14}{query['p50_ms']:>9}{query['p95_ms']:>9}")
+
+
+if __name__ == "__main__":
+    main()
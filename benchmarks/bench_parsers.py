@@ -0,0 +1,149 @@
+"""
+Per-page parse time and peak memory for each HTML extraction backend.
+
+"jsonld" measures the schema.org structured-data fast path; the other
+backends are measured on the WEBSITE_CONFIGS selectors with it disabled.
+
+Runs offline against the saved pages in benchmarks/fixtures. Fixtures are
+padded with unrelated page chrome (navigation, article text, comments) up to
+--pad-kb so the parser sees pages about as large as the real sites serve.
+Each backend is measured in its own subprocess so peak RSS is not shared.
+
+    python benchmarks/bench_parsers.py --pad-kb 300 --runs 20
+"""
+import argparse
+import glob
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES_DIR = os.path.join(REPO_ROOT, "benchmarks", "fixtures")
+sys.path.insert(0, REPO_ROOT)
+
+FILLER_BLOCK = """
+<div class="comp mntl-block card-list__item"><a class="comp card mntl-card-list-items" href="/recipe/{n}/">
+<div class="card__content"><span class="card__title"><span class="card__title-text">Related recipe {n}</span></span>
+<div class="comp mntl-recipe-star-rating"><span class="icon icon-star"></span><span class="icon icon-star"></span></div>
+<p class="card__description">A reader favourite with {n} ratings. Easy weeknight dinner, ready in 30 minutes.</p></div></a></div>
+<!-- ad slot {n} --><div id="ad-{n}" class="mntl-dynamic-billboard"><script>window.ads = window.ads || []; ads.push({n});</script></div>
+"""
+
+
+def load_fixtures(pad_kb):
+    """
+    Loads every fixture page, padded to roughly pad_kb kilobytes.
+
+    Returns:
+        list of (url, html bytes)
+    """
+    pages = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.html"))):
+        site = os.path.basename(path)[:-len(".html")]
+        with open(path, encoding="utf-8") as f:
+            html = f.read()
+        filler = []
+        size = len(html)
+        n = 0
+        while size < pad_kb * 1024:
+            block = FILLER_BLOCK.format(n=n)
+            filler.append(block)
+            size += len(block)
+            n += 1
+        # Put half the chrome before the recipe and half after, like a real page
+        half = len(filler) // 2
+        html = html.replace("<main", "".join(filler[:half]) + "<main", 1)
+        html = html.replace("</main>", "</main>" + "".join(filler[half:]), 1)
+        pages.append((f"https://www.{site}/fixture", html.encode("utf-8")))
+    return pages
+
+
+def measure_backend(backend, pad_kb, runs):
+    """Times one backend over every fixture; run inside a fresh subprocess."""
+    from html_parser import parse_recipe_html
+    from extract_backends import get_backend
+
+    def parse(html, url):
+        if backend == "jsonld":
+            return parse_recipe_html(html, url)
+        return parse_recipe_html(html, url, backend=backend, structured_data=False)
+
+    pages = load_fixtures(pad_kb)
+    if backend != "jsonld":
+        get_backend(backend)
+    # Baseline after imports, before any page has been parsed
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Warm up selector compilation before timing
+    for url, html in pages:
+        parse(html, url)
+
+    installed = backend in ("bs4", "jsonld") or get_backend(backend) is not None
+    results = {"backend": backend if installed else "bs4", "pages": {}}
+    for url, html in pages:
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            parse(html, url)
+            timings.append((time.perf_counter() - start) * 1000)
+        results["pages"][url] = {
+            "kb": round(len(html) / 1024, 1),
+            "median_ms": round(statistics.median(timings), 3),
+            "min_ms": round(min(timings), 3),
+        }
+    # ru_maxrss is in KB on Linux; captures C-level allocations tracemalloc can't see
+    results["rss_growth_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+
+    # Separate pass for the Python heap peak, since tracing slows parsing down
+    tracemalloc.start()
+    for url, html in pages:
+        parse(html, url)
+    results["python_heap_peak_kb"] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    tracemalloc.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default="bs4,lxml,selectolax,jsonld")
+    parser.add_argument("--pad-kb", type=int, default=300)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="Print raw JSON results")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure_backend(args.child, args.pad_kb, args.runs)))
+        return
+
+    all_results = []
+    for backend in args.backends.split(","):
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", backend, "--pad-kb", str(args.pad_kb), "--runs", str(args.runs)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        result["requested"] = backend
+        all_results.append(result)
+
+    if args.json:
+        print(json.dumps(all_results, indent=2))
+        return
+
+    for result in all_results:
+        label = result["requested"]
+        if result["backend"] != label:
+            label += f" (not installed, used {result['backend']})"
+        print(f"\n{label}: python heap peak {result['python_heap_peak_kb']} KB, "
+              f"RSS growth {result['rss_growth_kb']} KB")
+        for url, page in result["pages"].items():
+            print(f"  {url:45} {page['kb']:7.1f} KB  median {page['median_ms']:8.2f} ms  "
+                  f"min {page['min_ms']:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Encoded size, memory per decoded recipe and encode/decode throughput of the
+binary Ingredient/Step format versus the JSON round trip used today
+(json.dumps(..., indent=2) as in recipe_output.json).
+
+The recipe is the parsed lasagna in recipe_output.json. "binary (lazy)"
+decodes without touching Step.description; "binary" reads every description
+too, which is what a full decode costs.
+
+    python benchmarks/bench_serialization.py --copies 5000
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from data_classes import Step, recipe_from_bytes, recipe_to_bytes  # noqa: E402
+from quantities import parse_ingredient  # noqa: E402
+
+
+def load_recipe():
+    """The recipe from recipe_output.json as (url, [Ingredient], [Step])."""
+    with open(os.path.join(REPO_ROOT, "recipe_output.json"), encoding="utf-8") as f:
+        data = json.load(f)
+    ingredients = [
+        parse_ingredient(" ".join(part for part in (item["quantity"], item["measurement_unit"], item["name"]) if part))
+        for item in data["ingredients"]
+    ]
+    steps = [Step.from_dict(step) for step in data["steps"]]
+    return data["url"], ingredients, steps
+
+
+def json_encode(url, ingredients, steps, indent):
+    return json.dumps({
+        "url": url,
+        "ingredients": [ingredient.to_dict() for ingredient in ingredients],
+        "steps": [step.to_dict() for step in steps]
+    }, indent=indent, ensure_ascii=False).encode("utf-8")
+
+
+def throughput(func, seconds=0.5):
+    """Calls per second of func over roughly the given time."""
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        for _ in range(100):
+            func()
+        calls += 100
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            return calls / elapsed
+
+
+def memory_per_recipe(decode, copies):
+    """Bytes held per decoded recipe, from tracemalloc over many live copies."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    held = [decode() for _ in range(copies)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del held
+    return (after - before) / copies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare binary and JSON recipe serialization.")
+    parser.add_argument("--copies", type=int, default=5000, help="Decoded copies held for the memory measurement")
+    parser.add_argument("--seconds", type=float, default=0.5, help="Time per throughput measurement")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    url, ingredients, steps = load_recipe()
+    pretty = json_encode(url, ingredients, steps, indent=2)
+    compact = json_encode(url, ingredients, steps, indent=None)
+    packed = recipe_to_bytes(url, ingredients, steps)
+
+    # Round trips must be lossless before they are worth timing
+    _, decoded_ingredients, decoded_steps = recipe_from_bytes(packed)
+    assert [i.to_dict() for i in decoded_ingredients] == [i.to_dict() for i in ingredients]
+    assert [s.to_dict() for s in decoded_steps] == [s.to_dict() for s in steps]
+    assert json.loads(pretty) == json.loads(compact)
+
+    def full_decode():
+        result = recipe_from_bytes(packed)
+        for step in result[2]:
+            step.description
+        return result
+
+    formats = [
+        ("json indent=2", lambda: json_encode(url, ingredients, steps, 2), lambda: json.loads(pretty), pretty),
+        ("json compact", lambda: json_encode(url, ingredients, steps, None), lambda: json.loads(compact), compact),
+        ("binary (lazy)", lambda: recipe_to_bytes(url, ingredients, steps), lambda: recipe_from_bytes(packed), packed),
+        ("binary", lambda: recipe_to_bytes(url, ingredients, steps), full_decode, packed),
+    ]
+
+    results = []
+    for name, encode, decode, encoded in formats:
+        results.append({
+            "format": name,
+            "encoded_bytes": len(encoded),
+            "memory_per_recipe_bytes": round(memory_per_recipe(decode, args.copies)),
+            "encodes_per_sec": round(throughput(encode, args.seconds)),
+            "decodes_per_sec": round(throughput(decode, args.seconds))
+        })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{len(ingredients)} ingredients, {len(steps)} steps")
+    print(f"{'format':<15}{'encoded B':>11}{'memory B':>11}{'encode/s':>11}{'decode/s':>11}")
+    for result in results:
+        print(
+            f"{result['format']:<15}{result['encoded_bytes']:>11}{result['memory_per_recipe_bytes']:>11}"
+            f"{result['encodes_per_sec']:>11}{result['decodes_per_sec']:>11}"
+        )
+
+
+if __name__ == "__main__":
+    main()
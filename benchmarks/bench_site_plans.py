@@ -0,0 +1,124 @@
+"""
+Per-page cost of picking and applying a site's extraction plan.
+
+  lookup    get_website_name (host -> SITE_PLANS) against a linear scan of
+            WEBSITE_CONFIGS for a substring of the URL, with --sites extra
+            synthetic sites registered to show how each grows
+  extract   each backend's extract() on the saved pages in benchmarks/fixtures
+            with the site's plan compiled once (SITE_PLANS) against a plan
+            built and compiled again for every page
+
+Runs offline; the JSON-LD fast path is not involved.
+
+    python benchmarks/bench_site_plans.py --sites 200 --runs 20
+"""
+import argparse
+import glob
+import os
+import statistics
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES_DIR = os.path.join(REPO_ROOT, "benchmarks", "fixtures")
+sys.path.insert(0, REPO_ROOT)
+
+import html_parser  # noqa: E402
+from extract_backends import SitePlan, get_backend, get_bs4_backend  # noqa: E402
+
+LOOKUPS = 100000
+
+
+def scan_website_name(url):
+    # How sites were picked before SITE_PLANS: try every config in turn
+    for website in html_parser.WEBSITE_CONFIGS:
+        if website in url:
+            return website
+    return None
+
+
+def add_synthetic_sites(count):
+    """Registers count extra sites (copies of the foodnetwork.com config) ahead of the real ones."""
+    config = html_parser.WEBSITE_CONFIGS["foodnetwork.com"]
+    configs = {f"recipes-{n}.example.com": config for n in range(count)}
+    configs.update(html_parser.WEBSITE_CONFIGS)
+    html_parser.WEBSITE_CONFIGS = configs
+    html_parser.SITE_PLANS.update({site: SitePlan(site, config) for site in configs})
+    html_parser.get_website_name.cache_clear()
+
+
+def per_call_us(func, urls):
+    start = time.perf_counter()
+    for _ in range(LOOKUPS // len(urls)):
+        for url in urls:
+            func(url)
+    return (time.perf_counter() - start) / (LOOKUPS // len(urls) * len(urls)) * 1e6
+
+
+def bench_lookup(urls):
+    results = {}
+    results["scan_us"] = per_call_us(scan_website_name, urls)
+    # Without the per-URL cache, i.e. every URL seen for the first time
+    results["plans_us"] = per_call_us(html_parser.get_website_name.__wrapped__, urls)
+    results["plans_cached_us"] = per_call_us(html_parser.get_website_name, urls)
+    return results
+
+
+def load_fixtures():
+    pages = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.html"))):
+        site = os.path.basename(path)[:-len(".html")]
+        with open(path, "rb") as f:
+            pages.append((f"https://www.{site}/fixture", f.read()))
+    return pages
+
+
+def median_ms(func, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def bench_extract(backend, pages, runs):
+    results = {}
+    for url, html in pages:
+        plan = html_parser.get_site_plan(url)
+        backend.extract(html, plan)  # compile before timing
+        compiled = median_ms(lambda: backend.extract(html, plan), runs)
+        per_page = median_ms(lambda: backend.extract(html, SitePlan(plan.site, plan.config)), runs)
+        results[plan.site] = (compiled, per_page)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sites", type=int, default=200, help="Synthetic sites added for the lookup test")
+    parser.add_argument("--runs", type=int, default=20, help="Timed extractions per fixture")
+    args = parser.parse_args()
+
+    urls = [url for url, _ in load_fixtures()] + ["https://www.example.org/not-a-recipe-site"]
+    print(f"lookup ({len(html_parser.WEBSITE_CONFIGS)} sites)")
+    for name, value in bench_lookup(urls).items():
+        print(f"  {name:16} {value:8.3f} us")
+    add_synthetic_sites(args.sites)
+    print(f"lookup ({len(html_parser.WEBSITE_CONFIGS)} sites)")
+    for name, value in bench_lookup(urls).items():
+        print(f"  {name:16} {value:8.3f} us")
+
+    pages = load_fixtures()
+    backends = [get_bs4_backend()]
+    for name in ("lxml", "selectolax"):
+        backend = get_backend(name)
+        if backend is not None and backend.name == name:
+            backends.append(backend)
+    for backend in backends:
+        print(f"\nextract ({backend.name}): compiled plan vs plan compiled per page")
+        for site, (compiled, per_page) in bench_extract(backend, pages, args.runs).items():
+            print(f"  {site:20} {compiled:8.3f} ms  {per_page:8.3f} ms  saves {per_page - compiled:7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Startup time and memory of the entry points, with an import-time budget check.
+
+  import    each entry point (app, recipe_chat, asgi_app) imported in a fresh
+            interpreter: median seconds, peak RSS, and any heavy module that
+            was imported eagerly (those in LAZY_MODULES load on first use)
+  workers   time until a serving worker is warm (app imported, spaCy and the
+            extraction backend loaded) and the memory it keeps to itself (USS),
+            started cold vs forked from a parent preloaded by serve.preload()
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --check --budget-ms 600
+
+With --check the exit status is 1 if an entry point imports a module from
+LAZY_MODULES or takes longer than the budget to import.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+ENTRY_POINTS = ("app", "recipe_chat", "asgi_app")
+# Heavy dependencies no entry point should import before it needs them
+LAZY_MODULES = ("spacy", "google.generativeai", "bs4")
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", 600))
+# Keep the measured processes away from the real caches and the network
+CHILD_ENV = {"RECIPE_CACHE_DISABLED": "1", "SESSION_BACKEND": "memory", "MODEL_BACKEND": "fake"}
+
+IMPORT_SCRIPT = """
+import json, resource, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "eager": [name for name in {lazy!r} if name in sys.modules]
+}}))
+"""
+
+
+def memory_kb():
+    """RSS and USS (pages not shared with any other process) of this process, from /proc."""
+    fields = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1])
+    except OSError:
+        return {}
+    return {"rss_kb": fields.get("Rss", 0), "uss_kb": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)}
+
+
+def warm_worker():
+    """What a serving worker does before its first request; returns seconds taken."""
+    start = time.perf_counter()
+    import asgi_app  # noqa: F401
+    from extract_backends import get_backend
+    from nlp_pipeline import get_nlp
+    get_nlp()
+    get_backend()
+    return time.perf_counter() - start
+
+
+def bench_imports(runs):
+    results = {}
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT, **CHILD_ENV)
+    for module in ENTRY_POINTS:
+        samples = []
+        for _ in range(runs):
+            output = subprocess.run(
+                [sys.executable, "-c", IMPORT_SCRIPT.format(module=module, lazy=LAZY_MODULES)],
+                check=True, capture_output=True, text=True, cwd=REPO_ROOT, env=env
+            ).stdout
+            samples.append(json.loads(output.strip().splitlines()[-1]))
+        results[module] = {
+            "median_ms": round(statistics.median(s["seconds"] for s in samples) * 1000, 1),
+            "max_rss_mb": round(statistics.median(s["max_rss_kb"] for s in samples) / 1024, 1),
+            "eager": samples[-1]["eager"]
+        }
+    return results
+
+
+def bench_workers(workers):
+    """Runs inside a fresh subprocess (--child workers) so nothing is preloaded yet."""
+    import serve
+
+    cold = []
+    for _ in range(workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            seconds = warm_worker()
+            os.write(write_fd, json.dumps(dict(memory_kb(), seconds=seconds)).encode())
+            os._exit(0)
+        os.close(write_fd)
+        cold.append(json.loads(os.read(read_fd, 4096)))
+        os.close(read_fd)
+        os.waitpid(pid, 0)
+
+    preload_seconds = serve.preload()
+    warm = []
+    children = []
+    for _ in range(workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            seconds = warm_worker()
+            os.write(write_fd, json.dumps(dict(memory_kb(), seconds=seconds)).encode())
+            # Stay alive until every worker is measured, so they share pages like a real pool
+            time.sleep(5)
+            os._exit(0)
+        os.close(write_fd)
+        children.append((pid, read_fd))
+    for pid, read_fd in children:
+        warm.append(json.loads(os.read(read_fd, 4096)))
+        os.close(read_fd)
+    for pid, _ in children:
+        os.kill(pid, 9)
+        os.waitpid(pid, 0)
+
+    def summary(samples):
+        return {
+            "ready_ms": round(statistics.median(s["seconds"] for s in samples) * 1000, 1),
+            "rss_mb": round(statistics.median(s.get("rss_kb", 0) for s in samples) / 1024, 1),
+            "uss_mb": round(statistics.median(s.get("uss_kb", 0) for s in samples) / 1024, 1)
+        }
+    return {"cold": summary(cold), "prefork": summary(warm), "preload_ms": round(preload_seconds * 1000, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per entry point")
+    parser.add_argument("--workers", type=int, default=4, help="Workers started cold and preforked (0 to skip)")
+    parser.add_argument("--check", action="store_true", help="Exit 1 if the import budget is exceeded")
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(bench_workers(args.workers)))
+        return
+
+    failures = []
+    print("import (fresh interpreter)")
+    for module, result in bench_imports(args.runs).items():
+        print(f"  {module:12} {result['median_ms']:8.1f} ms  peak RSS {result['max_rss_mb']:6.1f} MB"
+              + (f"  eager: {', '.join(result['eager'])}" if result["eager"] else ""))
+        if result["eager"]:
+            failures.append(f"{module} imports {', '.join(result['eager'])} at startup")
+        if result["median_ms"] > args.budget_ms:
+            failures.append(f"{module} takes {result['median_ms']} ms to import (budget {args.budget_ms:g} ms)")
+
+    if args.workers and hasattr(os, "fork"):
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", "workers", "--workers", str(args.workers)],
+            check=True, capture_output=True, text=True, cwd=REPO_ROOT,
+            env=dict(os.environ, PYTHONPATH=REPO_ROOT, **CHILD_ENV)
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"\nworkers ({args.workers}; prefork parent preloads in {result['preload_ms']} ms)")
+        for mode in ("cold", "prefork"):
+            worker = result[mode]
+            print(f"  {mode:8} ready in {worker['ready_ms']:8.1f} ms  RSS {worker['rss_mb']:6.1f} MB  "
+                  f"USS {worker['uss_mb']:6.1f} MB")
+
+    if args.check:
+        for failure in failures:
+            print(f"FAIL: {failure}", file=sys.stderr)
+        sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
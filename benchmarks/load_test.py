@@ -0,0 +1,268 @@
+"""
+Load test for the async API: how many concurrent conversations one worker sustains.
+
+By default the server is started in this process on a free port, with the
+Gemini chat replaced by a fake whose replies take --model-latency seconds,
+and a recipe parsed from the saved fixtures. That isolates the serving
+stack from the network and the API quota. Each client is its own session
+and sends --requests-per-client model questions to /api/query, one after
+another; every concurrency level reports throughput and latency percentiles.
+
+    python benchmarks/load_test.py --concurrency 10,100,500 --model-latency 1.0
+
+To load a running server (real model) instead, give its address and a recipe URL:
+
+    python benchmarks/load_test.py --url http://localhost:5000 --recipe-url https://... --concurrency 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES_DIR = os.path.join(REPO_ROOT, "benchmarks", "fixtures")
+sys.path.insert(0, REPO_ROOT)
+
+QUERIES = [
+    "what temperature should the oven be?",
+    "can I make this ahead of time?",
+    "what can I substitute for butter?",
+    "how do I know when it's done?"
+]
+
+
+class FakePart:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeContent:
+    def __init__(self, role, text):
+        self.role = role
+        self.parts = [FakePart(text)]
+
+
+class FakeChat:
+    """Stands in for a Gemini chat: keeps history and answers after a fixed delay"""
+
+    def __init__(self, latency, history=None):
+        self.latency = latency
+        self.history = history or []
+
+    @property
+    def history(self):
+        return self._history
+
+    @history.setter
+    def history(self, history):
+        self._history = [
+            turn if isinstance(turn, FakeContent) else FakeContent(turn["role"], turn["parts"][0])
+            for turn in history
+        ]
+
+    async def send_message_async(self, query, stream=False):
+        await asyncio.sleep(self.latency)
+        text = f"Here is what the recipe says about: {query}"
+        self._history += [FakeContent("user", query), FakeContent("model", text)]
+        return FakePart(text)
+
+
+def serve_fake(port, model_latency):
+    """Child process: runs asgi_app on uvicorn with a fake model, printing the fixture recipe's id."""
+    import uvicorn
+    import app as flask_app
+    import asgi_app
+    from html_parser import parse_recipe_html, build_recipe
+
+    flask_app.create_chat_session = lambda recipe_data, history=None, recipe_id=None: FakeChat(model_latency, history)
+
+    with open(os.path.join(FIXTURES_DIR, "allrecipes.com.html"), "rb") as f:
+        recipe = build_recipe(*parse_recipe_html(f.read(), "https://www.allrecipes.com/recipe/fixture/"))
+    print(flask_app.recipes.add(recipe, "fixture").recipe_id, flush=True)
+
+    uvicorn.run(asgi_app.app, host="127.0.0.1", port=port, log_level="warning",
+                limit_concurrency=100000, backlog=4096)
+
+
+def start_local_server(model_latency):
+    """
+    Starts the fake-model server in a subprocess, so the load generator doesn't
+    compete with it for the GIL; returns (base URL, recipe id, process).
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve", str(port), "--model-latency", str(model_latency)],
+        stdout=subprocess.PIPE, text=True
+    )
+    recipe_id = process.stdout.readline().strip()
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(200):
+        try:
+            urllib.request.urlopen(f"{base_url}/api/health").close()
+            break
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.05)
+    return base_url, recipe_id, process
+
+
+def parse_remote_recipe(base_url, recipe_url, timeout):
+    """Has a running server parse recipe_url; returns its recipe id."""
+    request = urllib.request.Request(
+        f"{base_url}/api/parse",
+        data=json.dumps({"url": recipe_url, "session_id": "load-test"}).encode("utf-8"),
+        headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.load(response)["recipe_id"]
+
+
+class Connection:
+    """
+    Minimal keep-alive HTTP/1.1 client for POSTing JSON.
+
+    A full client library costs more CPU per request than the server being
+    measured; on a small machine that would make the load generator the bottleneck.
+    """
+
+    def __init__(self, base_url):
+        url = urllib.parse.urlsplit(base_url)
+        self.host, self.port = url.hostname, url.port or 80
+        self.reader = self.writer = None
+
+    async def post_json(self, path, payload):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload).encode("utf-8")
+        self.writer.write(
+            f"POST {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n".encode("ascii") + body
+        )
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        status = int(head.split(b" ", 2)[1])
+        length = 0
+        for line in head.split(b"\r\n")[1:]:
+            name, _, value = line.partition(b":")
+            if name.strip().lower() == b"content-length":
+                length = int(value)
+        await self.reader.readexactly(length)
+        return status
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+async def run_client(base_url, recipe_id, client_id, requests_per_client, timeout, latencies, errors):
+    session_id = f"load-{client_id}-{time.time_ns()}"
+    connection = Connection(base_url)
+    try:
+        for i in range(requests_per_client):
+            start = time.perf_counter()
+            try:
+                status = await asyncio.wait_for(connection.post_json("/api/query", {
+                    "session_id": session_id,
+                    "recipe_id": recipe_id,
+                    "query": QUERIES[(client_id + i) % len(QUERIES)]
+                }), timeout)
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+                errors.append(type(e).__name__)
+                connection.close()
+                connection = Connection(base_url)
+                continue
+            if status != 200:
+                errors.append(status)
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+    finally:
+        connection.close()
+
+
+async def run_level(base_url, recipe_id, concurrency, requests_per_client, timeout):
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        run_client(base_url, recipe_id, n, requests_per_client, timeout, latencies, errors)
+        for n in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - start
+
+    def pct(p):
+        if not latencies:
+            return None
+        ordered = sorted(latencies)
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))], 1)
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies) + len(errors),
+        "errors": len(errors),
+        "elapsed_sec": round(elapsed, 2),
+        "requests_per_sec": round(len(latencies) / elapsed, 1),
+        "latency_ms_p50": pct(50),
+        "latency_ms_p95": pct(95),
+        "latency_ms_p99": pct(99),
+        "latency_ms_mean": round(statistics.mean(latencies), 1) if latencies else None
+    }
+
+
+async def main_async(args):
+    if args.url:
+        base_url = args.url.rstrip("/")
+        recipe_id = args.recipe_id or parse_remote_recipe(base_url, args.recipe_url, args.timeout)
+    else:
+        base_url, recipe_id, server = start_local_server(args.model_latency)
+
+    results = []
+    for concurrency in args.concurrency:
+        result = await run_level(base_url, recipe_id, concurrency, args.requests_per_client, args.timeout)
+        results.append(result)
+        print(
+            f"concurrency {result['concurrency']:>5}: {result['requests_per_sec']:>8} req/s  "
+            f"p50 {result['latency_ms_p50']} ms  p95 {result['latency_ms_p95']} ms  "
+            f"p99 {result['latency_ms_p99']} ms  errors {result['errors']}/{result['requests']}"
+        )
+    if not args.url:
+        server.terminate()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test /api/query at increasing concurrency.")
+    parser.add_argument("--concurrency", default="10,50,100,250,500",
+                        type=lambda value: [int(n) for n in value.split(",")],
+                        help="Comma-separated numbers of concurrent clients")
+    parser.add_argument("--requests-per-client", type=int, default=5)
+    parser.add_argument("--model-latency", type=float, default=1.0,
+                        help="Seconds the fake model takes per reply (local server only)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--url", help="Load an already running server instead of starting one")
+    parser.add_argument("--recipe-url", help="Recipe page the running server should parse")
+    parser.add_argument("--recipe-id", help="Recipe id already parsed by the running server")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve_fake(args.serve, args.model_latency)
+        return
+
+    if args.url and not (args.recipe_url or args.recipe_id):
+        parser.error("--url needs --recipe-url or --recipe-id")
+
+    results = asyncio.run(main_async(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""
+Offline benchmark suite for the parse and query pipeline, with regression tracking.
+
+Runs against the saved pages in benchmarks/fixtures (one per site in
+WEBSITE_CONFIGS) and the fake model backend (model_client.FakeChat), so no network or API key is needed:
+
+  parse.<site>.*   parse_recipe_html through the JSON-LD fast path (jsonld),
+                   through the site's selectors on each installed extraction
+                   backend with structured data off (selectolax, lxml, bs4),
+                   and build_recipe on top of it (atomization and step
+                   annotation, with the spaCy memo cleared so every run is a
+                   first parse): p50/p95 latency and Python heap peak
+  api.parse.*      POST /api/parse with fetching replaced by the fixtures
+  api.query.*      POST /api/query, questions answered by the fake model
+  api.local.*      POST /api/query, questions answered locally by the router
+  api.stream.*     POST /api/query/stream, time to first token and total
+  *.per_sec        sequential and multi-threaded throughput
+
+Results are written as JSON (benchmarks/results/<commit>.json by default)
+so runs on different commits can be compared:
+
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/abc1234.json
+    python benchmarks/run_benchmarks.py --compare old.json new.json --threshold 0.15
+
+Comparing exits with status 1 if any metric got worse by more than the threshold.
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES_DIR = os.path.join(REPO_ROOT, "benchmarks", "fixtures")
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+sys.path.insert(0, REPO_ROOT)
+
+# Keep benchmark runs away from the real recipe cache and session stores
+os.environ.setdefault("RECIPE_CACHE_DISABLED", "1")
+os.environ.setdefault("SESSION_BACKEND", "memory")
+# Model questions should reach the (fake) model on every request
+os.environ.setdefault("RESPONSE_CACHE_DISABLED", "1")
+
+MODEL_QUESTIONS = [
+    "what can I substitute for the cheese?",
+    "can I make this ahead of time?",
+    "how do I know when it's done?",
+]
+LOCAL_QUESTIONS = ["start", "next", "show ingredients", "how many eggs do I need?", "back"]
+# Metrics where a larger value is better; everything else is a latency or a size
+HIGHER_IS_BETTER = ("per_sec",)
+
+
+def percentiles(timings):
+    ordered = sorted(timings)
+
+    def at(fraction):
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 3)
+    return {"p50_ms": at(0.5), "p95_ms": at(0.95), "p99_ms": at(0.99)}
+
+
+def load_fixtures():
+    """{url: html bytes} for every saved page, keyed by a URL on its site."""
+    from html_parser import WEBSITE_CONFIGS
+
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.html"))):
+        site = os.path.basename(path)[:-len(".html")]
+        with open(path, "rb") as f:
+            pages[f"https://www.{site}/recipe/fixture/"] = f.read()
+    missing = [site for site in WEBSITE_CONFIGS if not any(site in url for url in pages)]
+    if missing:
+        print(f"No fixture for {', '.join(missing)}; add benchmarks/fixtures/<site>.html to cover it", file=sys.stderr)
+    return pages
+
+
+def site_of(url):
+    return url.split("://www.", 1)[1].split("/", 1)[0]
+
+
+def bench_parse(pages, runs):
+    """Fetch-free parse latency and memory per site."""
+    from extract_backends import available_backends
+    from html_parser import build_recipe, parse_recipe_html
+    from nlp_pipeline import clear_memo
+
+    def parse_fresh(html, url):
+        clear_memo()
+        return build_recipe(*parse_recipe_html(html, url))
+
+    def select(html, url, backend):
+        # Every fixture has JSON-LD, so the selector path is only timed with it turned off
+        return lambda: parse_recipe_html(html, url, backend=backend, structured_data=False)
+
+    backends = available_backends()
+    results = {}
+    for url, html in pages.items():
+        site = site_of(url)
+        build_recipe(*parse_recipe_html(html, url))  # warm up the spaCy pipeline
+        for backend in backends:
+            select(html, url, backend)()  # and each backend's compiled selectors
+
+        for name, parse in (
+            [("jsonld", lambda: parse_recipe_html(html, url))]
+            + [(backend, select(html, url, backend)) for backend in backends]
+            + [("recipe", lambda: parse_fresh(html, url))]
+        ):
+            timings = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                parse()
+                timings.append((time.perf_counter() - start) * 1000)
+            for key, value in percentiles(timings).items():
+                if key != "p99_ms":
+                    results[f"parse.{site}.{name}.{key}"] = value
+
+        tracemalloc.start()
+        parse_fresh(html, url)
+        results[f"parse.{site}.heap_peak_kb"] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+        tracemalloc.stop()
+    return results
+
+
+def time_requests(send, count, threads=1):
+    """Latencies of count calls to send(i), and calls per second with the given number of threads."""
+    timings = []
+
+    def timed(i):
+        start = time.perf_counter()
+        send(i)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    if threads == 1:
+        for i in range(count):
+            timed(i)
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(timed, range(count)))
+    return timings, count / (time.perf_counter() - start)
+
+
+def bench_api(pages, requests, threads, model_latency):
+    """End-to-end request latency through the Flask app with the fake model backend."""
+    import app as flask_app
+    from model_client import ModelClient, set_model_client
+
+    flask_app.process_url = lambda url: _parse_fixture(pages, url)
+    set_model_client(ModelClient(backend="fake", fake_latency=model_latency))
+    client = flask_app.app.test_client()
+
+    def post(path, body):
+        response = client.post(path, json=body)
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        return response
+
+    results = {}
+    urls = list(pages)
+    timings, _ = time_requests(lambda i: post("/api/parse", {"url": urls[i % len(urls)], "session_id": "parse"}),
+                               max(requests // 5, len(urls)))
+    results.update({f"api.parse.{key}": value for key, value in percentiles(timings).items()})
+
+    recipe_id = post("/api/parse", {"url": urls[0], "session_id": "bench"}).get_json()["recipe_id"]
+
+    def query(questions, session_prefix):
+        # A new session every 10 questions, so session creation is part of the measurement
+        return lambda i: post("/api/query", {
+            "query": questions[i % len(questions)],
+            "session_id": f"{session_prefix}-{i // 10}",
+            "recipe_id": recipe_id
+        })
+
+    for name, questions in (("query", MODEL_QUESTIONS), ("local", LOCAL_QUESTIONS)):
+        timings, per_sec = time_requests(query(questions, name), requests)
+        results.update({f"api.{name}.{key}": value for key, value in percentiles(timings).items()})
+        results[f"api.{name}.per_sec"] = round(per_sec, 1)
+        if threads > 1:
+            _, per_sec = time_requests(query(questions, f"{name}-threaded"), requests, threads)
+            results[f"api.{name}.threaded_per_sec"] = round(per_sec, 1)
+
+    ttfts, totals = [], []
+    for i in range(max(requests // 5, 1)):
+        start = time.perf_counter()
+        response = client.post("/api/query/stream", json={
+            "query": MODEL_QUESTIONS[i % len(MODEL_QUESTIONS)], "session_id": "stream", "recipe_id": recipe_id
+        }, buffered=False)
+        first = None
+        for _ in response.response:
+            if first is None:
+                first = time.perf_counter()
+        response.close()
+        ttfts.append((first - start) * 1000)
+        totals.append((time.perf_counter() - start) * 1000)
+    results["api.stream.ttft_p50_ms"] = percentiles(ttfts)["p50_ms"]
+    results["api.stream.total_p50_ms"] = percentiles(totals)["p50_ms"]
+    return results
+
+
+def _parse_fixture(pages, url):
+    from html_parser import build_recipe, parse_recipe_html
+    return build_recipe(*parse_recipe_html(pages[url], url))
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+
+
+def run(args):
+    pages = load_fixtures()
+    metrics = bench_parse(pages, args.runs)
+    metrics.update(bench_api(pages, args.requests, args.threads, args.model_latency))
+    commit, dirty = git_revision()
+    return {
+        "meta": {
+            "commit": commit,
+            "dirty": dirty,
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "runs": args.runs,
+            "requests": args.requests,
+            "threads": args.threads,
+            "model_latency": args.model_latency
+        },
+        "metrics": metrics
+    }
+
+
+def compare(baseline, current, threshold):
+    """
+    Prints every metric side by side and returns the ones that regressed by more than threshold.
+
+    Returns:
+        list of metric names
+    """
+    regressions = []
+    print(f"baseline {baseline['meta']['commit']}{'+' if baseline['meta'].get('dirty') else ''}  "
+          f"current {current['meta']['commit']}{'+' if current['meta'].get('dirty') else ''}")
+    print(f"{'metric':<42}{'baseline':>12}{'current':>12}{'change':>9}")
+    for name in sorted(set(baseline["metrics"]) | set(current["metrics"])):
+        old, new = baseline["metrics"].get(name), current["metrics"].get(name)
+        if old is None or new is None:
+            print(f"{name:<42}{str(old):>12}{str(new):>12}{'':>9}")
+            continue
+        change = (new - old) / old if old else 0.0
+        worse = -change if name.endswith(HIGHER_IS_BETTER) else change
+        flag = ""
+        if worse > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<42}{old:>12}{new:>12}{change:>+9.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20, help="Timed parses per fixture")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per API measurement")
+    parser.add_argument("--threads", type=int, default=8, help="Client threads for the threaded throughput runs")
+    parser.add_argument("--model-latency", type=float, default=0.0, help="Seconds the fake model takes per reply")
+    parser.add_argument("--output", help="Where to write the results (default benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", nargs="+", metavar="RESULTS",
+                        help="Baseline results to compare against; with two files, compare them without running")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change counted as a regression")
+    args = parser.parse_args()
+
+    if args.compare and len(args.compare) == 2:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+        sys.exit(1 if compare(baseline, current, args.threshold) else 0)
+
+    results = run(args)
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        suffix = "-dirty" if results["meta"]["dirty"] else ""
+        output = os.path.join(RESULTS_DIR, f"{results['meta']['commit']}{suffix}.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {output}")
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+    else:
+        for name, value in results["metrics"].items():
+            print(f"{name:<42}{value:>12}")
+
+
+if __name__ == "__main__":
+    main()
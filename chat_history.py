@@ -0,0 +1,186 @@
+import os
+import re
+import time
+from collections import deque
+
+# Token budget for a session's chat history. Every model call resends the
+# whole history, so once a session passes the budget its older exchanges are
+# folded into a short summary and the call cost stops growing with its length.
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", 4000))
+# Compacting goes down to this fraction of the budget, so it happens every few
+# turns rather than on every turn once a session reaches the budget
+HISTORY_COMPACT_TO = float(os.getenv("HISTORY_COMPACT_TO", 0.6))
+# Most recent exchanges always kept verbatim, even over budget
+HISTORY_KEEP_EXCHANGES = int(os.getenv("HISTORY_KEEP_EXCHANGES", 3))
+# Token usage samples kept per session for /api/status
+HISTORY_USAGE_SAMPLES = int(os.getenv("HISTORY_USAGE_SAMPLES", 50))
+# The seeded recipe prompt and the model's "Ready!" reply (see recipe_context.build_seed_history)
+PINNED_TURNS = 2
+# Rough count for English text; close enough for a budget, and needs no round trip
+CHARS_PER_TOKEN = 4
+SUMMARY_QUESTIONS = 8
+SUMMARY_QUESTION_CHARS = 120
+SUMMARY_MARKER = "(Earlier conversation, summarized)"
+STEP_LINE = re.compile(r'Step (\d+):[^\n]*')
+
+
+def estimate_tokens(text):
+    """Approximate model tokens in a string (about four characters each)."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def history_tokens(history):
+    """Approximate tokens in a serialized history (see session_store.serialize_history)."""
+    return sum(estimate_tokens(text) for turn in history for text in turn["parts"])
+
+
+def _is_summary(turn):
+    return turn["role"] == "user" and bool(turn["parts"]) and turn["parts"][0].startswith(SUMMARY_MARKER)
+
+
+def _exchanges(turns):
+    # A user turn and the model turns answering it
+    exchanges = []
+    for turn in turns:
+        if turn["role"] == "user" or not exchanges:
+            exchanges.append([turn])
+        else:
+            exchanges[-1].append(turn)
+    return exchanges
+
+
+def _last_step(turns):
+    # Same rule as intent_router.current_step_from_history: the last "Step X:" the model showed
+    for turn in reversed(turns):
+        if turn["role"] != "model":
+            continue
+        for text in reversed(turn["parts"]):
+            lines = [match.group(0) for match in STEP_LINE.finditer(text)]
+            if lines:
+                return lines[-1]
+    return None
+
+
+def _summarize(questions, step_line):
+    lines = "\n".join(f"- {question}" for question in questions)
+    user = f"{SUMMARY_MARKER} Earlier I asked about:\n{lines}" if lines else SUMMARY_MARKER
+    if step_line:
+        model = f"Noted. We are on {step_line}"
+    else:
+        model = "Noted. We haven't started the step-by-step walkthrough yet."
+    return [{"role": "user", "parts": [user]}, {"role": "model", "parts": [model]}]
+
+
+def compact_history(history, budget=HISTORY_TOKEN_BUDGET, keep_exchanges=HISTORY_KEEP_EXCHANGES):
+    """
+    Shrinks a serialized chat history to fit a token budget.
+
+    The recipe context (the seeded first exchange) is always kept. The
+    newest exchanges are kept verbatim while they fit in HISTORY_COMPACT_TO
+    of the budget; older ones are replaced by one summary exchange listing
+    the user's earlier questions and restating the current step as
+    "Step X: ...", so the model and intent_router.current_step_from_history
+    still agree on where the user is.
+    Compacting an already compacted history folds the old summary into the new one.
+
+    Args:
+        history (list): [{'role': ..., 'parts': [text, ...]}, ...]
+        budget (int): Approximate token budget for the whole history
+        keep_exchanges (int): Newest exchanges kept even if over budget
+
+    Returns:
+        list: The compacted history, or None if it is within budget
+    """
+    if history_tokens(history) <= budget:
+        return None
+
+    pinned = history[:PINNED_TURNS]
+    rest = history[PINNED_TURNS:]
+    questions = []
+    summarized = []
+    if len(rest) >= 2 and _is_summary(rest[0]):
+        questions = [line[2:] for line in rest[0]["parts"][0].splitlines() if line.startswith("- ")]
+        summarized = rest[:2]
+        rest = rest[2:]
+
+    exchanges = _exchanges(rest)
+    # Leave room for the summary itself
+    summary_tokens = estimate_tokens(SUMMARY_MARKER) * 2 + SUMMARY_QUESTIONS * SUMMARY_QUESTION_CHARS // CHARS_PER_TOKEN
+    available = int(budget * HISTORY_COMPACT_TO) - history_tokens(pinned) - summary_tokens
+    kept = 0
+    used = 0
+    for exchange in reversed(exchanges):
+        size = history_tokens(exchange)
+        if kept >= keep_exchanges and used + size > available:
+            break
+        kept += 1
+        used += size
+    dropped = exchanges[:len(exchanges) - kept]
+    if not dropped:
+        return None
+
+    dropped_turns = [turn for exchange in dropped for turn in exchange]
+    for turn in dropped_turns:
+        if turn["role"] == "user" and turn["parts"]:
+            question = " ".join(turn["parts"][0].split())
+            if len(question) > SUMMARY_QUESTION_CHARS:
+                question = question[:SUMMARY_QUESTION_CHARS - 3].rstrip() + "..."
+            questions.append(question)
+    step_line = _last_step(summarized + dropped_turns)
+
+    kept_turns = [turn for exchange in exchanges[len(dropped):] for turn in exchange]
+    return pinned + _summarize(questions[-SUMMARY_QUESTIONS:], step_line) + kept_turns
+
+
+class TokenUsage:
+    """Token accounting for one session: history size after each turn and what the model reported"""
+    __slots__ = ("history_tokens", "peak_tokens", "prompt_tokens", "output_tokens",
+                 "turns", "compactions", "samples")
+
+    def __init__(self):
+        self.history_tokens = 0
+        self.peak_tokens = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.turns = 0
+        self.compactions = 0
+        self.samples = deque(maxlen=HISTORY_USAGE_SAMPLES)
+
+    def record(self, tokens, response=None, compacted=False, turn=True):
+        """
+        Records a session's history size after a turn.
+
+        Args:
+            tokens (int): Estimated history tokens after the turn (and any compaction)
+            response: Model response for the turn, if the model answered; its
+                usage_metadata holds the real prompt and reply token counts
+            compacted (bool): Whether the history was compacted
+            turn (bool): False when saving a freshly seeded or reset session
+        """
+        usage = getattr(response, "usage_metadata", None)
+        prompt = getattr(usage, "prompt_token_count", 0) or 0
+        output = getattr(usage, "candidates_token_count", 0) or 0
+        self.history_tokens = tokens
+        self.peak_tokens = max(self.peak_tokens, tokens)
+        self.prompt_tokens += prompt
+        self.output_tokens += output
+        self.turns += turn
+        self.compactions += compacted
+        self.samples.append({
+            "timestamp": round(time.time(), 3),
+            "history_tokens": tokens,
+            "prompt_tokens": prompt,
+            "output_tokens": output,
+            "compacted": compacted
+        })
+
+    def to_dict(self):
+        return {
+            "history_tokens": self.history_tokens,
+            "peak_history_tokens": self.peak_tokens,
+            "prompt_tokens": self.prompt_tokens,
+            "output_tokens": self.output_tokens,
+            "turns": self.turns,
+            "compactions": self.compactions,
+            "samples": list(self.samples)
+        }
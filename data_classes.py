@@ -1,15 +1,81 @@
+import struct
+
+# Binary layout used by to_bytes/from_bytes and recipe_to_bytes (little-endian):
+#   magic | counts | ingredient quantities (float64 pairs, NaN for None or text) |
+#   step integers | description offsets | NUL-separated UTF-8 strings | descriptions
+# Numbers are unpacked with one struct call per section and all short strings
+# with a single decode and split, so decoding stays close to C speed.
+_RECIPE_MAGIC = b"RCP3"
+_HEADER = struct.Struct("<III")  # ingredients, steps, bytes of strings
+_STEP_INTS = 6  # step_number, ingredients, tools, methods, time pairs, temperature pairs (-1 = plain string)
+_NAN = float("nan")
+
+
+def _value_strings(value):
+    # Step.time is a dict of strings ({"duration": "10 minutes"}); Step.temperature a string ("350°F")
+    if isinstance(value, dict):
+        return len(value), [str(item) for pair in value.items() for item in pair]
+    return -1, [str(value)]
+
+
+def _quantity(value):
+    # (float64 slot, text slot): numbers go in the float, anything else
+    # (a raw "½" or "1 1/2" not run through quantities.parse_ingredient) as text
+    if value is None:
+        return _NAN, ""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value), ""
+    return _NAN, str(value)
+
+
+def _read_value(count, strings, position):
+    # Returns (value, next position in strings)
+    if count < 0:
+        return strings[position], position + 1
+    end = position + 2 * count
+    return dict(zip(strings[position:end:2], strings[position + 1:end:2])), end
+
+
 class Ingredient:
-    """Represents a recipe ingredient"""
-    def __init__(self, name, quantity, measurement_unit):
+    """Represents a recipe ingredient (quantity_max is the top of a range like "2 to 3")"""
+    __slots__ = ("name", "quantity", "measurement_unit", "quantity_max", "size", "note")
+
+    def __init__(self, name, quantity, measurement_unit, quantity_max=None, size="", note=""):
         self.name = name
         self.quantity = quantity
         self.measurement_unit = measurement_unit
-    
+        self.quantity_max = quantity_max
+        self.size = size
+        self.note = note
+
     def __repr__(self):
         return f"Ingredient(name='{self.name}', quantity='{self.quantity}', measurement_unit='{self.measurement_unit}')"
 
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def to_bytes(self):
+        return recipe_to_bytes("", [self], [])
+
+    @classmethod
+    def from_bytes(cls, data):
+        return recipe_from_bytes(data)[1][0]
+
+
 class Step:
-    """Represents a recipe step"""
+    """
+    Represents a recipe step
+
+    A Step decoded with from_bytes keeps its description as raw UTF-8 and
+    only decodes it the first time it is read.
+    """
+    __slots__ = ("step_number", "_description", "_description_bytes", "ingredients", "tools", "methods",
+                 "time", "temperature", "type")
+
     def __init__(self, step_number, description, ingredients=None, tools=None, methods=None, time=None, temperature=None, type="Observation"):
         self.step_number = step_number
         self.description = description
@@ -17,8 +83,159 @@ class Step:
         self.tools = tools if tools is not None else []
         self.methods = methods if methods is not None else []
         self.time = time if time is not None else {}
-        self.temperature = temperature if temperature is not None else {}
+        # A string such as "350°F" or "medium-high", "" if the step gives none
+        # (steps stored before temperatures were annotated may hold {})
+        self.temperature = temperature or ""
         self.type = type
-    
+
+    @property
+    def description(self):
+        if self._description is None:
+            self._description = str(self._description_bytes, "utf-8")
+            self._description_bytes = None
+        return self._description
+
+    @description.setter
+    def description(self, text):
+        self._description = text
+        self._description_bytes = None
+
     def __repr__(self):
-        return f"Step(step_number={self.step_number}, description='{self.description[:50]}...', ingredients={self.ingredients}, tools={self.tools})"
\ No newline at end of file
+        return f"Step(step_number={self.step_number}, description='{self.description[:50]}...', ingredients={self.ingredients}, tools={self.tools})"
+
+    def to_dict(self):
+        return {
+            "step_number": self.step_number,
+            "description": self.description,
+            "ingredients": self.ingredients,
+            "tools": self.tools,
+            "methods": self.methods,
+            "time": self.time,
+            "temperature": self.temperature,
+            "type": self.type
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def to_bytes(self):
+        return recipe_to_bytes("", [], [self])
+
+    @classmethod
+    def from_bytes(cls, data):
+        return recipe_from_bytes(data)[2][0]
+
+
+def recipe_to_bytes(url, ingredients, steps):
+    """
+    Packs a parsed recipe into the compact binary format.
+
+    Args:
+        url (str): Recipe URL
+        ingredients (list): Ingredient objects
+        steps (list): Step objects
+
+    Returns:
+        bytes
+    """
+    strings = [url or ""]
+    quantities = []
+    for ingredient in ingredients:
+        quantity, quantity_text = _quantity(ingredient.quantity)
+        quantity_max, quantity_max_text = _quantity(ingredient.quantity_max)
+        quantities += (quantity, quantity_max)
+        strings += (ingredient.name or "", ingredient.measurement_unit or "", ingredient.size or "", ingredient.note or "",
+                    quantity_text, quantity_max_text)
+
+    step_ints = []
+    descriptions = []
+    offsets = [0]
+    for step in steps:
+        time_count, time_strings = _value_strings(step.time)
+        temperature_count, temperature_strings = _value_strings(step.temperature)
+        step_ints += (step.step_number, len(step.ingredients), len(step.tools), len(step.methods),
+                      time_count, temperature_count)
+        strings += step.ingredients
+        strings += step.tools
+        strings += step.methods
+        strings += time_strings
+        strings += temperature_strings
+        strings.append(step.type)
+        # A step that was never read still holds its encoded description
+        description = step._description_bytes if step._description is None else step._description.encode("utf-8")
+        descriptions.append(description)
+        offsets.append(offsets[-1] + len(description))
+
+    text = "\0".join(strings)
+    if text.count("\0") != len(strings) - 1:
+        raise ValueError("Recipe strings may not contain NUL characters")
+    text = text.encode("utf-8")
+    return b"".join((
+        _RECIPE_MAGIC,
+        _HEADER.pack(len(ingredients), len(steps), len(text)),
+        struct.pack(f"<{len(quantities)}d", *quantities),
+        struct.pack(f"<{len(step_ints)}i", *step_ints),
+        struct.pack(f"<{len(offsets)}I", *offsets),
+        text,
+        *descriptions
+    ))
+
+
+def recipe_from_bytes(data):
+    """
+    Unpacks a recipe written by recipe_to_bytes.
+
+    Step descriptions are left encoded until they are first read.
+
+    Returns:
+        (url, ingredients, steps)
+    """
+    if not isinstance(data, bytes):
+        data = bytes(data)
+    if data[:4] != _RECIPE_MAGIC:
+        raise ValueError("Not a packed recipe")
+    ingredient_count, step_count, text_length = _HEADER.unpack_from(data, 4)
+    offset = 4 + _HEADER.size
+    quantities = struct.unpack_from(f"<{2 * ingredient_count}d", data, offset)
+    offset += 16 * ingredient_count
+    step_ints = struct.unpack_from(f"<{_STEP_INTS * step_count}i", data, offset)
+    offset += 4 * _STEP_INTS * step_count
+    description_offsets = struct.unpack_from(f"<{step_count + 1}I", data, offset)
+    offset += 4 * (step_count + 1)
+    strings = data[offset:offset + text_length].decode("utf-8").split("\0")
+    descriptions = data[offset + text_length:]
+
+    url = strings[0]
+    ingredients = []
+    position = 1
+    for index in range(ingredient_count):
+        ingredient = Ingredient.__new__(Ingredient)
+        quantity, quantity_max = quantities[2 * index], quantities[2 * index + 1]
+        (ingredient.name, ingredient.measurement_unit, ingredient.size, ingredient.note,
+         quantity_text, quantity_max_text) = strings[position:position + 6]
+        position += 6
+        ingredient.quantity = quantity_text or (None if quantity != quantity else quantity)
+        ingredient.quantity_max = quantity_max_text or (None if quantity_max != quantity_max else quantity_max)
+        ingredients.append(ingredient)
+
+    steps = []
+    for index in range(step_count):
+        number, ingredient_total, tool_total, method_total, time_count, temperature_count = \
+            step_ints[_STEP_INTS * index:_STEP_INTS * (index + 1)]
+        step = Step.__new__(Step)
+        step.step_number = number
+        step._description = None
+        step._description_bytes = descriptions[description_offsets[index]:description_offsets[index + 1]]
+        step.ingredients = strings[position:position + ingredient_total]
+        position += ingredient_total
+        step.tools = strings[position:position + tool_total]
+        position += tool_total
+        step.methods = strings[position:position + method_total]
+        position += method_total
+        step.time, position = _read_value(time_count, strings, position)
+        step.temperature, position = _read_value(temperature_count, strings, position)
+        step.type = strings[position]
+        position += 1
+        steps.append(step)
+    return url, ingredients, steps
@@ -0,0 +1,348 @@
+import os
+import re
+
+from metrics import span
+
+# Which HTML backend parse_recipe_html uses: "auto", "selectolax", "lxml" or "bs4".
+# "auto" picks the fastest one that is installed.
+PARSER_BACKEND = os.getenv("HTML_PARSER_BACKEND", "auto").lower()
+BACKEND_PREFERENCE = ("selectolax", "lxml", "bs4")
+
+
+def css_for(item_config):
+    """
+    Converts a selector entry from WEBSITE_CONFIGS into a CSS selector.
+
+    Entries have a "tag" and optionally "class" (all of these classes),
+    "attrs" (exact attribute values), "id_contains" or "class_contains"
+    (substring of the id / class attribute).
+
+    Args:
+        item_config (dict): Selector entry from WEBSITE_CONFIGS
+
+    Returns:
+        str: e.g. 'p.comp.mntl-sc-block', 'span[data-ingredient-unit="true"]' or 'div[id*="mm-recipes-steps"]'
+    """
+    selector = item_config["tag"]
+    if item_config.get("class"):
+        selector += "".join("." + name for name in item_config["class"].split())
+    for name, value in (item_config.get("attrs") or {}).items():
+        selector += f'[{name}="{value}"]'
+    if item_config.get("id_contains"):
+        selector += f'[id*="{item_config["id_contains"]}"]'
+    if item_config.get("class_contains"):
+        selector += f'[class*="{item_config["class_contains"]}"]'
+    return selector
+
+
+def site_selectors(config):
+    """
+    Derives every CSS selector a backend needs for one site.
+
+    Instructions are looked up inside "instruction_container" first (the
+    whole page if the site has none or it isn't found); if nothing matches,
+    each of "instruction_fallbacks" is tried on the whole page, in order.
+    Ingredients fall back to every element with the ingredient tag.
+
+    Args:
+        config (dict): The site's WEBSITE_CONFIGS entry
+
+    Returns:
+        dict: Selector strings keyed by role
+    """
+    fields = config["ingredient_fields"]
+    container = config.get("instruction_container")
+    return {
+        "ingredient_item": css_for(config["ingredient_item"]),
+        "ingredient_any": config["ingredient_item"]["tag"],
+        "fields": None if fields is None else {
+            name: css_for(fields[name]) for name in ("quantity", "unit", "name")
+        },
+        "instruction_item": css_for(config["instruction_item"]),
+        "instruction_container": css_for(container) if container else None,
+        "instruction_fallbacks": [css_for(fallback) for fallback in config.get("instruction_fallbacks", ())],
+    }
+
+
+class SitePlan:
+    """
+    A site's extraction plan, compiled once from its WEBSITE_CONFIGS entry.
+
+    Holds the CSS selectors and, per backend, their compiled form, so
+    parsing a page does no selector building or compiling.
+    """
+    __slots__ = ("site", "config", "selectors", "_compiled")
+
+    def __init__(self, site, config):
+        self.site = site
+        self.config = config
+        self.selectors = site_selectors(config)
+        self._compiled = {}
+
+    def compiled(self, backend):
+        """The plan compiled for a backend (compiled on the backend's first page)."""
+        compiled = self._compiled.get(backend.name)
+        if compiled is None:
+            compiled = self._compiled[backend.name] = backend.compile(self)
+        return compiled
+
+
+def compile_site_plans(configs):
+    """
+    Compiles WEBSITE_CONFIGS into extraction plans.
+
+    Args:
+        configs (dict): {site host: config}
+
+    Returns:
+        dict: {site host: SitePlan}
+    """
+    return {site: SitePlan(site, config) for site, config in configs.items()}
+
+
+def append_ingredient(ingredients, quantity, unit, name):
+    """
+    Adds a structured (AllRecipes, Serious Eats) ingredient to the list as "quantity unit name".
+
+    Unquantified names joined with "and" are split into separate ingredients,
+    e.g. "salt and ground black pepper" -> ["salt", "ground black pepper"].
+    """
+    if ' and ' in name and not quantity:  # Only split if there's no quantity
+        for part in name.split(' and '):
+            part = part.strip()
+            if part:
+                ingredients.append(part)
+    else:
+        ingredient_str = " ".join(part for part in (quantity, unit, name) if part)
+        if ingredient_str:
+            ingredients.append(ingredient_str)
+
+
+def _to_text(html):
+    if isinstance(html, bytes):
+        return html.decode("utf-8", errors="replace")
+    return html
+
+
+def _extract(root, selectors, select, select_one, text_of):
+    # Shared extraction walk, parameterized by the backend's query functions
+    ingredients = []
+    instructions = []
+
+    items = select(root, "ingredient_item")
+    if not items:
+        items = select(root, "ingredient_any")
+
+    fields = selectors["fields"]
+    for item in items:
+        if fields is None:
+            # Food Network style: single text string
+            text = text_of(item)
+            if text:
+                ingredients.append(text)
+        else:
+            values = []
+            for field in ("quantity", "unit", "name"):
+                node = select_one(item, ("fields", field))
+                values.append(text_of(node) if node is not None else "")
+            append_ingredient(ingredients, *values)
+
+    scope = root
+    if selectors["instruction_container"]:
+        container = select_one(root, "instruction_container")
+        if container is not None:
+            scope = container
+    items = select(scope, "instruction_item")
+    for index in range(len(selectors["instruction_fallbacks"])):
+        if items:
+            break
+        items = select(root, ("instruction_fallbacks", index))
+
+    for item in items:
+        text = text_of(item)
+        if text:
+            instructions.append(text)
+
+    return ingredients, instructions
+
+
+def _lookup(compiled, key):
+    if isinstance(key, tuple):
+        return compiled[key[0]][key[1]]
+    return compiled[key]
+
+
+def _compile_with(compile_css, selectors):
+    # Replaces every selector string with compile_css(selector)
+    compiled = dict(selectors)
+    for key in ("ingredient_item", "ingredient_any", "instruction_item", "instruction_container"):
+        if selectors[key]:
+            compiled[key] = compile_css(selectors[key])
+    if selectors["fields"]:
+        compiled["fields"] = {name: compile_css(css) for name, css in selectors["fields"].items()}
+    compiled["instruction_fallbacks"] = [compile_css(css) for css in selectors["instruction_fallbacks"]]
+    return compiled
+
+
+class SelectolaxBackend:
+    """Extraction on selectolax's Lexbor parser (fastest, C implementation)"""
+    name = "selectolax"
+
+    def __init__(self):
+        from selectolax.lexbor import LexborHTMLParser
+        self._parser = LexborHTMLParser
+
+    def compile(self, plan):
+        # selectolax compiles and caches CSS internally, so the strings are the plan
+        return plan.selectors
+
+    def extract(self, html, plan):
+        compiled = plan.compiled(self)
+        tree = self._parser(_to_text(html))
+        return _extract(
+            tree.root, compiled,
+            select=lambda node, key: node.css(_lookup(compiled, key)),
+            select_one=lambda node, key: node.css_first(_lookup(compiled, key)),
+            text_of=lambda node: node.text(deep=True, separator="", strip=True),
+        )
+
+
+class LxmlBackend:
+    """Extraction on lxml.html with CSS selectors precompiled to XPath"""
+    name = "lxml"
+
+    def __init__(self):
+        import lxml.html
+        from lxml.cssselect import CSSSelector  # needs the cssselect package
+        self._fromstring = lxml.html.document_fromstring
+        self._selector = CSSSelector
+
+    def compile(self, plan):
+        return _compile_with(self._selector, plan.selectors)
+
+    def extract(self, html, plan):
+        compiled = plan.compiled(self)
+        root = self._fromstring(_to_text(html))
+
+        def select_one(node, key):
+            matches = _lookup(compiled, key)(node)
+            return matches[0] if matches else None
+
+        return _extract(
+            root, compiled,
+            select=lambda node, key: _lookup(compiled, key)(node),
+            select_one=select_one,
+            # Same as BeautifulSoup's get_text(strip=True): stripped text nodes joined with ""
+            text_of=lambda node: "".join(t.strip() for t in node.xpath(".//text()")),
+        )
+
+
+def _find_args(item_config):
+    # A WEBSITE_CONFIGS selector entry as BeautifulSoup find()/find_all() arguments.
+    # "class" matches the whole class attribute, as the configs were written for it.
+    attrs = dict(item_config.get("attrs") or {})
+    if item_config.get("class"):
+        attrs["class"] = item_config["class"]
+    if item_config.get("id_contains"):
+        attrs["id"] = re.compile(re.escape(item_config["id_contains"]))
+    if item_config.get("class_contains"):
+        attrs["class"] = re.compile(re.escape(item_config["class_contains"]))
+    return item_config["tag"], attrs
+
+
+class Bs4Backend:
+    """
+    Extraction on BeautifulSoup's html.parser (always available)
+
+    Plans compile to find_all() arguments with precompiled regexes, which
+    BeautifulSoup matches faster than it evaluates CSS selectors.
+    """
+    name = "bs4"
+
+    def compile(self, plan):
+        config = plan.config
+        fields = config["ingredient_fields"]
+        container = config.get("instruction_container")
+        return {
+            "ingredient_item": _find_args(config["ingredient_item"]),
+            "ingredient_any": (config["ingredient_item"]["tag"], {}),
+            "fields": None if fields is None else {
+                name: _find_args(fields[name]) for name in ("quantity", "unit", "name")
+            },
+            "instruction_item": _find_args(config["instruction_item"]),
+            "instruction_container": _find_args(container) if container else None,
+            "instruction_fallbacks": [_find_args(fallback) for fallback in config.get("instruction_fallbacks", ())],
+        }
+
+    def extract(self, html, plan):
+        from bs4 import BeautifulSoup
+
+        compiled = plan.compiled(self)
+
+        def select(node, key):
+            tag, attrs = _lookup(compiled, key)
+            return node.find_all(tag, attrs=attrs)
+
+        def select_one(node, key):
+            tag, attrs = _lookup(compiled, key)
+            return node.find(tag, attrs=attrs)
+
+        with span("soup"):
+            soup = BeautifulSoup(html, 'html.parser')
+        return _extract(soup, compiled, select=select, select_one=select_one,
+                        text_of=lambda node: node.get_text(strip=True))
+
+
+BACKEND_CLASSES = {
+    "selectolax": SelectolaxBackend,
+    "lxml": LxmlBackend,
+}
+
+_backends = {}
+_bs4_backend = None
+
+
+def get_backend(name=None):
+    """
+    Returns a ready extraction backend.
+
+    Args:
+        name (str): "auto", "selectolax", "lxml" or "bs4"; defaults to HTML_PARSER_BACKEND
+
+    Returns:
+        Backend instance, or None for the BeautifulSoup path in html_parser
+        (also used when the requested backend's package is not installed)
+    """
+    name = (name or PARSER_BACKEND).lower()
+    candidates = BACKEND_PREFERENCE if name == "auto" else (name,)
+    for candidate in candidates:
+        if candidate == "bs4":
+            return None
+        if candidate in _backends:
+            if _backends[candidate] is not None:
+                return _backends[candidate]
+            continue
+        cls = BACKEND_CLASSES.get(candidate)
+        if cls is None:
+            raise ValueError(f"Unknown HTML parser backend: {candidate}")
+        try:
+            _backends[candidate] = cls()
+        except ImportError:
+            _backends[candidate] = None
+            continue
+        return _backends[candidate]
+    return None
+
+
+def get_bs4_backend():
+    """The BeautifulSoup backend, used by html_parser.parse_recipe_html_bs4 and as the fallback."""
+    global _bs4_backend
+    if _bs4_backend is None:
+        _bs4_backend = Bs4Backend()
+    return _bs4_backend
+
+
+def available_backends():
+    """Names of the backends that can be used in this environment."""
+    names = [name for name in BACKEND_CLASSES if get_backend(name) is not None]
+    return names + ["bs4"]
@@ -0,0 +1,154 @@
+import os
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Timeouts, retry and pooling limits for page downloads. All of these can be
+# overridden from the .env file alongside GEMINI_API_KEY.
+CONNECT_TIMEOUT = float(os.getenv("FETCH_CONNECT_TIMEOUT", 5))  # seconds
+READ_TIMEOUT = float(os.getenv("FETCH_READ_TIMEOUT", 15))  # seconds
+MAX_RETRIES = int(os.getenv("FETCH_MAX_RETRIES", 3))
+BACKOFF_FACTOR = float(os.getenv("FETCH_BACKOFF_FACTOR", 0.5))  # 0.5s, 1s, 2s, ...
+MAX_CONNECTIONS_PER_HOST = int(os.getenv("FETCH_MAX_PER_HOST", 4))
+MAX_HOSTS = 16
+# Longest wait honoured from a Retry-After header (seconds); longer requests are cut to this
+MAX_RETRY_AFTER = float(os.getenv("FETCH_MAX_RETRY_AFTER", READ_TIMEOUT))
+
+# Status codes that are worth retrying (rate limiting and transient server errors)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Read url with user-agent header (some sites block requests without it)
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# urllib3 transparently decodes brotli when one of these packages is installed
+try:
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        ACCEPT_ENCODING = "gzip, deflate, br"
+    except ImportError:
+        ACCEPT_ENCODING = "gzip, deflate"
+
+
+class CappedRetry(Retry):
+    """Retry that waits at most max_retry_after seconds when a server sends Retry-After"""
+
+    def __init__(self, *args, max_retry_after=MAX_RETRY_AFTER, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_retry_after = max_retry_after
+
+    def new(self, **kwargs):
+        # urllib3 builds a new Retry after every attempt
+        retry = super().new(**kwargs)
+        retry.max_retry_after = self.max_retry_after
+        return retry
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, self.max_retry_after)
+
+
+class Fetcher:
+    """
+    Shared HTTP client for downloading recipe pages.
+
+    Keeps one keep-alive connection pool per host, bounds every request with a
+    connect and read timeout, retries connection errors and retryable status
+    codes with exponential backoff (honouring Retry-After up to max_retry_after
+    seconds), and caps how many requests may be in flight to a single host at once.
+    """
+
+    def __init__(self, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 max_retries=MAX_RETRIES, backoff_factor=BACKOFF_FACTOR,
+                 max_per_host=MAX_CONNECTIONS_PER_HOST, headers=None, max_retry_after=MAX_RETRY_AFTER):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_per_host = max_per_host
+        self._host_slots = {}
+        self._host_slots_lock = threading.Lock()
+
+        retry = CappedRetry(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(["GET", "HEAD"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+            max_retry_after=max_retry_after
+        )
+        # pool_connections is the number of per-host pools kept alive,
+        # pool_maxsize the number of reusable connections in each of them
+        adapter = HTTPAdapter(
+            pool_connections=MAX_HOSTS,
+            pool_maxsize=max_per_host,
+            max_retries=retry
+        )
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(DEFAULT_HEADERS if headers is None else headers)
+        self.session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+
+    def _slot_for(self, url):
+        host = urlsplit(url).netloc.lower()
+        with self._host_slots_lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = threading.BoundedSemaphore(self.max_per_host)
+                self._host_slots[host] = slot
+        return slot
+
+    def fetch(self, url, extra_headers=None, timeout=None):
+        """
+        Downloads a page, waiting for a free per-host slot first.
+
+        Args:
+            url (str): URL to download
+            extra_headers (dict): Additional request headers (e.g. conditional request headers)
+            timeout (tuple): (connect, read) timeout in seconds, defaults to the fetcher's
+
+        Returns:
+            requests.Response (already decompressed)
+
+        Raises:
+            requests.RequestException: if the page could not be fetched after all retries
+        """
+        with self._slot_for(url):
+            return self.session.get(
+                url,
+                headers=extra_headers,
+                timeout=timeout or self.timeout
+            )
+
+    def close(self):
+        self.session.close()
+
+
+_default_fetcher = None
+_default_fetcher_lock = threading.Lock()
+
+
+def get_fetcher():
+    """
+    Returns the process-wide Fetcher, creating it on first use.
+
+    Returns:
+        Fetcher
+    """
+    global _default_fetcher
+    if _default_fetcher is None:
+        with _default_fetcher_lock:
+            if _default_fetcher is None:
+                _default_fetcher = Fetcher()
+    return _default_fetcher
@@ -1,9 +1,17 @@
-import requests
-from bs4 import BeautifulSoup
 from data_classes import Ingredient, Step
+from extract_backends import compile_site_plans, get_backend, get_bs4_backend
+from fetcher import get_fetcher
+from metrics import fallback, span, timed
+from recipe_cache import get_recipe_cache, normalize_url
+from recipe_index import index_recipe
+from single_flight import SINGLE_FLIGHT_LOCK_DIR, SingleFlight
+from snapshot_store import record_page, replay_page, snapshot_mode
+from step_atomizer import atomize_steps, parse_instructions
+from structured_data import extract_jsonld_recipe
 import re
-import spacy
 import json
+from functools import lru_cache
+from urllib.parse import urlsplit
 
 WEBSITE_CONFIGS = {
     "allrecipes.com": {
@@ -19,7 +27,14 @@ WEBSITE_CONFIGS = {
         "instruction_item": {
             "tag": "p",
             "class": "comp mntl-sc-block mntl-sc-block-html"
-        }
+        },
+        # Steps are looked up inside this container first, then on the whole page
+        "instruction_container": {"tag": "div", "id_contains": "mm-recipes-steps"},
+        # Tried in order if the instruction selector finds nothing
+        "instruction_fallbacks": [
+            {"tag": "li", "class_contains": "mntl-sc-block"},
+            {"tag": "p", "class_contains": "mntl-sc-block"}
+        ]
     },
 
     "seriouseats.com": {
@@ -35,7 +50,12 @@ WEBSITE_CONFIGS = {
         "instruction_item": {
             "tag": "p",
             "class": "comp mntl-sc-block mntl-sc-block-html"
-        }
+        },
+        "instruction_container": {"tag": "section", "id_contains": "section--instructions"},
+        "instruction_fallbacks": [
+            {"tag": "li", "class_contains": "structured-instructions"},
+            {"tag": "p", "class_contains": "comp"}
+        ]
     },
     "foodnetwork.com": {
     "ingredient_item": {
@@ -50,6 +70,34 @@ WEBSITE_CONFIGS = {
 }
 }
 
+# Compiled once at import: host -> SitePlan with its selectors ready for every backend
+SITE_PLANS = compile_site_plans(WEBSITE_CONFIGS)
+
+
+@lru_cache(maxsize=4096)
+def get_website_name(url):
+    """
+    Determines which supported website a URL belongs to.
+
+    The URL's host is looked up in SITE_PLANS, dropping leading labels
+    ("www.", "m.") until a site matches, so the cost doesn't grow with the
+    number of sites. Results are cached per URL.
+
+    Args:
+        url (str): Recipe URL
+
+    Returns:
+        str: Key into WEBSITE_CONFIGS or None if unsupported
+    """
+    if "://" not in url:
+        url = "https://" + url
+    host = urlsplit(url.strip()).hostname or ""
+    while host:
+        if host in SITE_PLANS:
+            return host
+        host = host.partition(".")[2]
+    return None
+
 def get_website_config(url):
     """
     Determines which website configuration to use based on the URL.
@@ -60,194 +108,206 @@ def get_website_config(url):
     Returns:
         dict: Website configuration or None if unsupported
     """
-    for site_name, config in WEBSITE_CONFIGS.items():
-        if site_name in url:
-            return config
-    return None
+    site_name = get_website_name(url)
+    return WEBSITE_CONFIGS[site_name] if site_name else None
+
+def get_site_plan(url):
+    """
+    Returns the compiled extraction plan for a URL's site.
+
+    Args:
+        url (str): Recipe URL
+
+    Returns:
+        SitePlan or None if unsupported
+    """
+    site_name = get_website_name(url)
+    return SITE_PLANS[site_name] if site_name else None
 
-def get_raw_ingredients_instructions(url):
+@timed("fetch")
+def fetch_page(url, extra_headers=None, replay=None):
+    """
+    Downloads a recipe page through the shared pooled, retrying fetcher.
+
+    In snapshot record mode the page is also stored in the snapshot store;
+    in replay mode it is read from there instead (see snapshot_store).
+
+    Args:
+        url (str): URL of the recipe page
+        extra_headers (dict): Additional request headers (e.g. conditional request headers)
+        replay (bool): Read the page from its snapshot; defaults to SNAPSHOT_MODE == "replay"
+
+    Returns:
+        requests.Response, or snapshot_store.SnapshotResponse when replaying
+
+    Raises:
+        snapshot_store.SnapshotMissing: if replaying a page that was never recorded
+    """
+    if replay is None:
+        replay = snapshot_mode() == "replay"
+    if replay:
+        return replay_page(url)
+    response = get_fetcher().fetch(url, extra_headers=extra_headers)
+    if snapshot_mode() == "record":
+        record_page(url, response)
+    return response
+
+
+def get_raw_ingredients_instructions(url, replay=None):
     """
     Parses HTML to return the list of ingredients (strings) and list of instructions (strings)
 
     Args:
         url (str): URL of the recipe page
+        replay (bool): Parse the page's snapshot instead of fetching it (see fetch_page)
 
     Returns: (ingredients, instructions) - both as lists of strings
     """
     # Get the appropriate configuration for this website
-    config = get_website_config(url)
-    if config is None:
+    if get_website_config(url) is None:
         raise ValueError(f"Unsupported website. URL: {url}")
-    
-    # Read url with user-agent header (some sites block requests without it)
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
-    response = requests.get(url, headers=headers)
-    soup = BeautifulSoup(response.content, 'html.parser')
-
-    # Set empty lists
-    ingredients = []
-    instructions = []
-
-    # Extract ingredients using config
-    ingredient_config = config["ingredient_item"]
-    ingredient_items = soup.find_all(
-        ingredient_config["tag"], 
-        class_=ingredient_config["class"]
-    )
-    
-    # If no ingredients found, try alternative selectors
-    if len(ingredient_items) == 0:
-        # Try without class restriction
-        ingredient_items = soup.find_all(ingredient_config["tag"])
-    
-    for item in ingredient_items:
-        # Check if this is Food Network (unstructured ingredient text)
-        fields_config = config["ingredient_fields"]
-        
-        if fields_config is None:
-            # Food Network style: single text string
-            # e.g., "1 pound (4 sticks) unsalted butter, at room temperature"
-            ingredient_text = item.get_text(strip=True)
-            if ingredient_text:  # Only add non-empty ingredients
-                ingredients.append(ingredient_text)
-        else:
-            # Structured format (AllRecipes, Serious Eats)
-            quantity_span = item.find(
-                fields_config["quantity"]["tag"],
-                attrs=fields_config["quantity"]["attrs"]
-            )
-            unit_span = item.find(
-                fields_config["unit"]["tag"],
-                attrs=fields_config["unit"]["attrs"]
-            )
-            name_span = item.find(
-                fields_config["name"]["tag"],
-                attrs=fields_config["name"]["attrs"]
-            )
-            
-            # Get text from each
-            quantity = quantity_span.get_text(strip=True) if quantity_span else ""
-            unit = unit_span.get_text(strip=True) if unit_span else ""
-            name = name_span.get_text(strip=True) if name_span else ""
-            
-            # Clean the name first
-            #name = clean_ingredient_name(name)
-
-            # Build ingredient string: "quantity unit name"
-            parts = []
-            if quantity:
-                parts.append(quantity)
-            if unit:
-                parts.append(unit)
-            if name:
-                parts.append(name)
-            
-            ingredient_str = " ".join(parts)
-            
-            # Split on "and" to create separate ingredients
-            # e.g., "salt and ground black pepper" -> ["salt", "ground black pepper"]
-            if ' and ' in name and not quantity:  # Only split if there's no quantity
-                ingredient_parts = [part.strip() for part in name.split(' and ')]
-                for part in ingredient_parts:
-                    if part:  # Only add non-empty parts
-                        ingredients.append(part)
-            else:
-                # Add single ingredient string
-                if ingredient_str:
-                    ingredients.append(ingredient_str)
-
-    # Extract instructions using config
-    instruction_config = config["instruction_item"]
-    
-    # Special handling for Serious Eats: find instructions within the instructions section
-    if "seriouseats.com" in url:
-        # Find the instructions section container
-        instructions_section = soup.find('section', id=lambda x: x and 'section--instructions' in x)
-        
-        if instructions_section:
-            # Get all paragraphs within this section that match the config
-            instruction_items = instructions_section.find_all(
-                instruction_config["tag"],
-                class_=instruction_config["class"]
-            )
-        else:
-            # Fallback to original method if section not found
-            instruction_items = soup.find_all(
-                instruction_config["tag"],
-                class_=instruction_config["class"]
-            )
-    
-    # Special handling for AllRecipes: find instructions within the mm-recipes-steps container
-    elif "allrecipes.com" in url:
-        # Find the instructions section container
-        instructions_section = soup.find('div', id=lambda x: x and 'mm-recipes-steps' in x)
-        
-        if instructions_section:
-            # Get all paragraphs within this section that match the config
-            instruction_items = instructions_section.find_all(
-                instruction_config["tag"],
-                class_=instruction_config["class"]
-            )
-        else:
-            # Fallback to original method if section not found
-            instruction_items = soup.find_all(
-                instruction_config["tag"],
-                class_=instruction_config["class"]
-            )
-    
-    else:
-        # For other sites (including Food Network), use the original method
-        instruction_items = soup.find_all(
-            instruction_config["tag"],
-            class_=instruction_config["class"]
-        )
-    
-    # If no instructions found, try alternative selectors
-    if len(instruction_items) == 0:
-        # Try common instruction patterns
-        if "allrecipes.com" in url:
-            # Try alternative AllRecipes selectors
-            instruction_items = soup.find_all('li', class_=lambda x: x and 'mntl-sc-block' in str(x))
-            if len(instruction_items) == 0:
-                instruction_items = soup.find_all('p', class_=lambda x: x and 'mntl-sc-block' in str(x))
-        elif "seriouseats.com" in url:
-            # Try alternative Serious Eats selectors
-            instruction_items = soup.find_all('li', class_=lambda x: x and 'structured-instructions' in str(x))
-            if len(instruction_items) == 0:
-                instruction_items = soup.find_all('p', class_=lambda x: x and 'comp' in str(x))
-    
-    for item in instruction_items:
-        # Get the text from each instruction paragraph
-        instruction_text = item.get_text(strip=True)
-        if instruction_text:  # Only add non-empty instructions
-            instructions.append(instruction_text)
 
-    return ingredients, instructions
+    response = fetch_page(url, replay=replay)
+    return parse_recipe_html(response.content, url)
+
+
+def parse_recipe_html(html, url, backend=None, structured_data=True):
+    """
+    Extracts the list of ingredients (strings) and list of instructions (strings) from page HTML
+
+    The page's schema.org Recipe JSON-LD is read first, since it only needs a
+    scan of the script tags. Pages without it go through the site's compiled
+    extraction plan (SITE_PLANS) on the fastest installed extraction backend
+    (see extract_backends), falling back to BeautifulSoup if that backend
+    fails or finds nothing.
+
+    Args:
+        html (bytes or str): Raw HTML of the recipe page
+        url (str): URL the HTML was fetched from, used to pick the website configuration
+        backend (str): "auto", "selectolax", "lxml" or "bs4"; defaults to HTML_PARSER_BACKEND
+        structured_data (bool): Set to False to skip the JSON-LD fast path
+
+    Returns: (ingredients, instructions) - both as lists of strings
+    """
+    plan = get_site_plan(url)
+    if plan is None:
+        raise ValueError(f"Unsupported website. URL: {url}")
+
+    if structured_data:
+        with span("jsonld"):
+            recipe = extract_jsonld_recipe(html)
+        if recipe is not None:
+            return recipe["ingredients"], recipe["instructions"]
+
+    fast_backend = get_backend(backend)
+    if fast_backend is not None:
+        try:
+            with span("select"):
+                ingredients, instructions = fast_backend.extract(html, plan)
+            if ingredients or instructions:
+                return ingredients, instructions
+        except Exception as e:
+            fallback("select", f"{fast_backend.name} extraction failed, falling back to BeautifulSoup: {str(e)}")
+
+    return parse_recipe_html_bs4(html, url)
+
+
+@timed("bs4")
+def parse_recipe_html_bs4(html, url):
+    """
+    Extracts ingredients and instructions from page HTML with BeautifulSoup's html.parser
+
+    Args:
+        html (bytes or str): Raw HTML of the recipe page
+        url (str): URL the HTML was fetched from, used to pick the website configuration
+
+    Returns: (ingredients, instructions) - both as lists of strings
+    """
+    plan = get_site_plan(url)
+    if plan is None:
+        raise ValueError(f"Unsupported website. URL: {url}")
+    return get_bs4_backend().extract(html, plan)
+
+
+# Concurrent parses of the same page share one fetch, parse and atomize
+# (and, with SINGLE_FLIGHT_LOCK_DIR, one per URL across worker processes)
+parse_flight = SingleFlight("parse", SINGLE_FLIGHT_LOCK_DIR)
 
 
 #FOR PROJECT 2 PART 2 ONLY, returns raw original strings for ingredients and instructions
-def process_url(url):
+def process_url(url, use_cache=True, replay=None):
     """
     For a given url, gives the fully parsed ingredient and instruction set.
 
+    Results are served from the on-disk recipe cache when possible. Fresh
+    entries skip the network entirely; stale ones are revalidated with
+    ETag/Last-Modified and only re-parsed if the page changed. Callers
+    asking for the same normalized URL at the same time wait for one parse
+    and share its result.
+
+    Replaying parses the page's stored snapshot with the current parser and
+    bypasses the recipe cache, so a parser change shows up without any fetch.
+
+    Args:
+        url (str): URL of the recipe page
+        use_cache (bool): Set to False to always fetch and parse the page
+        replay (bool): Parse from the snapshot store; defaults to SNAPSHOT_MODE == "replay"
+
     returns: (ingredients: list of string ingredients, instructions: list of string instructions)
     
     """
-    #Get raw ingredients and instructions from url
-    ingredients, instructions = get_raw_ingredients_instructions(url)
+    if replay is None:
+        replay = snapshot_mode() == "replay"
+    use_cache = use_cache and not replay
+    return parse_flight.do(f"{int(use_cache)}{int(replay)}:{normalize_url(url)}", _process_url, url, use_cache, replay)
+
 
-    # #Atomize instructions into smaller atomic steps
-    # instructions = atomize_steps(instructions)
+def _process_url(url, use_cache, replay=False):
+    cache = get_recipe_cache() if use_cache else None
+    if cache is None:
+        recipe = build_recipe(*get_raw_ingredients_instructions(url, replay=replay))
+        index_recipe(recipe, url)
+        return recipe
+
+    if get_website_config(url) is None:
+        raise ValueError(f"Unsupported website. URL: {url}")
+
+    # While recording, every page is fetched in full so it gets a snapshot
+    entry = cache.get(url) if snapshot_mode() != "record" else None
+    if entry is not None and entry.is_fresh(cache.ttl):
+        return entry.recipe
+
+    response = fetch_page(url, entry.revalidation_headers() if entry else None)
+    if entry is not None and response.status_code == 304:
+        cache.touch(url)
+        return entry.recipe
+
+    recipe = build_recipe(*parse_recipe_html(response.content, url))
+    if response.ok:
+        stored = cache.put(
+            url, recipe,
+            etag=response.headers.get('ETag'),
+            last_modified=response.headers.get('Last-Modified')
+        )
+        index_recipe(recipe, url, cached=stored is not None)
+    return recipe
+
+
+@timed("atomize")
+def build_recipe(ingredients, instructions):
+    """
+    Builds the recipe dict returned by process_url from raw ingredient and instruction strings.
+    """
+    # Atomize instructions into smaller atomic steps
+    steps = atomize_steps(instructions)
 
-    # #parse instructions into Step classes
-    # instructions = parse_instructions(instructions, ingredients)
+    # Parse atomic steps into Step classes
+    steps = parse_instructions(steps, ingredients)
 
-    # Just return as a simple dict structure - no Gemini needed for this part
     return {
         "ingredients": ingredients,  # List of strings
-        "instructions": instructions  # List of strings
+        "instructions": instructions,  # List of strings
+        "steps": [step.to_dict() for step in steps]  # Step dicts, numbered from 1
     }
 
 def main():
@@ -257,14 +317,14 @@ def main():
     url4 = "https://www.foodnetwork.com/recipes/pumpkin-pie-in-a-sheet-pan-3415884"
 
     url = url1 #to test other
-    ingredients, instructions = process_url(url)
+    recipe = process_url(url)
     
     print("Ingredients:")
-    for ingredient in ingredients:
+    for ingredient in recipe["ingredients"]:
         print(f"- {ingredient}")
     
     print("\nInstructions:")
-    for step in instructions:
+    for step in recipe["instructions"]:
         print(f"- {step}")
 
 if __name__ == "__main__":
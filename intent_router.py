@@ -0,0 +1,254 @@
+import re
+import threading
+
+from nlp_pipeline import simple_lemma
+from quantities import ingredient_table, parse_ingredient
+
+# Navigation and lookup commands documented in the README. Anything that
+# doesn't match one of these falls through to the model.
+START = re.compile(r'^(start|begin|start (the )?recipe|start cooking|let\'?s start)$')
+NEXT = re.compile(r'^(next|n|next step|go on|continue)$')
+BACK = re.compile(r'^(back|b|previous|prev|previous step|go back)$')
+REPEAT = re.compile(r'^(repeat|again|repeat (that|step|the step)|say (that|it) again|what was that)$')
+GOTO_STEP = re.compile(r'^(show |go to |jump to |skip to |what is |what\'?s )?step (?P<number>\d+)$')
+SHOW_INGREDIENTS = re.compile(r'^(show|list|what are)( me)?( the| all( the)?)? ingredients$|^ingredients$')
+SHOW_RECIPE = re.compile(r'^(show|list)( me)?( the| all( the)?)? (recipe|steps|instructions|directions)$')
+HOW_MUCH = re.compile(
+    r'^how (much|many) (?P<item>.+?)'
+    r'( do i (need|use|add)| should i (use|add)| (is|are) (needed|required)| does (it|the recipe) (need|call for|use|take))?$'
+)
+SCALE_WORDS = {"double": 2, "twice": 2, "triple": 3, "quadruple": 4, "halve": 0.5, "half": 0.5}
+SCALE_WORD = re.compile(
+    r'^(?P<word>double|triple|quadruple|halve|half|make twice|make half)( of)?( the| this)?'
+    r'( recipe| ingredients| it| everything| amounts| quantities)?$'
+)
+SCALE_BY = re.compile(
+    r'^(scale|multiply|make)( the| this)?( recipe| ingredients| it| everything)?'
+    r'( by| x| times)? (?P<factor>\d+(\.\d+)?|\d+/\d+) ?(x|times)?( the recipe)?$'
+)
+CONVERT = re.compile(
+    r'^((convert|show|give me|list|what are)( the| all)?( recipe| ingredients| amounts| measurements| quantities)?'
+    r' (to|in|into|using) )?(?P<system>metric|grams|us|imperial|american|cups)( units| measurements)?$'
+)
+METRIC_WORDS = {"metric", "grams"}
+# Contextual questions ("how much of that?") depend on the conversation, so the model answers them
+CONTEXTUAL_WORDS = {"that", "it", "this", "those", "them", "these", "of"}
+STEP_MENTION = re.compile(r'Step (\d+):')
+WORD = re.compile(r"[a-z]+")
+PUNCTUATION = re.compile(r'[?!,]+|\.(?!\d)')  # keeps decimal points ("1.5")
+NAV_HINT = "Say 'next', 'back', or ask me a question."
+
+
+def normalize_query(query):
+    """Lowercases a query and strips punctuation and surrounding whitespace."""
+    return PUNCTUATION.sub('', query.lower()).strip()
+
+
+def current_step_from_history(history):
+    """
+    Works out which step a session is on from its chat history.
+
+    The most recent "Step X:" the assistant presented (locally or from the
+    model) is the current step, so the model and the router always agree.
+
+    Args:
+        history: Chat history (list of contents with role and text parts)
+
+    Returns:
+        int: Current step number, or 0 if the walkthrough hasn't started
+    """
+    for content in reversed(history):
+        if content.role != "model":
+            continue
+        for part in reversed(content.parts):
+            mentions = STEP_MENTION.findall(getattr(part, "text", "") or "")
+            if mentions:
+                return int(mentions[-1])
+    return 0
+
+
+def format_step(steps, number):
+    return f"Step {number}: {steps[number - 1]}\n\n{NAV_HINT}"
+
+
+def _name_words(text):
+    return {simple_lemma(word) for word in WORD.findall(text.lower())}
+
+
+def find_ingredients(ingredients, item):
+    """
+    Ingredient lines whose name contains every word of item.
+
+    Words are compared whole and singularized ("eggs" finds "2 large eggs"),
+    so "salt" doesn't find "unsalted butter" and "oil" doesn't find "boiling water".
+    """
+    words = _name_words(" ".join(word for word in item.split() if word not in ("the", "a", "an", "some")))
+    if not words:
+        return []
+    return [
+        ingredient for ingredient in ingredients
+        if words <= _name_words(parse_ingredient(ingredient).name or ingredient)
+    ]
+
+
+def route_query(query, ingredients, steps, current_step):
+    """
+    Answers a navigation or lookup query from the parsed recipe, if possible.
+
+    Args:
+        query (str): User query
+        ingredients (list): Ingredient strings
+        steps (list): Atomized step strings, numbered from 1
+        current_step (int): Step the session is on (0 if not started)
+
+    Returns:
+        (answer, intent) - answer is None if the query should go to the model
+    """
+    text = normalize_query(query)
+    total = len(steps)
+
+    if START.match(text):
+        if not total:
+            return None, None
+        return format_step(steps, 1), "start"
+
+    if NEXT.match(text):
+        if not total:
+            return None, None
+        if current_step >= total:
+            return f"That was the last step (Step {total}: {steps[total - 1]}). Enjoy your meal!", "next"
+        return format_step(steps, current_step + 1), "next"
+
+    if BACK.match(text):
+        if not total:
+            return None, None
+        if current_step <= 1:
+            return f"You're at the first step.\n\n{format_step(steps, 1)}", "back"
+        return format_step(steps, current_step - 1), "back"
+
+    if REPEAT.match(text):
+        if not total:
+            return None, None
+        return format_step(steps, max(current_step, 1)), "repeat"
+
+    match = GOTO_STEP.match(text)
+    if match:
+        if not total:
+            return None, None
+        number = int(match.group("number"))
+        if not 1 <= number <= total:
+            return f"This recipe has {total} steps. Please choose a step from 1 to {total}.", "step"
+        return format_step(steps, number), "step"
+
+    if SHOW_INGREDIENTS.match(text):
+        lines = "\n".join(f"- {ingredient}" for ingredient in ingredients)
+        return f"Ingredients:\n{lines}", "ingredients"
+
+    if SHOW_RECIPE.match(text):
+        # Listed as "1." rather than "Step 1:" so the listing doesn't move the current step
+        lines = "\n".join(f"{i}. {step}" for i, step in enumerate(steps, 1))
+        return f"{lines}\n\nSay 'start' to begin the step-by-step walkthrough.", "recipe"
+
+    match = SCALE_WORD.match(text) or SCALE_BY.match(text)
+    if match and ingredients:
+        word = match.groupdict().get("word")
+        if word:
+            factor = SCALE_WORDS[word.split()[-1]]
+        else:
+            numerator, _, denominator = match.group("factor").partition("/")
+            factor = float(numerator) / float(denominator or 1)
+        if factor > 0:
+            lines = "\n".join(f"- {line}" for line in ingredient_table(ingredients).scale(factor).convert().to_strings())
+            return f"Ingredients for {factor:g}x the recipe:\n{lines}\n\nCooking times may need adjusting.", "scale"
+
+    match = CONVERT.match(text)
+    if match and ingredients:
+        system = "metric" if match.group("system") in METRIC_WORDS else "us"
+        lines = "\n".join(f"- {line}" for line in ingredient_table(ingredients).convert(system).to_strings())
+        label = "metric" if system == "metric" else "US"
+        return f"Ingredients in {label} units:\n{lines}", "convert"
+
+    match = HOW_MUCH.match(text)
+    if match:
+        item = match.group("item")
+        if CONTEXTUAL_WORDS & set(item.split()):
+            return None, None
+        found = find_ingredients(ingredients, item)
+        if found:
+            lines = "\n".join(f"- {ingredient}" for ingredient in found)
+            return f"The recipe calls for:\n{lines}", "quantity"
+
+    return None, None
+
+
+def record_exchange(chat, query, answer):
+    """
+    Appends a locally answered exchange to a chat's history.
+
+    Keeps the model's view of the conversation (including the current step)
+    in line with what the user was shown.
+    """
+    chat.history = list(chat.history) + [
+        {"role": "user", "parts": [query]},
+        {"role": "model", "parts": [answer]}
+    ]
+
+
+class RouterStats:
+    """Counts queries answered locally (by intent), from the response cache and by the model"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = {}
+        self._cache = 0
+        self._model = 0
+
+    def record(self, intent):
+        """Records a query's outcome: a local intent, "cache" or None for the model."""
+        with self._lock:
+            if intent is None:
+                self._model += 1
+            elif intent == "cache":
+                self._cache += 1
+            else:
+                self._local[intent] = self._local.get(intent, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            local = sum(self._local.values())
+            total = local + self._cache + self._model
+            return {
+                "local": local,
+                "cache": self._cache,
+                "model": self._model,
+                "local_fraction": local / total if total else 0.0,
+                "by_intent": dict(self._local)
+            }
+
+
+router_stats = RouterStats()
+
+
+def answer_locally(chat, query, ingredients, steps):
+    """
+    Tries to answer a query without the model, updating the chat history if it does.
+
+    Args:
+        chat: Session's chat (its history holds the current step)
+        query (str): User query
+        ingredients (list): Ingredient strings
+        steps (list): Atomized step strings, or None if not available
+
+    Returns:
+        str: The answer, or None if the query should be sent to the model
+
+    Only local answers are counted in router_stats; whoever answers the
+    query instead records it (see response_cache.cached_response).
+    """
+    if steps is None:
+        return None
+    answer, intent = route_query(query, ingredients, steps, current_step_from_history(chat.history))
+    if answer is not None:
+        router_stats.record(intent)
+        record_exchange(chat, query, answer)
+    return answer
@@ -0,0 +1,280 @@
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+
+# Timing spans and counters for the request hot path, exposed in the
+# Prometheus text format by /api/metrics. With METRICS_DISABLED=1 span()
+# returns one shared no-op object and inc() returns at once.
+METRICS_DISABLED = os.getenv("METRICS_DISABLED", "").lower() in ("1", "true", "yes")
+# Write one JSON line per request with its stage timings to stderr
+METRICS_LOG = os.getenv("METRICS_LOG", "").lower() in ("1", "true", "yes")
+METRICS_PREFIX = "recipe_"
+
+# Upper bounds in seconds, from a cached lookup to a slow model reply
+SPAN_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# The spans of the request being handled, for METRICS_LOG (None outside a request)
+_request_trace = contextvars.ContextVar("request_trace", default=None)
+
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(SPAN_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+class Registry:
+    """Counters and span histograms, keyed by name and label values."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}  # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> _Histogram
+        self._help = {}
+        self._collectors = []
+
+    def inc(self, name, value=1, help=None, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+            if help and name not in self._help:
+                self._help[name] = help
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram()
+            histogram.counts[bisect_left(SPAN_BUCKETS, seconds)] += 1
+            histogram.sum += seconds
+            histogram.count += 1
+
+    def add_collector(self, collect):
+        """
+        Registers a function called on every scrape.
+
+        It returns [(name, type, help, labels dict, value)], for values kept
+        elsewhere such as the recipe cache's hit counters.
+        """
+        self._collectors.append(collect)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            help_texts = dict(self._help)
+
+        seen = set()
+        for (name, labels), value in counters:
+            full_name = METRICS_PREFIX + name
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {full_name} {help_texts.get(name, name.replace('_', ' '))}")
+                lines.append(f"# TYPE {full_name} counter")
+            lines.append(f"{full_name}{_labels(labels)} {_number(value)}")
+
+        for (name, labels), histogram in histograms:
+            full_name = METRICS_PREFIX + name
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {full_name} Time spent per stage, in seconds")
+                lines.append(f"# TYPE {full_name} histogram")
+            cumulative = 0
+            for bound, count in zip(SPAN_BUCKETS, histogram.counts):
+                cumulative += count
+                lines.append(f"{full_name}_bucket{_labels(labels + (('le', repr(bound)),))} {cumulative}")
+            lines.append(f"{full_name}_bucket{_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+            lines.append(f"{full_name}_sum{_labels(labels)} {_number(histogram.sum)}")
+            lines.append(f"{full_name}_count{_labels(labels)} {histogram.count}")
+
+        for collect in self._collectors:
+            try:
+                samples = collect()
+            except Exception as e:
+                print(f"DEBUG: Metrics collector failed: {str(e)}", file=sys.stderr)
+                continue
+            for name, kind, help_text, labels, value in samples:
+                full_name = METRICS_PREFIX + name
+                if name not in seen:
+                    seen.add(name)
+                    lines.append(f"# HELP {full_name} {help_text}")
+                    lines.append(f"# TYPE {full_name} {kind}")
+                lines.append(f"{full_name}{_labels(tuple(sorted(labels.items())))} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{_escape(value)}"' for key, value in labels)
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+registry = Registry()
+
+
+class _Span:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        registry.observe("stage_seconds", seconds, stage=self.stage)
+        if exc_type is not None:
+            registry.inc("errors_total", help="Errors raised, by stage", stage=self.stage)
+        trace = _request_trace.get()
+        if trace is not None:
+            trace.append((self.stage, seconds))
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(stage):
+    """
+    Times a block as one stage of the current request.
+
+        with span("fetch"):
+            response = fetch_page(url)
+
+    Exceptions are counted under errors_total for the stage and re-raised.
+    """
+    if METRICS_DISABLED:
+        return _NO_SPAN
+    return _Span(stage)
+
+
+def timed(stage):
+    """Decorator form of span(); leaves the function untouched when metrics are disabled."""
+    def decorate(func):
+        if METRICS_DISABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def observe(stage, seconds):
+    """Records a stage timing measured elsewhere (e.g. a streamed reply, timed as it is sent)."""
+    if not METRICS_DISABLED:
+        registry.observe("stage_seconds", seconds, stage=stage)
+
+
+def inc(name, value=1, help=None, **labels):
+    """Adds value to a counter (name without the recipe_ prefix, e.g. "model_tokens_total")."""
+    if not METRICS_DISABLED:
+        registry.inc(name, value, help, **labels)
+
+
+def fallback(stage, message):
+    """
+    Reports a fallback to a slower or degraded path.
+
+    Counted under fallbacks_total for the stage and logged to stderr, so it
+    stays out of the chat CLI's conversation and the workers' stdout.
+
+    Args:
+        stage (str): Where it happened, e.g. "select" or "model_retry"
+        message (str): What happened
+    """
+    inc("fallbacks_total", help="Fallbacks to a slower or degraded path, by stage", stage=stage)
+    print(f"DEBUG: {message}", file=sys.stderr, flush=True)
+
+
+def record_usage(response):
+    """Counts the prompt and reply tokens a Gemini response reports, if any."""
+    if METRICS_DISABLED:
+        return
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    for kind, field in (("prompt", "prompt_token_count"), ("output", "candidates_token_count")):
+        count = getattr(usage, field, 0) or 0
+        if count:
+            registry.inc("model_tokens_total", count, help="Tokens sent to and received from the model", kind=kind)
+
+
+def begin_request():
+    """Starts collecting the current request's spans (only if METRICS_LOG is set)."""
+    if METRICS_LOG and not METRICS_DISABLED:
+        _request_trace.set([])
+        return time.perf_counter()
+    return None
+
+
+def end_request(started, method, path, status):
+    """
+    Counts a finished request and, with METRICS_LOG, logs its stage timings as one JSON line.
+
+    Args:
+        started: Value returned by begin_request
+    """
+    if METRICS_DISABLED:
+        return
+    registry.inc("http_requests_total", help="HTTP requests, by path and status", path=path, status=str(status))
+    if status >= 500:
+        registry.inc("errors_total", help="Errors raised, by stage", stage="http")
+    if started is None:
+        return
+    trace = _request_trace.get() or []
+    _request_trace.set(None)
+    stages = {}
+    for stage, seconds in trace:
+        stages[stage] = round(stages.get(stage, 0.0) + seconds * 1000, 3)
+    print(json.dumps({
+        "event": "request",
+        "method": method,
+        "path": path,
+        "status": status,
+        "total_ms": round((time.perf_counter() - started) * 1000, 3),
+        "stages_ms": stages
+    }), file=sys.stderr, flush=True)
+
+
+def render_metrics():
+    """The /api/metrics response body."""
+    return registry.render()
@@ -0,0 +1,401 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from metrics import fallback
+
+# One model client per process, shared by every chat session and both entry
+# points (the web apps and recipe_chat.py). It configures the API once,
+# reuses one GenerativeModel, caps concurrent calls, backs off when the API
+# rate-limits and gives every call a deadline.
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash-lite")
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "gemini").lower()  # gemini or fake
+# Concurrent calls per path: the sync (Flask, CLI) and async (ASGI) paths each
+# get this many slots, so a process using both can run up to twice as many
+MODEL_MAX_CONCURRENCY = int(os.getenv("MODEL_MAX_CONCURRENCY", 16))
+MODEL_DEADLINE = float(os.getenv("MODEL_DEADLINE", 30))  # seconds per call, including queueing and retries
+MODEL_MAX_RETRIES = int(os.getenv("MODEL_MAX_RETRIES", 3))
+MODEL_BACKOFF = float(os.getenv("MODEL_BACKOFF", 1.0))  # first retry delay in seconds, doubled each time
+# The fake backend answers every question after this many seconds
+MODEL_FAKE_LATENCY = float(os.getenv("MODEL_FAKE_LATENCY", 0.05))
+# Fraction of fake calls that fail with a 429, to exercise the backoff
+MODEL_FAKE_RATE_LIMIT = float(os.getenv("MODEL_FAKE_RATE_LIMIT", 0))
+
+# HTTP statuses worth retrying; 429 also pauses every caller until the backoff ends
+RETRY_STATUSES = (429, 500, 503)
+
+
+class ModelDeadlineExceeded(TimeoutError):
+    """A model call could not finish (or start) before its deadline"""
+
+
+class FakeRateLimited(Exception):
+    code = 429
+
+
+class FakePart:
+    __slots__ = ("text",)
+
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeContent:
+    __slots__ = ("role", "parts")
+
+    def __init__(self, role, parts):
+        self.role = role
+        self.parts = [part if isinstance(part, FakePart) else FakePart(part) for part in parts]
+
+
+class FakeUsage:
+    __slots__ = ("prompt_token_count", "candidates_token_count")
+
+    def __init__(self, prompt, output):
+        self.prompt_token_count = prompt
+        self.candidates_token_count = output
+
+
+class FakeResponse:
+    """Answer from the fake backend; iterating it yields the answer word by word, like a stream"""
+
+    def __init__(self, text, prompt_tokens, latency):
+        self.text = text
+        self.usage_metadata = FakeUsage(prompt_tokens, len(text) // 4)
+        self._latency = latency
+
+    def __iter__(self):
+        words = self.text.split(" ")
+        for word in words:
+            time.sleep(self._latency / 2 / len(words))
+            yield FakePart(word + " ")
+
+    async def __aiter__(self):
+        words = self.text.split(" ")
+        for word in words:
+            await asyncio.sleep(self._latency / 2 / len(words))
+            yield FakePart(word + " ")
+
+
+class FakeChat:
+    """
+    Offline stand-in for a Gemini chat session, for load tests and benchmarks.
+
+    Keeps history like the real one and answers after a fixed delay (half of
+    it before the first token when streaming).
+    """
+
+    def __init__(self, history=None, latency=MODEL_FAKE_LATENCY, rate_limit=MODEL_FAKE_RATE_LIMIT):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.history = history or []
+
+    @property
+    def history(self):
+        return self._history
+
+    @history.setter
+    def history(self, history):
+        self._history = [
+            turn if isinstance(turn, FakeContent) else FakeContent(turn["role"], turn["parts"])
+            for turn in history
+        ]
+
+    def _reply(self, query, request_options):
+        if self.rate_limit and random.random() < self.rate_limit:
+            raise FakeRateLimited("429 Resource has been exhausted (fake backend)")
+        timeout = (request_options or {}).get("timeout")
+        if timeout is not None and timeout < self.latency:
+            time.sleep(timeout)
+            raise ModelDeadlineExceeded(f"Fake model call timed out after {timeout:.2f}s")
+        prompt_tokens = sum(len(part.text) for turn in self._history for part in turn.parts) // 4
+        text = f"Here is what the recipe says about: {query}"
+        self._history += [FakeContent("user", [query]), FakeContent("model", [text])]
+        return FakeResponse(text, prompt_tokens, self.latency)
+
+    def send_message(self, query, stream=False, request_options=None):
+        response = self._reply(query, request_options)
+        time.sleep(self.latency / 2 if stream else self.latency)
+        return response
+
+    async def send_message_async(self, query, stream=False, request_options=None):
+        response = self._reply(query, request_options)
+        await asyncio.sleep(self.latency / 2 if stream else self.latency)
+        return response
+
+
+class FakeModel:
+    def __init__(self, latency=MODEL_FAKE_LATENCY, rate_limit=MODEL_FAKE_RATE_LIMIT):
+        self.latency = latency
+        self.rate_limit = rate_limit
+
+    def start_chat(self, history=None):
+        return FakeChat(history, self.latency, self.rate_limit)
+
+
+class _Stream:
+    """A streamed response that holds its concurrency slot until it has been read or dropped"""
+
+    def __init__(self, response, release):
+        self._response = response
+        self._release = release
+
+    def _done(self):
+        release, self._release = self._release, None
+        if release is not None:
+            release()
+
+    def __iter__(self):
+        try:
+            yield from self._response
+        finally:
+            self._done()
+
+    async def __aiter__(self):
+        try:
+            async for chunk in self._response:
+                yield chunk
+        finally:
+            self._done()
+
+    def __getattr__(self, name):
+        # usage_metadata, text etc. come from the real response
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._response, name)
+
+    def __del__(self):
+        self._done()
+
+
+def _retry_status(error):
+    code = getattr(error, "code", None)
+    if callable(code):  # grpc errors expose code() instead
+        code = None
+    return code if code in RETRY_STATUSES else None
+
+
+class ModelClient:
+    """
+    Shared model client with a bounded-concurrency scheduler.
+
+    At most max_concurrency calls run at once on each path; the rest queue.
+    The sync and async paths have separate slots (a threading and an
+    asyncio semaphore), so a process that uses both, which the entry points
+    don't, can run up to twice max_concurrency calls. A call that fails with 429,
+    500 or 503 is retried with exponential backoff and jitter, and a 429
+    also holds back every queued call until the backoff ends. Each call
+    has a deadline covering its queueing, retries and the request itself;
+    past it ModelDeadlineExceeded is raised.
+    """
+
+    def __init__(self, backend=MODEL_BACKEND, max_concurrency=MODEL_MAX_CONCURRENCY, deadline=MODEL_DEADLINE,
+                 max_retries=MODEL_MAX_RETRIES, backoff=MODEL_BACKOFF, fake_latency=MODEL_FAKE_LATENCY):
+        self.backend = backend
+        self.max_concurrency = max_concurrency
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff = backoff
+        if backend == "gemini":
+            import google.generativeai as genai
+            genai.configure(api_key=GEMINI_API_KEY)
+            self.model = genai.GenerativeModel(GEMINI_MODEL)
+        elif backend == "fake":
+            self.model = FakeModel(fake_latency)
+        else:
+            raise ValueError(f"Unknown model backend: {backend}")
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._async_slots = None
+        self._lock = threading.Lock()
+        self._cooldown_until = 0.0
+        self._stats = {"calls": 0, "retries": 0, "rate_limited": 0, "deadline_exceeded": 0,
+                       "errors": 0, "active": 0, "queued": 0}
+
+    def start_chat(self, history=None):
+        """
+        Starts a chat on the shared model.
+
+        Args:
+            history (list): Opening or restored history ([{'role': ..., 'parts': [...]}, ...])
+
+        Returns:
+            chat session object
+        """
+        return self.model.start_chat(history=history or [])
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self._stats[name] += value
+
+    def _remaining(self, deadline):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            self._count("deadline_exceeded")
+            raise ModelDeadlineExceeded("Model call deadline exceeded")
+        return remaining
+
+    def _call_timeout(self, deadline, release):
+        # Checked before the call so a spent deadline isn't retried or counted as an error
+        try:
+            return self._remaining(deadline)
+        except ModelDeadlineExceeded:
+            release()
+            raise
+
+    def _retry_delay(self, error, attempt, deadline):
+        # Returns how long to wait before retrying, or raises if the error is final
+        status = _retry_status(error)
+        if status is None or attempt >= self.max_retries:
+            self._count("errors")
+            raise error
+        delay = self.backoff * (2 ** attempt) * (0.5 + random.random())
+        self._count("retries")
+        if status == 429:
+            self._count("rate_limited")
+            with self._lock:
+                self._cooldown_until = max(self._cooldown_until, time.monotonic() + delay)
+        if time.monotonic() + delay >= deadline:
+            self._count("deadline_exceeded")
+            raise ModelDeadlineExceeded("Model call deadline exceeded while backing off") from error
+        fallback("model_retry", f"Model call failed with {status}, retrying in {delay:.1f}s")
+        return delay
+
+    def _cooldown(self):
+        return max(0.0, self._cooldown_until - time.monotonic())
+
+    def send(self, chat, query, stream=False, timeout=None):
+        """
+        Sends a message through a chat, waiting for a free slot first.
+
+        Args:
+            chat: Chat from start_chat
+            query (str): User message
+            stream (bool): Return a streamed response (iterate it for the chunks)
+            timeout (float): Seconds for the whole call (default MODEL_DEADLINE)
+
+        Returns:
+            The model's response
+        """
+        deadline = time.monotonic() + (timeout or self.deadline)
+        self._count("calls")
+        attempt = 0
+        while True:
+            cooldown = self._cooldown()
+            if cooldown:
+                time.sleep(min(cooldown, self._remaining(deadline)))
+            self._count("queued")
+            acquired = self._slots.acquire(timeout=self._remaining(deadline))
+            self._count("queued", -1)
+            if not acquired:
+                self._count("deadline_exceeded")
+                raise ModelDeadlineExceeded("Timed out waiting for a free model slot")
+            self._count("active")
+            release = self._releaser()
+            timeout = self._call_timeout(deadline, release)
+            try:
+                response = chat.send_message(query, stream=stream, request_options={"timeout": timeout})
+            except Exception as e:
+                release()
+                time.sleep(self._retry_delay(e, attempt, deadline))
+                attempt += 1
+                continue
+            if stream:
+                return _Stream(response, release)
+            release()
+            return response
+
+    async def send_async(self, chat, query, stream=False, timeout=None):
+        """Async version of send, for the ASGI app (awaits chat.send_message_async)."""
+        deadline = time.monotonic() + (timeout or self.deadline)
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.max_concurrency)
+        self._count("calls")
+        attempt = 0
+        while True:
+            cooldown = self._cooldown()
+            if cooldown:
+                await asyncio.sleep(min(cooldown, self._remaining(deadline)))
+            self._count("queued")
+            try:
+                await asyncio.wait_for(self._async_slots.acquire(), self._remaining(deadline))
+            except asyncio.TimeoutError:
+                self._count("deadline_exceeded")
+                raise ModelDeadlineExceeded("Timed out waiting for a free model slot")
+            finally:
+                self._count("queued", -1)
+            self._count("active")
+            release = self._releaser(self._async_slots)
+            timeout = self._call_timeout(deadline, release)
+            try:
+                response = await chat.send_message_async(query, stream=stream, request_options={"timeout": timeout})
+            except Exception as e:
+                release()
+                await asyncio.sleep(self._retry_delay(e, attempt, deadline))
+                attempt += 1
+                continue
+            if stream:
+                return _Stream(response, release)
+            release()
+            return response
+
+    def _releaser(self, slots=None):
+        slots = slots or self._slots
+        released = []
+
+        def release():
+            if not released:
+                released.append(True)
+                slots.release()
+                self._count("active", -1)
+        return release
+
+    def stats(self):
+        """
+        Returns scheduler counters.
+
+        Returns:
+            dict: calls, retries, rate-limited and timed-out calls, errors,
+                calls running and queued now, and the settings
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({
+            "backend": self.backend,
+            "model": GEMINI_MODEL if self.backend == "gemini" else "fake",
+            "max_concurrency": self.max_concurrency,
+            "deadline_sec": self.deadline
+        })
+        return stats
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_model_client():
+    """
+    Returns the process-wide ModelClient, creating (and configuring the API) on first use.
+
+    Returns:
+        ModelClient for MODEL_BACKEND
+    """
+    global _default_client
+    if _default_client is None:
+        with _default_client_lock:
+            if _default_client is None:
+                _default_client = ModelClient()
+    return _default_client
+
+
+def set_model_client(client):
+    """Replaces the process-wide client (e.g. with a fake one in benchmarks)."""
+    global _default_client
+    with _default_client_lock:
+        _default_client = client
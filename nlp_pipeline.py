@@ -0,0 +1,363 @@
+import functools
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from metrics import fallback
+
+SPACY_MODEL = os.getenv("SPACY_MODEL", "en_core_web_sm")
+NLP_BATCH_SIZE = int(os.getenv("NLP_BATCH_SIZE", 256))
+# Processes for nlp.pipe; only worth it for large batches (each process loads its own model)
+NLP_PROCESSES = int(os.getenv("NLP_PROCESSES", 1))
+NLP_MIN_BATCH_PER_PROCESS = 500
+NLP_MEMO_MAX = int(os.getenv("NLP_MEMO_MAX", 20000))
+
+# Steps only need tokens, tags, lemmas and the dependency parse
+DISABLED_COMPONENTS = ["ner"]
+
+COOKING_METHODS = {
+    "add", "arrange", "bake", "baste", "beat", "blanch", "blend", "boil", "braise", "bring", "broil", "brown",
+    "brush", "chill", "chop", "coat", "combine", "cook", "cool", "cover", "cream", "crumble", "cut", "deglaze",
+    "dice", "dip", "dissolve", "divide", "drain", "drizzle", "dust", "flip", "fold", "fry", "garnish", "grate",
+    "grease", "grill", "heat", "knead", "layer", "lay", "marinate", "mash", "measure", "melt", "mince", "mix",
+    "place", "poach", "pulse", "pour", "preheat", "press", "puree", "reduce", "refrigerate", "remove", "rest",
+    "rinse", "roast", "roll", "saute", "sauté", "scatter", "season", "sear", "serve", "shred", "sift", "simmer", "slice",
+    "soak", "spoon", "spread", "sprinkle", "steam", "stir", "strain", "stuff", "spray", "tear", "thaw",
+    "toast", "top", "toss", "transfer", "trim", "turn", "whip", "whisk", "wrap",
+}
+COOKING_TOOLS = [
+    "dutch oven", "baking dish", "baking pan", "baking sheet", "sheet pan", "loaf pan", "pie plate", "pie dish",
+    "springform pan", "cake pan", "muffin tin", "cast iron skillet", "saucepan", "sauce pan", "stockpot",
+    "skillet", "frying pan", "wok", "pot", "pan", "oven", "broiler", "grill", "microwave", "slow cooker",
+    "pressure cooker", "instant pot", "air fryer", "food processor", "blender", "stand mixer", "mixer",
+    "bowl", "whisk", "spatula", "wooden spoon", "spoon", "ladle", "tongs", "knife", "cutting board",
+    "colander", "strainer", "sieve", "grater", "zester", "peeler", "rolling pin", "parchment paper",
+    "aluminum foil", "foil", "plastic wrap", "wire rack", "rack", "thermometer", "measuring cup", "baster",
+    "brush", "pastry brush", "ramekin", "platter", "plate", "jar", "tray",
+]
+# Longest names first so "baking pan" is found before "pan"
+TOOLS = re.compile(
+    r'\b(' + '|'.join(re.escape(tool) for tool in sorted(COOKING_TOOLS, key=len, reverse=True)) + r')(?:e?s)?\b',
+    re.IGNORECASE
+)
+DURATION = re.compile(
+    r'\b(?:(?:about|approximately|around|at least|another|an additional|up to)\s+)?'
+    r'\d+(?:[./]\d+)?(?:\s*(?:to|-|–|or)\s*\d+(?:[./]\d+)?)?\s*(?:more\s+)?'
+    r'(?:hours?|hrs?|minutes?|mins?|seconds?|secs?)\b',
+    re.IGNORECASE
+)
+DEGREES = re.compile(r'(\d+)\s*(?:°|º|degrees?)\s*([FC])\b', re.IGNORECASE)
+# Words after which a cooking verb starts a new instruction ("... and stir", "then bake")
+CLAUSE_STARTERS = {"and", "then", "or", "to", "until", "before", "after", "while"}
+# Serving notes and alternatives in ingredient names
+INGREDIENT_EXTRA = re.compile(r'\(.*?\)|,.*$|\b(?:to taste|for (?:garnish|serving)|optional)\b', re.IGNORECASE)
+INGREDIENT_AND = re.compile(r'\s+(?:and|or)\s+', re.IGNORECASE)
+HEAT = re.compile(r'\b((?:low|medium[- ]low|medium|medium[- ]high|high)\s+heat)\b', re.IGNORECASE)
+
+_nlp = None
+_nlp_lock = threading.Lock()
+_uses_model = False
+
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=65536)
+def simple_lemma(word):
+    """
+    Crude suffix-stripping stand-in for spaCy's lemmatizer, used when the model is not installed.
+
+    It only needs to map inflections to the same key ("tomatoes"/"tomato",
+    "baking"/"baked"/"bake") for both documents and queries.
+    """
+    if len(word) <= 3 or not word.isalpha():
+        return word
+    if word.endswith("ies") and len(word) > 4:
+        word = word[:-3] + "y"
+    elif word.endswith(("oes", "ches", "shes", "sses", "xes")):
+        word = word[:-2]
+    elif word.endswith("ves"):
+        word = word[:-3] + "f"
+    elif word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        word = word[:-1]
+    for suffix in ("ing", "ed"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            if len(word) > 2 and word[-1] == word[-2] and word[-1] not in "aeiouls":
+                word = word[:-1]
+            break
+    if word.endswith("e") and len(word) > 3:
+        word = word[:-1]
+    return word
+
+
+METHOD_KEYS = {simple_lemma(method): method for method in COOKING_METHODS}
+
+
+def get_nlp():
+    """
+    Returns the process-wide spaCy pipeline, loading it on first use.
+
+    The model is loaded without NER. If it isn't installed, a blank English
+    pipeline with a sentencizer is used instead (no tags, lemmas or parse).
+    spaCy itself is imported here too, since importing it takes most of a
+    second and only parsing and search need it.
+    """
+    global _nlp, _uses_model
+    if _nlp is None:
+        with _nlp_lock:
+            if _nlp is None:
+                import spacy
+                try:
+                    nlp = spacy.load(SPACY_MODEL, exclude=DISABLED_COMPONENTS)
+                    _uses_model = True
+                except OSError:
+                    fallback("spacy_model", f"spaCy model '{SPACY_MODEL}' not installed, using a blank pipeline")
+                    nlp = spacy.blank("en")
+                    nlp.add_pipe("sentencizer")
+                    _uses_model = False
+                _nlp = nlp
+    return _nlp
+
+
+def uses_model():
+    """True if the pipeline has a trained model (tags, lemmas, dependency parse)."""
+    get_nlp()
+    return _uses_model
+
+
+def lemma(token):
+    """Lowercase lemma of a token, from the model or simple_lemma."""
+    if _uses_model:
+        return token.lemma_.lower()
+    return simple_lemma(token.lower_)
+
+
+def pipe(texts, disable=(), batch_size=None):
+    """
+    Runs texts through the shared pipeline with nlp.pipe, without memoizing.
+
+    Args:
+        texts (list): Strings
+        disable (tuple): Pipeline components to skip for these texts
+        batch_size (int): Texts per batch (NLP_BATCH_SIZE by default)
+
+    Returns:
+        Iterator of Docs, in order
+    """
+    nlp = get_nlp()
+    disable = [name for name in disable if name in nlp.pipe_names]
+    n_process = NLP_PROCESSES if len(texts) >= NLP_PROCESSES * NLP_MIN_BATCH_PER_PROCESS else 1
+    return nlp.pipe(texts, batch_size=batch_size or NLP_BATCH_SIZE, disable=disable, n_process=n_process)
+
+
+def _text_key(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def process_texts(texts):
+    """
+    Returns a Doc for each text, memoized per text hash.
+
+    Texts not seen before go through nlp.pipe in one batch, so processing a
+    recipe's instructions costs one pipeline call however many steps it has.
+
+    Args:
+        texts (list): Strings
+
+    Returns:
+        list: Docs, in the same order
+    """
+    keys = [_text_key(text) for text in texts]
+    docs = [None] * len(texts)
+    missing = {}
+    with _memo_lock:
+        for position, key in enumerate(keys):
+            doc = _memo.get(key)
+            if doc is None:
+                missing.setdefault(key, []).append(position)
+            else:
+                _memo.move_to_end(key)
+                docs[position] = doc
+
+    if missing:
+        new_texts = [texts[positions[0]] for positions in missing.values()]
+        new_docs = list(pipe(new_texts))
+        with _memo_lock:
+            for (key, positions), doc in zip(missing.items(), new_docs):
+                _memo[key] = doc
+                for position in positions:
+                    docs[position] = doc
+            while len(_memo) > NLP_MEMO_MAX:
+                _memo.popitem(last=False)
+    return docs
+
+
+def clear_memo():
+    with _memo_lock:
+        _memo.clear()
+
+
+def memo_stats():
+    with _memo_lock:
+        return {"docs": len(_memo), "max": NLP_MEMO_MAX, "model": SPACY_MODEL if _uses_model else "blank"}
+
+
+def _acts_as_verb(doc, index):
+    """True if the token reads as an instruction ("Whisk the eggs", "... and spoon over") rather than a noun."""
+    token = doc[index]
+    if _uses_model:
+        return token.pos_ == "VERB" or (index == 0 and token.lemma_.lower() in COOKING_METHODS)
+    return index == 0 or doc[index - 1].lower_ in CLAUSE_STARTERS or doc[index - 1].is_punct
+
+
+def find_tools(doc):
+    """
+    Cooking tools named in a step, singular, in order of appearance.
+
+    Returns:
+        (tools, token positions they cover)
+    """
+    tools = []
+    covered = set()
+    for match in TOOLS.finditer(doc.text):
+        span = doc.char_span(match.start(1), match.end(), alignment_mode="expand")
+        if span is None:
+            continue
+        tool = match.group(1).lower()
+        # "Whisk the eggs" and "spoon over the cake" are methods, not tools
+        if len(span) == 1 and tool in COOKING_METHODS and _acts_as_verb(doc, span.start):
+            continue
+        covered.update(range(span.start, span.end))
+        if tool not in tools:
+            tools.append(tool)
+    return tools, covered
+
+
+def find_methods(doc, skip=()):
+    """Cooking verbs in a step, as lemmas in order of appearance, ignoring tokens in skip."""
+    methods = []
+    for token in doc:
+        if not token.is_alpha or token.i in skip:
+            continue
+        if _uses_model:
+            key = token.lemma_.lower()
+            # Imperatives at the start of a step are often tagged as nouns, so also accept known methods
+            if token.pos_ != "VERB" and not (key in COOKING_METHODS and _acts_as_verb(doc, token.i)):
+                continue
+        else:
+            key = METHOD_KEYS.get(simple_lemma(token.lower_))
+            # "browned", "melted butter": participles describe a result, not an action
+            if key is None or (token.lower_.endswith("ed") and token.lower_ not in COOKING_METHODS):
+                continue
+        if key not in methods:
+            methods.append(key)
+    return methods
+
+
+def find_time(text):
+    """{'duration': '10 minutes'} for the first duration in a step, or {}."""
+    match = DURATION.search(text)
+    return {"duration": match.group(0)} if match else {}
+
+
+def find_temperature(text):
+    """'350°F' or a heat level such as 'medium heat' for a step, or ''."""
+    match = DEGREES.search(text)
+    if match:
+        return f"{match.group(1)}°{match.group(2).upper()}"
+    match = HEAT.search(text)
+    return match.group(1).lower().replace(" low", "-low").replace(" high", "-high") if match else ""
+
+
+def _ingredient_word(token):
+    # Nouns only lose their plural here, so "salted water" doesn't mention salt
+    if _uses_model:
+        return token.lemma_.lower()
+    word = token.lower_
+    if len(word) <= 3 or not word.endswith("s") or word.endswith(("ss", "us", "is")):
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("oes", "ches", "shes")):
+        return word[:-2]
+    return word[:-1]
+
+
+def _ingredient_parts(name):
+    # "salt and ground black pepper to taste" -> ["salt", "ground black pepper"]
+    return [part for part in INGREDIENT_AND.split(INGREDIENT_EXTRA.sub("", name)) if part.strip()]
+
+
+def _ingredient_keys(names, part_docs):
+    """
+    Word sequences that count as a mention of each ingredient.
+
+    The last two words of each name always count ("ground black pepper" ->
+    "black pepper"). The last word alone ("butter" for "unsalted butter")
+    only counts if no other ingredient ends with the same word, so "cheese"
+    doesn't match every cheese in the recipe.
+    """
+    words = []
+    for name in names:
+        for _ in _ingredient_parts(name):
+            doc = next(part_docs)
+            part = tuple(_ingredient_word(token) for token in doc if token.is_alpha)
+            if part:
+                words.append((name, part))
+    heads = {}
+    for _, part in words:
+        heads[part[-1]] = heads.get(part[-1], 0) + 1
+    keys = []
+    for name, part in words:
+        keys.append((name, part[-2:]))
+        if len(part) > 1 and heads[part[-1]] == 1:
+            keys.append((name, part[-1:]))
+    return keys
+
+
+def find_ingredients(doc, ingredient_keys, skip=()):
+    """Recipe ingredients mentioned in a step, in recipe order, and the token positions they cover."""
+    positions = [token.i for token in doc if token.is_alpha and token.i not in skip]
+    words = [_ingredient_word(doc[i]) for i in positions]
+    found = []
+    covered = set()
+    for name, key in ingredient_keys:
+        size = len(key)
+        for start in range(len(words) - size + 1):
+            if tuple(words[start:start + size]) == key:
+                covered.update(positions[start:start + size])
+                if name not in found:
+                    found.append(name)
+    return found, covered
+
+
+def annotate_steps(steps, ingredient_names=None):
+    """
+    Fills in methods, tools, time and temperature (and ingredients, given their names) on Steps.
+
+    All step descriptions and ingredient names go through the pipeline in
+    one batch and are memoized, so annotating a recipe again is cheap.
+
+    Args:
+        steps (list): data_classes.Step objects, updated in place
+        ingredient_names (list): Ingredient names to look for in each step
+
+    Returns:
+        list: The same steps
+    """
+    texts = [step.description for step in steps]
+    parts = [part for name in ingredient_names or () for part in _ingredient_parts(name)]
+    docs = process_texts(texts + parts)
+    ingredient_keys = _ingredient_keys(ingredient_names, iter(docs[len(texts):])) if ingredient_names else None
+    for step, text, doc in zip(steps, texts, docs):
+        step.tools, skip = find_tools(doc)
+        if ingredient_keys is not None:
+            step.ingredients, covered = find_ingredients(doc, ingredient_keys, skip)
+            skip |= covered
+        step.methods = find_methods(doc, skip)
+        step.time = find_time(text)
+        step.temperature = find_temperature(text)
+    return steps
@@ -0,0 +1,309 @@
+import re
+from functools import lru_cache
+
+import numpy as np
+
+from data_classes import Ingredient
+
+# Unit dimensions. Volume and mass convert through their base unit (ml, g);
+# countable units (cloves, cans) and ingredients without a unit never convert.
+NO_UNIT, VOLUME, MASS, COUNT = 0, 1, 2, 3
+
+# (canonical name, plural, dimension, size in ml or g, aliases)
+UNITS = [
+    ("teaspoon", "teaspoons", VOLUME, 4.92892, ("teaspoon", "teaspoons", "tsp", "tsps")),
+    ("tablespoon", "tablespoons", VOLUME, 14.7868, ("tablespoon", "tablespoons", "tbsp", "tbsps", "tbs", "tbl")),
+    ("fluid ounce", "fluid ounces", VOLUME, 29.5735, ("fluid ounce", "fluid ounces", "fl oz", "fl. oz")),
+    ("cup", "cups", VOLUME, 236.588, ("cup", "cups", "c")),
+    ("pint", "pints", VOLUME, 473.176, ("pint", "pints", "pt")),
+    ("quart", "quarts", VOLUME, 946.353, ("quart", "quarts", "qt")),
+    ("gallon", "gallons", VOLUME, 3785.41, ("gallon", "gallons", "gal")),
+    ("ml", "ml", VOLUME, 1.0, ("ml", "milliliter", "milliliters", "millilitre", "millilitres")),
+    ("l", "l", VOLUME, 1000.0, ("l", "liter", "liters", "litre", "litres")),
+    ("ounce", "ounces", MASS, 28.3495, ("ounce", "ounces", "oz")),
+    ("pound", "pounds", MASS, 453.592, ("pound", "pounds", "lb", "lbs")),
+    ("g", "g", MASS, 1.0, ("g", "gram", "grams", "gr")),
+    ("kg", "kg", MASS, 1000.0, ("kg", "kilogram", "kilograms")),
+]
+for _name in ("clove", "can", "package", "stick", "pinch", "dash", "slice", "sprig", "bunch", "head",
+              "piece", "jar", "bottle", "bag", "box", "container", "stalk", "sheet", "envelope",
+              "packet", "handful", "drop", "fillet"):
+    _plural = _name + ("es" if _name.endswith(("ch", "sh", "x")) else "s")
+    UNITS.append((_name, _plural, COUNT, float("nan"), (_name, _plural)))
+UNITS.append(("leaf", "leaves", COUNT, float("nan"), ("leaf", "leaves")))
+
+UNIT_INDEX = {unit[0]: index for index, unit in enumerate(UNITS)}
+UNIT_DIMENSION = np.array([unit[2] for unit in UNITS] + [NO_UNIT], dtype=np.int8)  # index -1: no unit
+UNIT_SIZE = np.array([unit[3] for unit in UNITS] + [np.nan])
+UNIT_IS_METRIC = np.array([unit[0] in ("ml", "l", "g", "kg") for unit in UNITS] + [False])
+_ALIASES = {alias: index for index, unit in enumerate(UNITS) for alias in unit[4]}
+
+UNICODE_FRACTIONS = {
+    "½": 1 / 2, "⅓": 1 / 3, "⅔": 2 / 3, "¼": 1 / 4, "¾": 3 / 4, "⅕": 1 / 5, "⅖": 2 / 5, "⅗": 3 / 5,
+    "⅘": 4 / 5, "⅙": 1 / 6, "⅚": 5 / 6, "⅛": 1 / 8, "⅜": 3 / 8, "⅝": 5 / 8, "⅞": 7 / 8
+}
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "half": 0.5, "a half": 0.5
+}
+
+_FRACTION_CHARS = "".join(UNICODE_FRACTIONS)
+NUMBER = rf'(?:\d+\s*[{_FRACTION_CHARS}]|\d+\s+\d+/\d+|\d+/\d+|\d+(?:\.\d+)?|[{_FRACTION_CHARS}])'
+QUANTITY = re.compile(
+    rf'^(?P<low>{NUMBER})(?:\s*(?:-|–|—|to|or)\s*(?P<high>{NUMBER}))?\s*',
+    re.IGNORECASE
+)
+NUMBER_WORD = re.compile(r'^(?P<word>a half|an?|one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|half)\s+', re.IGNORECASE)
+# Package sizes: "(16 ounce)", "(4 sticks)", "15-ounce"
+SIZE = re.compile(rf'^(\([^)]*\)|{NUMBER}[\s-](?:fluid ounce|ounce|oz|pound|lb|inch|gram|g)s?\b\.?)\s*', re.IGNORECASE)
+UNIT = re.compile(
+    r'^(?P<unit>' + "|".join(re.escape(alias) for alias in sorted(_ALIASES, key=len, reverse=True)) + r')\b\.?\s*',
+    re.IGNORECASE
+)
+
+# Units to show after a conversion, by dimension: (unit, show while the amount is below this many ml/g)
+TARGET_UNITS = {
+    "metric": {VOLUME: [("ml", 1000.0), ("l", None)], MASS: [("g", 1000.0), ("kg", None)]},
+    "us": {
+        VOLUME: [("teaspoon", 14.7868 - 0.01), ("tablespoon", 59.147 - 0.01), ("cup", None)],
+        MASS: [("ounce", 453.592 - 0.01), ("pound", None)]
+    }
+}
+FRACTION_GLYPHS = [(0, ""), (1 / 8, "⅛"), (1 / 4, "¼"), (1 / 3, "⅓"), (3 / 8, "⅜"), (1 / 2, "½"),
+                   (5 / 8, "⅝"), (2 / 3, "⅔"), (3 / 4, "¾"), (7 / 8, "⅞"), (1, "")]
+
+
+def parse_number(text):
+    """Parses "2", "1.5", "1/2", "½", "1 ½", "2½" or "1 1/2" into a float."""
+    text = text.strip().replace("⁄", "/")
+    total = 0.0
+    for token in re.findall(rf'\d+/\d+|\d+(?:\.\d+)?|[{_FRACTION_CHARS}]', text):
+        if token in UNICODE_FRACTIONS:
+            total += UNICODE_FRACTIONS[token]
+        elif "/" in token:
+            numerator, denominator = token.split("/")
+            total += int(numerator) / int(denominator) if int(denominator) else 0.0
+        else:
+            total += float(token)
+    return total
+
+
+def _parse(text):
+    # (name, low, high, unit, size, equivalent, note)
+    rest = " ".join(text.replace("⁄", "/").split())
+    low = high = None
+    size = equivalent = unit = ""
+
+    match = QUANTITY.match(rest)
+    if match:
+        low = parse_number(match.group("low"))
+        high = parse_number(match.group("high")) if match.group("high") else None
+        rest = rest[match.end():]
+    else:
+        match = NUMBER_WORD.match(rest)
+        if match:
+            low = float(NUMBER_WORDS[match.group("word").lower()])
+            rest = rest[match.end():]
+
+    if low is not None:
+        match = SIZE.match(rest)
+        if match:
+            size = match.group(1)
+            rest = rest[match.end():]
+        match = UNIT.match(rest)
+        if match:
+            unit = UNITS[_ALIASES[match.group("unit").lower()]][0]
+            rest = rest[match.end():]
+            # "1 pound (4 sticks) butter": the same amount in another unit
+            match = SIZE.match(rest)
+            if match and match.group(1).startswith("("):
+                equivalent = match.group(1)
+                rest = rest[match.end():]
+        if rest.lower().startswith("of "):
+            rest = rest[3:]
+
+    name, _, note = rest.partition(",")
+    return name.strip(), low, high, unit, size, equivalent, note.strip()
+
+
+def parse_ingredient(text):
+    """
+    Splits an ingredient line into a numeric quantity, a canonical unit and a name.
+
+    Handles structured lines ("4 ½ cups tomato-basil pasta sauce") and Food
+    Network style free text ("Two 15-ounce cans pure pumpkin puree",
+    "2 to 3 teaspoons pumpkin pie spice").
+
+    Args:
+        text (str): Ingredient string
+
+    Returns:
+        Ingredient: quantity and quantity_max are floats (None if not given),
+        measurement_unit is a canonical unit name ("" if none)
+    """
+    name, low, high, unit, size, equivalent, note = _parse(text)
+    note = ", ".join(part for part in (equivalent, note) if part)
+    return Ingredient(name, low, unit, quantity_max=high, size=size, note=note)
+
+
+def format_quantity(value, metric=False):
+    """Formats an amount with kitchen fractions ("1 ½"), or decimals for metric units."""
+    if value is None or np.isnan(value):
+        return ""
+    if metric:
+        if value >= 10:
+            return str(int(round(value)))
+        return f"{value:.1f}".rstrip("0").rstrip(".")
+    whole = int(value)
+    fraction = value - whole
+    nearest, glyph = min(FRACTION_GLYPHS, key=lambda item: abs(item[0] - fraction))
+    if abs(nearest - fraction) > 0.04:
+        return f"{value:.2f}".rstrip("0").rstrip(".")
+    if nearest == 1:
+        whole, glyph = whole + 1, ""
+    if not whole and not glyph:
+        return f"{value:.2f}".rstrip("0").rstrip(".")
+    if whole and glyph:
+        return f"{whole} {glyph}"
+    return glyph or str(whole)
+
+
+class IngredientTable:
+    """
+    A recipe's ingredients in columnar form.
+
+    Quantities (low and high end of ranges, NaN if not given) and unit codes
+    are numpy arrays, so scaling and unit conversion run over every
+    ingredient at once instead of one string at a time.
+    """
+    __slots__ = ("names", "sizes", "equivalents", "notes", "low", "high", "unit")
+
+    def __init__(self, names, sizes, equivalents, notes, low, high, unit):
+        self.names = names
+        self.sizes = sizes
+        self.equivalents = equivalents
+        self.notes = notes
+        self.low = low
+        self.high = high
+        self.unit = unit
+
+    @classmethod
+    def from_ingredients(cls, ingredients):
+        """
+        Parses ingredient strings into a table.
+
+        Args:
+            ingredients (list): Ingredient strings from get_raw_ingredients_instructions
+
+        Returns:
+            IngredientTable
+        """
+        parsed = [_parse(text) for text in ingredients]
+        return cls(
+            [row[0] for row in parsed],
+            [row[4] for row in parsed],
+            [row[5] for row in parsed],
+            [row[6] for row in parsed],
+            np.array([np.nan if row[1] is None else row[1] for row in parsed], dtype=np.float64),
+            np.array([np.nan if row[2] is None else row[2] for row in parsed], dtype=np.float64),
+            np.array([UNIT_INDEX[row[3]] if row[3] else -1 for row in parsed], dtype=np.int16)
+        )
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, index):
+        unit = self.unit[index]
+        low, high = self.low[index], self.high[index]
+        return Ingredient(
+            self.names[index],
+            None if np.isnan(low) else float(low),
+            UNITS[unit][0] if unit >= 0 else "",
+            quantity_max=None if np.isnan(high) else float(high),
+            size=self.sizes[index],
+            note=", ".join(part for part in (self.equivalents[index], self.notes[index]) if part)
+        )
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+
+    def _replace(self, low, high, unit):
+        # Equivalents ("(4 sticks)") describe the original amount, so they are dropped once it changes
+        return IngredientTable(self.names, self.sizes, [""] * len(self), self.notes, low, high, unit)
+
+    def scale(self, factor):
+        """
+        Multiplies every quantity by factor (e.g. 2 to double the recipe).
+
+        Returns:
+            IngredientTable: New table; ingredients without a quantity are unchanged
+        """
+        return self._replace(self.low * factor, self.high * factor, self.unit)
+
+    def convert(self, system=None):
+        """
+        Converts volume and mass quantities to "metric" (ml/l, g/kg) or "us" (tsp/tbsp/cup, oz/lb) units.
+
+        The unit for each ingredient is picked from the size of its amount, so
+        2 cups becomes 473 ml and 6 teaspoons becomes 2 tablespoons. Countable
+        units (cloves, cans) are left alone. With system=None every ingredient
+        stays in its own system and only the unit is tidied (e.g. after scaling).
+
+        Returns:
+            IngredientTable
+        """
+        dimension = UNIT_DIMENSION[self.unit]
+        size = UNIT_SIZE[self.unit]
+        is_metric = UNIT_IS_METRIC[self.unit]
+        base_low, base_high = self.low * size, self.high * size
+
+        new_unit = self.unit.copy()
+        for name, targets in TARGET_UNITS.items():
+            if system is None:
+                applies = is_metric == (name == "metric")
+            elif system == name:
+                applies = np.ones(len(self), dtype=bool)
+            else:
+                continue
+            for unit_dimension, choices in targets.items():
+                conditions = [base_low < limit for _, limit in choices[:-1]]
+                candidates = [UNIT_INDEX[unit_name] for unit_name, _ in choices]
+                chosen = np.select(conditions, candidates[:-1], default=candidates[-1])
+                new_unit = np.where(applies & (dimension == unit_dimension), chosen, new_unit).astype(np.int16)
+
+        convertible = (dimension == VOLUME) | (dimension == MASS)
+        new_size = UNIT_SIZE[new_unit]
+        low = np.where(convertible, base_low / new_size, self.low)
+        high = np.where(convertible, base_high / new_size, self.high)
+        return self._replace(low, high, new_unit)
+
+    def to_strings(self):
+        """Renders the table back into ingredient lines ("1 ½ cups flour, sifted")."""
+        lines = []
+        for index in range(len(self)):
+            unit = self.unit[index]
+            metric = UNIT_IS_METRIC[unit]
+            low, high = self.low[index], self.high[index]
+            amount = format_quantity(low, metric)
+            if not np.isnan(high):
+                amount += f" to {format_quantity(high, metric)}"
+            parts = [amount, self.sizes[index]]
+            if unit >= 0:
+                name, plural = UNITS[unit][0], UNITS[unit][1]
+                parts.append(plural if (np.isnan(high) and low > 1) or high > 1 else name)
+            parts += [self.equivalents[index], self.names[index]]
+            line = " ".join(part for part in parts if part)
+            if self.notes[index]:
+                line += f", {self.notes[index]}"
+            lines.append(line)
+        return lines
+
+
+@lru_cache(maxsize=1024)
+def _cached_table(ingredients):
+    return IngredientTable.from_ingredients(ingredients)
+
+
+def ingredient_table(ingredients):
+    """Parsed IngredientTable for a recipe's ingredients, memoized per ingredient list."""
+    return _cached_table(tuple(ingredients))
@@ -0,0 +1,351 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Where the on-disk cache lives and how it is bounded. All of these can be
+# overridden from the .env file alongside GEMINI_API_KEY.
+CACHE_PATH = os.getenv(
+    "RECIPE_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "recipes.sqlite3")
+)
+CACHE_TTL = float(os.getenv("RECIPE_CACHE_TTL", 24 * 60 * 60))  # seconds
+CACHE_MAX_BYTES = int(os.getenv("RECIPE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+CACHE_ENABLED = os.getenv("RECIPE_CACHE_DISABLED", "").lower() not in ("1", "true", "yes")
+
+# Query parameters that never change the recipe that comes back
+TRACKING_PARAMS = ("utm_", "fbclid", "gclid", "mc_cid", "mc_eid")
+
+
+def normalize_url(url):
+    """
+    Normalizes a recipe URL so that trivially different links share a cache entry.
+
+    Lowercases the scheme and host, drops a leading "www.", the fragment,
+    tracking query parameters and any trailing slash, and sorts what is left
+    of the query string.
+
+    Args:
+        url (str): Recipe URL as supplied by the user
+
+    Returns:
+        str: Normalized URL
+    """
+    parts = urlsplit(url.strip())
+    scheme = (parts.scheme or "https").lower()
+    if scheme == "http":
+        scheme = "https"
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    path = parts.path.rstrip("/") or "/"
+    query = [
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith(TRACKING_PARAMS)
+    ]
+    return urlunsplit((scheme, host, path, urlencode(sorted(query)), ""))
+
+
+def recipe_hash(recipe):
+    """
+    Content hash of a parsed recipe, used as its id everywhere.
+
+    Args:
+        recipe (dict): Result of process_url
+
+    Returns:
+        str: sha256 hex digest of the recipe's canonical JSON
+    """
+    return hashlib.sha256(_canonical_json(recipe).encode("utf-8")).hexdigest()
+
+
+def _canonical_json(recipe):
+    return json.dumps(recipe, sort_keys=True, separators=(",", ":"))
+
+
+class CacheEntry:
+    """A cached parse result plus the HTTP validators it was fetched with"""
+    __slots__ = ("url", "content_hash", "recipe", "etag", "last_modified", "fetched_at")
+
+    def __init__(self, url, content_hash, recipe, etag, last_modified, fetched_at):
+        self.url = url
+        self.content_hash = content_hash
+        self.recipe = recipe
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+
+    def is_fresh(self, ttl):
+        return (time.time() - self.fetched_at) < ttl
+
+    def revalidation_headers(self):
+        """Conditional request headers for revalidating this entry."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class RecipeCache:
+    """
+    Persistent, content-addressed cache of process_url results backed by SQLite.
+
+    URLs map to the hash of the parsed recipe they produced, so two URLs that
+    resolve to the same recipe share one stored copy. Entries older than the
+    TTL are revalidated with ETag/Last-Modified, and the least recently used
+    URLs are evicted once the stored recipes exceed max_bytes.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stale": 0, "revalidated": 0, "evictions": 0}
+        self._drop_listeners = []
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                content_hash TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                size INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS urls (
+                url TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS urls_last_access ON urls (last_access);
+            -- Left over from caches written before steps were atomized locally
+            DROP TABLE IF EXISTS contexts;
+        """)
+
+    def get(self, url):
+        """
+        Looks up the cached entry for a URL, fresh or stale.
+
+        Args:
+            url (str): Recipe URL (normalized internally)
+
+        Returns:
+            CacheEntry or None if the URL has never been cached
+        """
+        key = normalize_url(url)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT u.content_hash, b.data, u.etag, u.last_modified, u.fetched_at "
+                "FROM urls u JOIN blobs b ON b.content_hash = u.content_hash WHERE u.url = ?",
+                (key,)
+            ).fetchone()
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            self._conn.execute("UPDATE urls SET last_access = ? WHERE url = ?", (time.time(), key))
+            entry = CacheEntry(key, row[0], None, row[2], row[3], row[4])
+            if entry.is_fresh(self.ttl):
+                self._stats["hits"] += 1
+            else:
+                self._stats["stale"] += 1
+
+        entry.recipe = json.loads(row[1])
+        return entry
+
+    def put(self, url, recipe, etag=None, last_modified=None):
+        """
+        Stores a parse result for a URL and evicts old entries if over budget.
+
+        Args:
+            url (str): Recipe URL (normalized internally)
+            recipe (dict): Result of process_url
+            etag (str): ETag response header, if any
+            last_modified (str): Last-Modified response header, if any
+
+        Returns:
+            str: Content hash the recipe was stored under, or None if it was
+                evicted straight away (larger than max_bytes)
+        """
+        key = normalize_url(url)
+        data = _canonical_json(recipe)
+        content_hash = hashlib.sha256(data.encode("utf-8")).hexdigest()
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO blobs (content_hash, data, size) VALUES (?, ?, ?)",
+                    (content_hash, data, len(data))
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO urls "
+                    "(url, content_hash, etag, last_modified, fetched_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, content_hash, etag, last_modified, now, now)
+                )
+                dropped = self._drop_orphans() + self._evict()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        self._notify_dropped(dropped)
+        return None if content_hash in dropped else content_hash
+
+    def get_by_hash(self, content_hash):
+        """
+        Looks up a stored recipe by its content hash (see recipe_hash).
+
+        Args:
+            content_hash (str): Hash returned by put
+
+        Returns:
+            dict: The parsed recipe, or None if it is not (or no longer) stored
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM blobs WHERE content_hash = ?", (content_hash,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def iter_recipes(self, batch_size=500):
+        """
+        Yields every stored recipe, e.g. to build a search index.
+
+        Yields:
+            (content_hash, url, recipe) - url is one of the URLs the recipe was parsed from
+        """
+        last = ""
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT b.content_hash, MIN(u.url), b.data FROM blobs b "
+                    "JOIN urls u ON u.content_hash = b.content_hash "
+                    "WHERE b.content_hash > ? GROUP BY b.content_hash ORDER BY b.content_hash LIMIT ?",
+                    (last, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            for content_hash, url, data in rows:
+                yield content_hash, url, json.loads(data)
+            last = rows[-1][0]
+
+    def touch(self, url):
+        """Marks a stale entry as fresh again after a 304 Not Modified."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE urls SET fetched_at = ?, last_access = ? WHERE url = ?",
+                (now, now, normalize_url(url))
+            )
+            self._stats["revalidated"] += 1
+
+    def invalidate(self, url):
+        """Removes a URL from the cache."""
+        with self._lock:
+            self._conn.execute("DELETE FROM urls WHERE url = ?", (normalize_url(url),))
+            dropped = self._drop_orphans()
+        self._notify_dropped(dropped)
+
+    def clear(self):
+        """Removes every entry from the cache."""
+        with self._lock:
+            dropped = [row[0] for row in self._conn.execute("SELECT content_hash FROM blobs")]
+            self._conn.execute("DELETE FROM urls")
+            self._conn.execute("DELETE FROM blobs")
+        self._notify_dropped(dropped)
+
+    def add_drop_listener(self, listener):
+        """
+        Registers a callback for recipes the cache stops storing.
+
+        Args:
+            listener (callable): Called with the content hash of each recipe
+                evicted, invalidated, replaced or cleared (e.g. RecipeIndex.remove)
+        """
+        self._drop_listeners.append(listener)
+
+    def _notify_dropped(self, dropped):
+        for content_hash in dropped:
+            for listener in self._drop_listeners:
+                listener(content_hash)
+
+    def total_bytes(self):
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    def stats(self):
+        """
+        Returns hit/miss counters and current size of the cache.
+
+        Returns:
+            dict: Counters plus 'entries', 'bytes' and 'hit_rate'
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = self._conn.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+            stats["bytes"] = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM blobs"
+            ).fetchone()[0]
+        lookups = stats["hits"] + stats["misses"] + stats["stale"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def _drop_orphans(self):
+        # Returns the content hashes of the recipes deleted
+        orphans = [row[0] for row in self._conn.execute(
+            "SELECT content_hash FROM blobs WHERE content_hash NOT IN (SELECT content_hash FROM urls)"
+        )]
+        if orphans:
+            self._conn.execute(
+                "DELETE FROM blobs WHERE content_hash NOT IN (SELECT content_hash FROM urls)"
+            )
+        return orphans
+
+    def _evict(self):
+        # Evict least recently used URLs until the stored recipes fit the budget;
+        # returns the content hashes of the recipes deleted
+        dropped = []
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        while total > self.max_bytes:
+            row = self._conn.execute(
+                "SELECT url FROM urls ORDER BY last_access ASC LIMIT 1"
+            ).fetchone()
+            if row is None:
+                break
+            self._conn.execute("DELETE FROM urls WHERE url = ?", (row[0],))
+            dropped += self._drop_orphans()
+            self._stats["evictions"] += 1
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        return dropped
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_recipe_cache():
+    """
+    Returns the process-wide RecipeCache, creating it on first use.
+
+    Returns:
+        RecipeCache or None if caching is disabled via RECIPE_CACHE_DISABLED
+    """
+    global _default_cache
+    if not CACHE_ENABLED:
+        return None
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = RecipeCache()
+    return _default_cache
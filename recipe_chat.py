@@ -1,70 +1,35 @@
 import re
-from html_parser import process_url
-import google.generativeai as genai
-import json
-import os
 from dotenv import load_dotenv
 
+# Load .env before the project modules, which read their settings at import
 load_dotenv()
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-GEMINI_MODEL = "gemini-2.5-flash-lite"
+
+from html_parser import process_url
+from recipe_context import get_atomized_steps, build_seed_history, peek_atomized_steps
+from recipe_cache import recipe_hash
+from intent_router import answer_locally
+from metrics import record_usage, span
+from session_store import compact_chat
+from model_client import get_model_client
 
 def create_chat_session(recipe_data):
     """
     Create a new Gemini chat session with recipe context.
     
+    The recipe's atomized steps are computed once per recipe and cached, and
+    new sessions start from a seeded history built from them, so creating a
+    session does not wait on the model. The model client is shared with the
+    web app (see model_client).
+    
     Args:
         recipe_data: Dict with 'ingredients' and 'instructions' keys
     
     Returns:
         chat session object
     """
-    # Configure Gemini API
-    genai.configure(api_key=GEMINI_API_KEY)
-    model = genai.GenerativeModel(GEMINI_MODEL)
-    
-# Create initial system-like message with recipe context
-    initial_prompt = f"""
-You are a helpful cooking assistant with conversation memory. You can help users navigate through a recipe step-by-step.
-
-FULL RECIPE DATA:
-{json.dumps(recipe_data, indent=2)}
-
-INSTRUCTIONS FOR YOU:
-CRITICAL FIRST STEP: Before anything else, you MUST atomize the instructions. Break down each instruction into smaller, atomic steps. Each atomic step should be a single action. For example:
-- "Preheat oven to 350°F, then mix flour and eggs" becomes Step 1: "Preheat oven to 350°F" and Step 2: "Mix flour and eggs"
-- Look for conjunctions like "then", "and then", "while", etc. and split on those
-- Each step should be one clear action
-
-After atomizing, you will use ONLY these atomized steps for the entire conversation. Renumber them starting from 1.
-
-Then follow these rules:
-- Track which step the user is currently on based on our conversation
-- If they say "start", "begin", or "start recipe", begin at step 1 of the ATOMIZED steps
-- If they say "next" or "n", move to the next atomized step
-- If they say "back", "b", or "previous", go to the previous atomized step
-- If they say "repeat" or "again", repeat the current atomized step
-- If they ask "step X", jump to that step number in the atomized steps
-- When presenting a step, format it clearly: "Step X: [instruction text]"
-- After showing a step, remind them they can say 'next', 'back', or ask questions
-- If they ask contextual questions like "how much of that?", "what temperature?", "how long?", refer to the current step based on our conversation
-- If asking about ingredients without context, provide exact quantities from the recipe
-- If the answer isn't in the recipe, say so politely and provide general cooking advice if appropriate
-- If the user query is asking for a guide on some action, technique, cooking term, or ingredient, explain it to them providing a google link or youtube link as necessary. Make sure the link is available.
-- Keep track of where they are in the recipe throughout our conversation
-
-You should maintain context and remember which step the user is on as we talk.
-
-First, atomize the steps internally, then respond with: "Ready! I've loaded and processed the recipe into [NUMBER] steps. You can ask me questions, or say 'start' to begin the step-by-step walkthrough."
-"""
-    
-    # Start chat session
-    chat = model.start_chat(history=[])
-    
-    # Send initial context
-    response = chat.send_message(initial_prompt)
-    
-    return chat
+    # Seed the chat with the precomputed steps instead of sending the recipe
+    steps = get_atomized_steps(recipe_data)
+    return get_model_client().start_chat(build_seed_history(recipe_data, steps))
 
 
 def query_gemini_chat(chat, query):
@@ -79,19 +44,22 @@ def query_gemini_chat(chat, query):
         str: Gemini's response
     """
     try:
-        response = chat.send_message(query)
+        with span("model"):
+            response = get_model_client().send(chat, query)
+        record_usage(response)
         return response.text
     except Exception as e:
         return f"Sorry, I encountered an error: {str(e)}"
 
 
-def process_user_query(chat, query):
+def process_user_query(chat, query, recipe_data=None):
     """
     Process a user query and return appropriate response.
     
     Args:
         chat: Active chat session
         query: User query string
+        recipe_data: Parsed recipe, used to answer navigation and lookup queries locally
     
     Returns:
         bool: True if should continue, False if should exit
@@ -103,10 +71,21 @@ def process_user_query(chat, query):
         print("\nGoodbye!")
         return False
     
+    # Navigation and lookup queries are answered from the parsed recipe
+    if recipe_data is not None:
+        steps = peek_atomized_steps(recipe_hash(recipe_data), recipe_data)
+        response = answer_locally(chat, query, recipe_data['ingredients'], steps)
+        if response is not None:
+            print(f"\n{response}")
+            compact_chat(chat)
+            return True
+    
     # Send to Gemini chat
     print("\nThinking...")
     response = query_gemini_chat(chat, query)
     print(f"\n{response}")
+    # Keep long conversations within the history token budget
+    compact_chat(chat)
     
     return True
 
@@ -149,7 +128,7 @@ def main():
         if not query:
             continue
         
-        should_continue = process_user_query(chat, query)
+        should_continue = process_user_query(chat, query, recipe_data)
         
         if not should_continue:
             break
@@ -0,0 +1,151 @@
+import os
+import threading
+
+from recipe_cache import get_recipe_cache, recipe_hash
+from single_flight import SingleFlight
+from step_atomizer import atomize_steps
+
+# Atomized steps per recipe id, shared by every session in this process
+ATOMIZED_STEPS_MAX = int(os.getenv("ATOMIZED_STEPS_MAX", 10000))
+_atomized_steps = {}
+_atomized_steps_lock = threading.Lock()
+# Sessions starting on the same recipe at once share one atomization
+_atomize_flight = SingleFlight("atomize")
+
+SESSION_PROMPT = """
+You are a helpful cooking assistant with conversation memory. You can help users navigate through a recipe step-by-step.
+
+INGREDIENTS:
+{ingredients}
+
+STEPS (already broken into atomic steps - use ONLY these, with these numbers, for the entire conversation):
+{steps}
+
+Follow these rules:
+- Track which step the user is currently on based on our conversation
+- If they say "start", "begin", or "start recipe", begin at step 1
+- If they say "next" or "n", move to the next step
+- If they say "back", "b", or "previous", go to the previous step
+- If they say "repeat" or "again", repeat the current step
+- If they ask "step X", jump to that step number
+- When presenting a step, format it clearly: "Step X: [instruction text]"
+- After showing a step, remind them they can say 'next', 'back', or ask questions
+- If they ask contextual questions like "how much of that?", "what temperature?", "how long?", refer to the current step based on our conversation
+- If asking about ingredients without context, provide exact quantities from the recipe
+- If the answer isn't in the recipe, say so politely and provide general cooking advice if appropriate
+- If the user query is asking for a guide on some action, technique, cooking term, or ingredient, explain it to them providing a google link or youtube link as necessary. Make sure the link is available.
+- Keep track of where they are in the recipe throughout our conversation
+
+You should maintain context and remember which step the user is on as we talk.
+"""
+
+READY_MESSAGE = "Ready! I've loaded and processed the recipe into {count} steps. You can ask me questions, or say 'start' to begin the step-by-step walkthrough."
+
+def recipe_steps(recipe_data):
+    """
+    Atomic step strings for a recipe.
+
+    Recipes parsed by process_url carry their steps, atomized locally by
+    step_atomizer. Recipes cached before that have only instructions and
+    are atomized here, which takes a few milliseconds.
+
+    Args:
+        recipe_data: Dict with 'ingredients' and 'instructions' (and usually 'steps') keys
+
+    Returns:
+        list: Atomized step strings
+    """
+    if recipe_data.get('steps'):
+        return [step['description'] for step in recipe_data['steps']]
+    return atomize_steps(recipe_data['instructions'])
+
+
+def _remember(recipe_id, steps):
+    with _atomized_steps_lock:
+        _atomized_steps[recipe_id] = steps
+        while len(_atomized_steps) > ATOMIZED_STEPS_MAX:
+            del _atomized_steps[next(iter(_atomized_steps))]
+
+
+def _atomize(recipe_id, recipe_data):
+    steps = _atomized_steps.get(recipe_id)
+    if steps is None:
+        steps = recipe_steps(recipe_data)
+        _remember(recipe_id, steps)
+    return steps
+
+
+def _load_and_atomize(recipe_id, recipe_data):
+    if recipe_data is None:
+        cache = get_recipe_cache()
+        recipe_data = cache.get_by_hash(recipe_id) if cache else None
+    if recipe_data is None:
+        return None
+    return _atomize(recipe_id, recipe_data)
+
+
+def peek_atomized_steps(recipe_id, recipe_data=None):
+    """
+    Returns a recipe's atomized steps if the recipe is known, without parsing any page.
+
+    Steps come from this process's memory, then from recipe_data (e.g. a
+    session's recipe restored from recipe_store, which carries its steps),
+    then from the recipe cache.
+
+    Args:
+        recipe_id (str): Recipe id
+        recipe_data: Dict with 'ingredients' and 'instructions' (and usually 'steps') keys, if at hand
+
+    Returns:
+        list: Atomized step strings, or None
+    """
+    steps = _atomized_steps.get(recipe_id)
+    if steps is not None:
+        return steps
+    return _atomize_flight.do(recipe_id, _load_and_atomize, recipe_id, recipe_data)
+
+
+def get_atomized_steps(recipe_data, recipe_id=None):
+    """
+    Returns the atomized steps for a recipe, computing them at most once per recipe.
+
+    Steps are kept in memory, so every session on the recipe gets the same
+    list and the same numbering. Concurrent callers for a recipe that isn't
+    atomized yet wait for one atomization.
+
+    Args:
+        recipe_data: Dict with 'ingredients' and 'instructions' keys
+        recipe_id (str): Recipe id, computed from recipe_data if not given
+
+    Returns:
+        list: Atomized step strings
+    """
+    recipe_id = recipe_id or recipe_hash(recipe_data)
+    steps = _atomized_steps.get(recipe_id)
+    if steps is None:
+        steps = _atomize_flight.do(recipe_id, _atomize, recipe_id, recipe_data)
+    return steps
+
+
+def build_seed_history(recipe_data, steps):
+    """
+    Builds the opening exchange of a chat session from precomputed steps.
+
+    Starting a chat with this history gives the model the full recipe
+    context without sending anything, so a new session costs no round trip.
+
+    Args:
+        recipe_data: Dict with 'ingredients' and 'instructions' keys
+        steps (list): Atomized step strings
+
+    Returns:
+        list: Chat history for model.start_chat
+    """
+    prompt = SESSION_PROMPT.format(
+        ingredients="\n".join(f"- {ingredient}" for ingredient in recipe_data['ingredients']),
+        steps="\n".join(f"Step {i}: {step}" for i, step in enumerate(steps, 1))
+    )
+    return [
+        {"role": "user", "parts": [prompt]},
+        {"role": "model", "parts": [READY_MESSAGE.format(count=len(steps))]}
+    ]
@@ -0,0 +1,357 @@
+import heapq
+import math
+import os
+import re
+import threading
+from array import array
+from collections import OrderedDict
+
+import numpy as np
+
+from nlp_pipeline import SPACY_MODEL, lemma, pipe, uses_model
+from quantities import parse_ingredient
+from recipe_cache import get_recipe_cache, recipe_hash
+
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", 50))
+# Uncached recipes held for the index until the first search builds it; past
+# this the oldest are dropped, so a long batch without search stays bounded
+SEARCH_PENDING_MAX = int(os.getenv("SEARCH_PENDING_MAX", 1000))
+
+# Index terms only need lemmas, not the dependency parse
+INDEX_DISABLED = ("parser", "sentencizer")
+# Matches in ingredients count for more than the same word in the instructions
+FIELD_WEIGHTS = {"ingredients": 2.0, "instructions": 1.0}
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Rebuild postings once this share of indexed recipes has been removed
+COMPACT_RATIO = 0.25
+
+# "350°F", "350 degrees F" -> one token "350f", so temperatures can be searched for
+TEMPERATURE = re.compile(r'(\d+)\s*(?:°|º|degrees?)\s*([fc])\b', re.IGNORECASE)
+# Leading phrases that pick the field to search
+QUERY_FIELD = re.compile(
+    r'^\s*(?:(?P<ingredients>(?:recipes? )?(?:using|with|containing|that use)|ingredients?:?)'
+    r'|(?P<instructions>(?:steps?|instructions?) (?:mentioning|with|containing|that mention)|steps?:?|instructions?:?))\s+',
+    re.IGNORECASE
+)
+QUERY_STOP_WORDS = {"recipe", "recipes", "and", "or"}
+
+
+class Analyzer:
+    """
+    Turns text into index terms: lowercase lemmas without stop words or punctuation.
+
+    Uses the shared spaCy pipeline from nlp_pipeline with the parser
+    skipped, and simple_lemma if no trained model is installed.
+    """
+
+    def __init__(self):
+        # Imported with the pipeline rather than at module load (see nlp_pipeline.get_nlp)
+        from spacy.lang.en.stop_words import STOP_WORDS
+
+        self.uses_model = uses_model()
+        self.stop_words = STOP_WORDS
+
+    def _terms(self, doc):
+        terms = []
+        for token in doc:
+            if token.is_punct or token.is_space:
+                continue
+            if token.lower_ in self.stop_words:
+                continue
+            term = lemma(token)
+            if term and not term.isspace():
+                terms.append(term)
+        return terms
+
+    def analyze(self, text):
+        return self.analyze_many([text])[0]
+
+    def analyze_many(self, texts):
+        """Terms for many texts, run through nlp.pipe in batches."""
+        texts = [TEMPERATURE.sub(r' \1\2 ', text) for text in texts]
+        return [self._terms(doc) for doc in pipe(texts, disable=INDEX_DISABLED)]
+
+
+class FieldIndex:
+    """
+    Postings for one field (ingredients or instructions).
+
+    Each term's postings are two growable arrays (document numbers and term
+    frequencies), so they take a few bytes per entry and can be read as
+    numpy arrays without copying when scoring.
+    """
+
+    def __init__(self):
+        self.docs = {}  # term -> array('I') of document numbers, ascending
+        self.freqs = {}  # term -> array('I') of term frequencies
+        self.df = {}  # term -> number of live documents containing it
+        self.lengths = array('I')  # document number -> number of terms
+        self.total_length = 0
+
+    def add(self, doc, terms):
+        counts = {}
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+        for term, count in counts.items():
+            if term not in self.docs:
+                self.docs[term] = array('I')
+                self.freqs[term] = array('I')
+            self.docs[term].append(doc)
+            self.freqs[term].append(count)
+            self.df[term] = self.df.get(term, 0) + 1
+        while len(self.lengths) <= doc:
+            self.lengths.append(0)
+        self.lengths[doc] = len(terms)
+        self.total_length += len(terms)
+        return tuple(counts)
+
+    def remove(self, doc, unique_terms):
+        # Postings are left in place and filtered out by the live mask until the next compaction
+        for term in unique_terms:
+            self.df[term] -= 1
+            if not self.df[term]:
+                del self.df[term], self.docs[term], self.freqs[term]
+        self.total_length -= self.lengths[doc]
+        self.lengths[doc] = 0
+
+    def compact(self, live):
+        for term in list(self.docs):
+            docs = np.frombuffer(self.docs[term], dtype=np.uint32)
+            keep = live[docs].astype(bool)
+            if keep.all():
+                continue
+            freqs = np.frombuffer(self.freqs[term], dtype=np.uint32)
+            new_docs, new_freqs = array('I', docs[keep].tobytes()), array('I', freqs[keep].tobytes())
+            del docs, freqs  # release the buffers before replacing the arrays
+            self.docs[term], self.freqs[term] = new_docs, new_freqs
+
+
+class RecipeIndex:
+    """
+    Inverted index over parsed recipes with BM25 ranking.
+
+    Ingredient names and instruction text are indexed as separate fields.
+    Recipes can be added and removed one at a time; removed recipes are
+    masked out immediately and their postings dropped on compaction.
+    """
+
+    def __init__(self, analyzer=None):
+        self.analyzer = analyzer or Analyzer()
+        self.fields = {name: FieldIndex() for name in FIELD_WEIGHTS}
+        self._lock = threading.Lock()
+        self._doc_numbers = {}  # recipe_id -> document number
+        self._recipe_ids = []  # document number -> recipe_id (None once removed)
+        self._urls = []
+        self._terms = []  # document number -> {field: unique terms}, for removal
+        self._live = bytearray()
+        self._removed = 0
+
+    def __len__(self):
+        return len(self._doc_numbers)
+
+    def __contains__(self, recipe_id):
+        return recipe_id in self._doc_numbers
+
+    def add(self, recipe, url=None, recipe_id=None):
+        """
+        Indexes a process_url result. Recipes already indexed are skipped (ids are content hashes).
+
+        Args:
+            recipe (dict): {'ingredients': [...], 'instructions': [...]}
+            url (str): URL the recipe was parsed from
+            recipe_id (str): Recipe id, computed from recipe if not given
+
+        Returns:
+            str: recipe_id
+        """
+        recipe_id = recipe_id or recipe_hash(recipe)
+        self.add_many([(recipe_id, url, recipe)])
+        return recipe_id
+
+    def add_many(self, recipes):
+        """
+        Indexes many recipes, analyzing their text in batches.
+
+        Args:
+            recipes: Iterable of (recipe_id, url, recipe)
+        """
+        recipes = [entry for entry in recipes if entry[0] not in self._doc_numbers]
+        if not recipes:
+            return
+        ingredient_terms = self.analyzer.analyze_many([
+            " ".join(parse_ingredient(text).name for text in recipe["ingredients"]) for _, _, recipe in recipes
+        ])
+        instruction_terms = self.analyzer.analyze_many([" ".join(recipe["instructions"]) for _, _, recipe in recipes])
+
+        with self._lock:
+            for (recipe_id, url, _), ingredients, instructions in zip(recipes, ingredient_terms, instruction_terms):
+                if recipe_id in self._doc_numbers:
+                    continue
+                doc = len(self._recipe_ids)
+                self._recipe_ids.append(recipe_id)
+                self._urls.append(url)
+                self._live.append(1)
+                self._terms.append({
+                    "ingredients": self.fields["ingredients"].add(doc, ingredients),
+                    "instructions": self.fields["instructions"].add(doc, instructions)
+                })
+                self._doc_numbers[recipe_id] = doc
+
+    def remove(self, recipe_id):
+        """Removes a recipe from the index. Returns False if it wasn't indexed."""
+        with self._lock:
+            return self._remove(recipe_id)
+
+    def _remove(self, recipe_id):
+        doc = self._doc_numbers.pop(recipe_id, None)
+        if doc is None:
+            return False
+        for name, field in self.fields.items():
+            field.remove(doc, self._terms[doc][name])
+        self._terms[doc] = None
+        self._recipe_ids[doc] = None
+        self._urls[doc] = None
+        self._live[doc] = 0
+        self._removed += 1
+        if self._removed > COMPACT_RATIO * len(self._recipe_ids):
+            live = np.frombuffer(self._live, dtype=np.uint8)
+            for field in self.fields.values():
+                field.compact(live)
+            del live
+            self._removed = 0
+        return True
+
+    def search(self, query, field=None, limit=10, match_all=True):
+        """
+        Ranked search over the indexed recipes.
+
+        Args:
+            query (str): Free text, e.g. "salmon soy sauce" or "steps mentioning 350°F".
+                A leading "recipes using ..." / "steps mentioning ..." picks the field.
+            field (str): "ingredients", "instructions" or None for both
+            limit (int): Maximum number of results
+            match_all (bool): Only return recipes containing every query term
+
+        Returns:
+            list: [{'recipe_id', 'url', 'score'}, ...] best first
+        """
+        match = QUERY_FIELD.match(query)
+        if match:
+            field = field or match.lastgroup
+            query = query[match.end():]
+        terms = [term for term in dict.fromkeys(self.analyzer.analyze(query)) if term not in QUERY_STOP_WORDS]
+        if not terms:
+            return []
+        fields = [field] if field else list(FIELD_WEIGHTS)
+        limit = max(1, min(limit, SEARCH_MAX_RESULTS))
+
+        with self._lock:
+            if not self._doc_numbers:
+                return []
+            live = np.frombuffer(self._live, dtype=np.uint8)
+            scores = np.zeros(len(self._live), dtype=np.float64)
+            matched = np.zeros(len(self._live), dtype=np.int32)
+            total = len(self._doc_numbers)
+            for term in terms:
+                term_docs = np.zeros(len(self._live), dtype=bool)
+                for name in fields:
+                    index = self.fields[name]
+                    if term not in index.docs:
+                        continue
+                    docs = np.frombuffer(index.docs[term], dtype=np.uint32)
+                    freqs = np.frombuffer(index.freqs[term], dtype=np.uint32).astype(np.float64)
+                    lengths = np.frombuffer(index.lengths, dtype=np.uint32)[docs]
+                    df = index.df[term]
+                    idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+                    average = index.total_length / total if total else 1.0
+                    tf = freqs * (BM25_K1 + 1) / (freqs + BM25_K1 * (1 - BM25_B + BM25_B * lengths / average))
+                    scores[docs] += FIELD_WEIGHTS[name] * idf * tf  # docs are unique within a posting list
+                    term_docs[docs] = True
+                    del docs, freqs, lengths
+                matched += term_docs
+            candidates = live.astype(bool) & (matched == len(terms) if match_all else matched > 0)
+            del live
+            found = np.flatnonzero(candidates)
+            if len(found) > limit:
+                top = found[np.argpartition(-scores[found], limit - 1)[:limit]]
+            else:
+                top = found
+            results = [
+                {"recipe_id": self._recipe_ids[doc], "url": self._urls[doc], "score": round(float(scores[doc]), 4)}
+                for doc in top
+            ]
+        return heapq.nlargest(limit, results, key=lambda result: result["score"])
+
+    def stats(self):
+        with self._lock:
+            return {
+                "recipes": len(self._doc_numbers),
+                "ingredient_terms": len(self.fields["ingredients"].docs),
+                "instruction_terms": len(self.fields["instructions"].docs),
+                "lemmatizer": SPACY_MODEL if self.analyzer.uses_model else "rule-based"
+            }
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+# Recipes parsed without the recipe cache before the index was built:
+# recipe_id -> (url, ingredients and instructions), oldest first
+_pending = OrderedDict()
+
+
+def get_recipe_index():
+    """
+    Returns the process-wide RecipeIndex, building it from the recipe cache on first use.
+
+    Recipes the cache later evicts or drops are removed from the index.
+
+    Returns:
+        RecipeIndex
+    """
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            index = RecipeIndex()
+            cache = get_recipe_cache()
+            if cache is not None:
+                batch = []
+                for entry in cache.iter_recipes():
+                    batch.append(entry)
+                    if len(batch) >= 1000:
+                        index.add_many(batch)
+                        batch = []
+                index.add_many(batch)
+                cache.add_drop_listener(index.remove)
+            index.add_many((recipe_id, url, recipe) for recipe_id, (url, recipe) in _pending.items())
+            _pending.clear()
+            _default_index = index
+    return _default_index
+
+
+def index_recipe(recipe, url=None, recipe_id=None, cached=False):
+    """
+    Adds a newly parsed recipe to the search index.
+
+    Until the index is built, recipes stored in the recipe cache are skipped
+    (the index is built from the cache on first use) and the others are held
+    until then, keeping the SEARCH_PENDING_MAX most recent.
+
+    Args:
+        recipe (dict): process_url result
+        url (str): URL it was parsed from
+        recipe_id (str): Recipe id, computed from recipe if not given
+        cached (bool): Whether the recipe was just stored in the recipe cache
+    """
+    with _default_index_lock:
+        if _default_index is None:
+            if not cached and SEARCH_PENDING_MAX > 0:
+                recipe_id = recipe_id or recipe_hash(recipe)
+                # Only the fields the index reads, not the parsed steps
+                _pending[recipe_id] = (url, {"ingredients": recipe["ingredients"],
+                                             "instructions": recipe["instructions"]})
+                _pending.move_to_end(recipe_id)
+                while len(_pending) > SEARCH_PENDING_MAX:
+                    _pending.popitem(last=False)
+            return
+    _default_index.add(recipe, url, recipe_id)
@@ -0,0 +1,121 @@
+import os
+import threading
+from collections import OrderedDict
+
+from recipe_cache import get_recipe_cache, recipe_hash
+
+RECIPE_STORE_MAX = int(os.getenv("RECIPE_STORE_MAX", 10000))
+
+
+class ParsedRecipe:
+    """
+    An immutable parsed recipe, shared by every session that uses it.
+
+    Ingredients, instructions and steps are tuples so one object can safely
+    be handed to many sessions and threads at once.
+    """
+    __slots__ = ("recipe_id", "url", "ingredients", "instructions", "steps")
+
+    def __init__(self, recipe_id, url, ingredients, instructions, steps=()):
+        object.__setattr__(self, "recipe_id", recipe_id)
+        object.__setattr__(self, "url", url)
+        object.__setattr__(self, "ingredients", tuple(ingredients))
+        object.__setattr__(self, "instructions", tuple(instructions))
+        object.__setattr__(self, "steps", tuple(steps))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ParsedRecipe is immutable")
+
+    def as_dict(self):
+        """The recipe in the {'ingredients', 'instructions', 'steps'} shape process_url returns."""
+        recipe = {
+            "ingredients": list(self.ingredients),
+            "instructions": list(self.instructions)
+        }
+        # Recipes cached before steps were atomized at parse time have none
+        if self.steps:
+            recipe["steps"] = list(self.steps)
+        return recipe
+
+    def __repr__(self):
+        return f"ParsedRecipe(recipe_id='{self.recipe_id[:12]}', url='{self.url}', ingredients={len(self.ingredients)}, instructions={len(self.instructions)})"
+
+
+class RecipeStore:
+    """
+    Parsed recipes keyed by recipe id (the content hash of the recipe).
+
+    Parsing the same recipe twice, from the same or a different URL, returns
+    the one ParsedRecipe already held. Ids that are not in memory (e.g. parsed
+    by another worker) are loaded from the on-disk recipe cache.
+    """
+
+    def __init__(self, max_recipes=RECIPE_STORE_MAX):
+        self.max_recipes = max_recipes
+        self._recipes = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"added": 0, "deduplicated": 0, "loaded": 0}
+
+    def add(self, recipe, url=None):
+        """
+        Stores a process_url result, deduplicating identical recipes.
+
+        Args:
+            recipe (dict): Result of process_url
+            url (str): URL the recipe was parsed from
+
+        Returns:
+            ParsedRecipe
+        """
+        recipe_id = recipe_hash(recipe)
+        with self._lock:
+            existing = self._recipes.get(recipe_id)
+            if existing is not None:
+                self._recipes.move_to_end(recipe_id)
+                self._stats["deduplicated"] += 1
+                return existing
+            parsed = ParsedRecipe(recipe_id, url, recipe["ingredients"], recipe["instructions"], recipe.get("steps", ()))
+            self._insert(parsed)
+            self._stats["added"] += 1
+            return parsed
+
+    def get(self, recipe_id):
+        """
+        Looks up a recipe by id, falling back to the shared on-disk cache.
+
+        Args:
+            recipe_id (str): Id returned by add
+
+        Returns:
+            ParsedRecipe or None if unknown
+        """
+        if not recipe_id:
+            return None
+        with self._lock:
+            parsed = self._recipes.get(recipe_id)
+            if parsed is not None:
+                self._recipes.move_to_end(recipe_id)
+                return parsed
+
+        cache = get_recipe_cache()
+        recipe = cache.get_by_hash(recipe_id) if cache else None
+        if recipe is None:
+            return None
+        with self._lock:
+            parsed = self._recipes.get(recipe_id)
+            if parsed is None:
+                parsed = ParsedRecipe(recipe_id, None, recipe["ingredients"], recipe["instructions"], recipe.get("steps", ()))
+                self._insert(parsed)
+                self._stats["loaded"] += 1
+        return parsed
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["recipes"] = len(self._recipes)
+        return stats
+
+    def _insert(self, parsed):
+        self._recipes[parsed.recipe_id] = parsed
+        while len(self._recipes) > self.max_recipes:
+            self._recipes.popitem(last=False)
@@ -0,0 +1,192 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from intent_router import (
+    CONTEXTUAL_WORDS, STEP_MENTION, current_step_from_history, normalize_query, record_exchange, router_stats
+)
+
+# Model answers to questions that don't depend on where the user is in the
+# recipe ("what can I substitute for eggs?"), shared by every session on the
+# same recipe in this process. Keyed by (recipe id, normalized query).
+RESPONSE_CACHE_MAX = int(os.getenv("RESPONSE_CACHE_MAX", 5000))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 24 * 60 * 60))  # seconds since stored
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_DISABLED", "").lower() not in ("1", "true", "yes")
+
+# Words that tie a question to the current step or the previous answer, and
+# navigation commands the model handles when the router has no steps
+STEP_WORDS = CONTEXTUAL_WORDS | {
+    "start", "begin", "back", "b", "n", "prev", "repeat", "continue", "step", "steps", "next", "now", "current", "currently", "previous", "last", "again", "here", "then",
+    "after", "before", "same", "also", "else", "instead", "yet", "still", "done", "finished", "ready", "you"
+}
+# Follow-ups only make sense after the previous answer ("what about the sauce?")
+FOLLOW_UP = re.compile(r'^(and|but|so|ok|okay|what about|how about|why|really)\b')
+# "this recipe" is the session's recipe, not something said earlier
+THIS_RECIPE = re.compile(r'\b(this|that) (recipe|dish|meal)\b')
+POLITE = re.compile(r'^((please|hey|hi|um|can you|could you|tell me|do you know) )+|( please)$')
+# Question words and fillers; a question made only of these ("how long?",
+# "what temperature?") is about the current step once the walkthrough has started
+QUESTION_WORDS = {
+    "what", "whats", "what's", "how", "which", "when", "where", "who", "is", "are", "do", "does", "did",
+    "should", "can", "could", "would", "will", "i", "we", "my", "the", "a", "an", "to", "for", "in", "at",
+    "on", "with", "long", "much", "many", "hot", "temperature", "temp", "heat", "time", "size", "use", "need",
+    "cook", "bake", "oven", "pan", "set", "be"
+}
+
+
+def normalize(query):
+    """Lowercases a query, drops punctuation and politeness words and collapses whitespace."""
+    text = " ".join(normalize_query(query).split())
+    text = THIS_RECIPE.sub(r"the \2", text.replace("what's", "what is"))
+    return POLITE.sub("", text).strip()
+
+
+def cache_key(recipe_id, query, current_step):
+    """
+    Returns the cache key for a question, or None if its answer may depend on the conversation.
+
+    Questions mentioning steps, pronouns ("how much of that?") or follow-up
+    phrases are never cached. A question made only of question words
+    ("what temperature?") is cached only before the walkthrough starts,
+    while it can't refer to a step.
+
+    Args:
+        recipe_id (str): Recipe id
+        query (str): User query
+        current_step (int): Step the session is on (0 if not started)
+
+    Returns:
+        tuple: (recipe_id, normalized query), or None
+    """
+    text = normalize(query)
+    if not text or FOLLOW_UP.match(text):
+        return None
+    words = set(text.split())
+    if words & STEP_WORDS or any(word.isdigit() for word in words):
+        return None
+    if current_step and words <= QUESTION_WORDS:
+        return None
+    return (recipe_id, text)
+
+
+class ResponseCache:
+    """LRU cache of model answers with a TTL and hit-rate accounting"""
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX, ttl=RESPONSE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (answer, stored_at)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stored": 0, "evictions": 0, "expired": 0}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, key):
+        """
+        Returns the cached answer for a key, or None.
+
+        Args:
+            key: From cache_key; None always misses without being counted
+        """
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.time() - self.ttl:
+                del self._entries[key]
+                self._stats["expired"] += 1
+                entry = None
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[0]
+
+    def put(self, key, answer):
+        """
+        Stores a model answer (ignored if key is None or the answer is empty).
+
+        Answers that present a step ("Step X: ...") are not stored: replayed
+        in another session they would move its current step.
+        """
+        if key is None or not answer or STEP_MENTION.search(answer):
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (answer, time.time())
+            self._stats["stored"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def stats(self):
+        """
+        Returns hit/miss counters and size.
+
+        Returns:
+            dict: hits, misses, hit_rate, stored, evictions, expired, entries and limits
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats.update({
+            "hit_rate": stats["hits"] / lookups if lookups else 0.0,
+            "max_entries": self.max_entries,
+            "ttl_sec": self.ttl
+        })
+        return stats
+
+
+_default_response_cache = ResponseCache() if RESPONSE_CACHE_ENABLED else None
+
+
+def get_response_cache():
+    """
+    Returns the process-wide ResponseCache.
+
+    Returns:
+        ResponseCache or None if disabled via RESPONSE_CACHE_DISABLED
+    """
+    return _default_response_cache
+
+
+def cached_response(chat, recipe_id, query):
+    """
+    Looks a question the router couldn't answer up in the response cache.
+
+    A hit is appended to the chat's history like a local answer, so the
+    model still sees the whole conversation. The query is counted in
+    router_stats as answered from the cache, or by the model on a miss.
+
+    Args:
+        chat: Session's chat (its history holds the current step)
+        recipe_id (str): Recipe id
+        query (str): User query
+
+    Returns:
+        (answer, key) - answer is None on a miss; key is where to store the
+        model's answer, None if the question depends on the conversation
+    """
+    cache = get_response_cache()
+    if cache is None:
+        router_stats.record(None)
+        return None, None
+    key = cache_key(recipe_id, query, current_step_from_history(chat.history))
+    answer = cache.get(key)
+    if answer is not None:
+        record_exchange(chat, query, answer)
+    router_stats.record("cache" if answer is not None else None)
+    return answer, key
+
+
+def store_response(key, answer):
+    """Caches the model's answer under a key from cached_response."""
+    cache = get_response_cache()
+    if cache is not None:
+        cache.put(key, answer)
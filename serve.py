@@ -0,0 +1,218 @@
+"""
+Production launcher for the async API (asgi_app.py) on uvicorn.
+
+    python serve.py --workers 4 --limit-concurrency 2000
+
+Every setting can also come from the .env file: WEB_HOST, WEB_PORT,
+WEB_WORKERS, WEB_LIMIT_CONCURRENCY, WEB_BACKLOG, WEB_KEEPALIVE and
+ASYNC_BLOCKING_WORKERS (threads per worker for blocking fetch/parse work).
+
+Each worker is a separate process with its own event loop. With more than
+one worker, set SESSION_BACKEND=sqlite or redis so a conversation can be
+served by any of them.
+
+With --prefork (WEB_PREFORK=1, POSIX only) the launcher loads the heavy
+shared state once (spaCy, the extraction backends, the Gemini SDK), freezes
+it out of the garbage collector and forks the workers from it, so they start
+warm and share those pages copy-on-write:
+
+    python serve.py --prefork --workers 4
+"""
+import argparse
+import gc
+import importlib
+import os
+import signal
+import socket
+import sys
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Imported by the prefork parent; none of them opens files, sockets or
+# threads at import, so they are safe to share across fork. Per-process
+# state (caches, session stores, the model client) is created in each worker.
+PRELOAD_MODULES = ("uvicorn", "quart", "flask", "html_parser", "recipe_index", "step_atomizer",
+                   "google.generativeai")
+# A worker that dies is replaced after RESTART_DELAY seconds, doubling for each
+# restart in the last RESTART_WINDOW seconds up to RESTART_MAX_DELAY. More than
+# MAX_RESTARTS in the window (e.g. an import error or a port in use in every
+# child) stops the launcher instead of forking in a loop.
+RESTART_DELAY = float(os.getenv("WEB_RESTART_DELAY", 1))
+RESTART_MAX_DELAY = float(os.getenv("WEB_RESTART_MAX_DELAY", 30))
+RESTART_WINDOW = float(os.getenv("WEB_RESTART_WINDOW", 60))
+MAX_RESTARTS = int(os.getenv("WEB_MAX_RESTARTS", 10))
+
+
+def preload():
+    """
+    Imports and warms the read-only state every worker shares.
+
+    Returns:
+        float: Seconds taken
+    """
+    start = time.perf_counter()
+    for name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            print(f"DEBUG: Not preloading {name}: {e}")
+    from nlp_pipeline import get_nlp
+    from extract_backends import get_backend
+    get_nlp()
+    get_backend()
+    # Move everything loaded so far out of the collector's reach, so collections
+    # in the workers don't write to (and un-share) these pages
+    gc.collect()
+    gc.freeze()
+    return time.perf_counter() - start
+
+
+def restart_delay(restarts):
+    """
+    Seconds to wait before the next restart.
+
+    Args:
+        restarts (int): Restarts already made in the last RESTART_WINDOW seconds
+
+    Returns:
+        float
+    """
+    return min(RESTART_DELAY * 2 ** restarts, RESTART_MAX_DELAY)
+
+
+def run_preforked(args):
+    """
+    Serves asgi_app from workers forked off one preloaded parent, restarting
+    any that die with a growing delay and giving up after MAX_RESTARTS in
+    RESTART_WINDOW seconds.
+    """
+    import uvicorn
+
+    elapsed = preload()
+    print(f"Preloaded shared state in {elapsed:.2f}s; forking {args.workers} workers")
+
+    sock = socket.socket(socket.AF_INET6 if ":" in args.host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(args.backlog)
+    sock.set_inheritable(True)
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            config = uvicorn.Config(
+                "asgi_app:app",
+                limit_concurrency=args.limit_concurrency,
+                backlog=args.backlog,
+                timeout_keep_alive=args.keepalive,
+                log_level=args.log_level
+            )
+            code = 1
+            try:
+                uvicorn.Server(config).run(sockets=[sock])
+                code = 0
+            finally:
+                os._exit(code)
+        return pid
+
+    workers = {spawn() for _ in range(args.workers)}
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    restarts = []
+    failed = False
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        workers.discard(pid)
+        code = os.waitstatus_to_exitcode(status)
+        if stopping:
+            continue
+        now = time.monotonic()
+        restarts = [t for t in restarts if now - t < RESTART_WINDOW]
+        if len(restarts) >= MAX_RESTARTS:
+            print(f"ERROR: Worker {pid} exited with status {code}; {len(restarts)} restarts in the last "
+                  f"{RESTART_WINDOW:g}s, stopping")
+            failed = True
+            stop(signal.SIGTERM, None)
+            continue
+        delay = restart_delay(len(restarts))
+        print(f"WARNING: Worker {pid} exited with status {code}; starting a new one in {delay:g}s")
+        # Slept in steps so a SIGTERM during the wait is not held up by it
+        deadline = now + delay
+        while not stopping and time.monotonic() < deadline:
+            time.sleep(max(0, min(0.1, deadline - time.monotonic())))
+        if not stopping:
+            restarts.append(time.monotonic())
+            workers.add(spawn())
+    sock.close()
+    if failed:
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Recipe Chat async API on uvicorn.")
+    parser.add_argument("--host", default=os.getenv("WEB_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("WEB_PORT", 5000)))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_WORKERS", os.cpu_count() or 1)),
+                        help="Worker processes (default: CPU count)")
+    parser.add_argument("--limit-concurrency", type=int, default=int(os.getenv("WEB_LIMIT_CONCURRENCY", 1000)),
+                        help="Open connections per worker before new ones get 503 (default: 1000)")
+    parser.add_argument("--backlog", type=int, default=int(os.getenv("WEB_BACKLOG", 2048)))
+    parser.add_argument("--keepalive", type=int, default=int(os.getenv("WEB_KEEPALIVE", 5)),
+                        help="Seconds to keep idle connections open")
+    parser.add_argument("--blocking-workers", type=int, default=None,
+                        help="Threads per worker for blocking fetch/parse work (ASYNC_BLOCKING_WORKERS)")
+    parser.add_argument("--log-level", default=os.getenv("WEB_LOG_LEVEL", "info"))
+    parser.add_argument("--prefork", action="store_true",
+                        default=os.getenv("WEB_PREFORK", "").lower() in ("1", "true", "yes"),
+                        help="Fork warm workers from one preloaded parent (POSIX only)")
+    args = parser.parse_args()
+
+    if args.blocking_workers is not None:
+        # Read by asgi_app at import time in every worker
+        os.environ["ASYNC_BLOCKING_WORKERS"] = str(args.blocking_workers)
+
+    if args.workers > 1 and os.getenv("SESSION_BACKEND", "memory").lower() == "memory":
+        print("WARNING: SESSION_BACKEND=memory with several workers; a conversation only "
+              "continues on the worker that started it. Use sqlite or redis.")
+
+    if args.prefork:
+        if not hasattr(os, "fork"):
+            sys.exit("--prefork needs os.fork (POSIX)")
+        run_preforked(args)
+        return
+
+    import uvicorn
+    uvicorn.run(
+        "asgi_app:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        limit_concurrency=args.limit_concurrency,
+        backlog=args.backlog,
+        timeout_keep_alive=args.keepalive,
+        log_level=args.log_level
+    )
+
+
+if __name__ == "__main__":
+    main()
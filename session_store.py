@@ -0,0 +1,445 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from chat_history import HISTORY_TOKEN_BUDGET, TokenUsage, compact_history, history_tokens
+from single_flight import SingleFlight
+
+# Limits and persistence for chat sessions. All of these can be overridden
+# from the .env file alongside GEMINI_API_KEY.
+SESSION_MAX = int(os.getenv("SESSION_MAX", 1000))
+SESSION_TTL = float(os.getenv("SESSION_TTL", 2 * 60 * 60))  # seconds since last use
+SESSION_MAX_HISTORY_BYTES = int(os.getenv("SESSION_MAX_HISTORY_BYTES", 256 * 1024 * 1024))
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory").lower()  # memory, sqlite or redis
+SESSION_DB_PATH = os.getenv(
+    "SESSION_DB_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "sessions.sqlite3")
+)
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+
+def serialize_history(chat):
+    """
+    Converts a chat's history into plain JSON-able dicts.
+
+    Args:
+        chat: Gemini chat session
+
+    Returns:
+        list: [{'role': 'user' or 'model', 'parts': [text, ...]}, ...]
+    """
+    history = []
+    for content in chat.history:
+        parts = [part.text for part in content.parts if getattr(part, "text", None)]
+        history.append({"role": content.role, "parts": parts})
+    return history
+
+
+def compact_chat(chat, budget=HISTORY_TOKEN_BUDGET):
+    """
+    Compacts a chat's history in place if it is over the token budget.
+
+    Returns:
+        list: The chat's serialized history, after compaction
+        bool: Whether it was compacted
+    """
+    history = serialize_history(chat)
+    compacted = compact_history(history, budget)
+    if compacted is None:
+        return history, False
+    chat.history = compacted
+    return compacted, True
+
+
+def history_bytes(history):
+    """Approximate memory held by a serialized history (UTF-8 bytes of its text)."""
+    return sum(len(text.encode("utf-8")) for turn in history for text in turn["parts"])
+
+
+class MemorySessionBackend:
+    """No persistence: sessions live only in this process's SessionManager"""
+    name = "memory"
+    persistent = False
+
+    def load(self, session_id):
+        return None
+
+    def save(self, session_id, history, version):
+        pass
+
+    def version(self, session_id):
+        return None
+
+    def delete(self, session_id):
+        pass
+
+    def load_binding(self, session_id):
+        return None
+
+    def save_binding(self, session_id, recipe_id):
+        pass
+
+
+class SQLiteSessionBackend:
+    """Stores session histories in SQLite so they survive restarts and are shared by workers"""
+    name = "sqlite"
+    persistent = True
+
+    def __init__(self, path=SESSION_DB_PATH, ttl=SESSION_TTL):
+        self.ttl = ttl
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                history TEXT NOT NULL,
+                version REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS bindings (
+                session_id TEXT PRIMARY KEY,
+                recipe_id TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+        """)
+
+    def load(self, session_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT history, version FROM sessions WHERE session_id = ? AND version > ?",
+                (session_id, time.time() - self.ttl)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def save(self, session_id, history, version):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, history, version) VALUES (?, ?, ?)",
+                (session_id, json.dumps(history), version)
+            )
+            self._conn.execute("DELETE FROM sessions WHERE version <= ?", (time.time() - self.ttl,))
+
+    def version(self, session_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def delete(self, session_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def load_binding(self, session_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT recipe_id FROM bindings WHERE session_id = ? AND updated_at > ?",
+                (session_id, time.time() - self.ttl)
+            ).fetchone()
+        return row[0] if row else None
+
+    def save_binding(self, session_id, recipe_id):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO bindings (session_id, recipe_id, updated_at) VALUES (?, ?, ?)",
+                (session_id, recipe_id, time.time())
+            )
+            self._conn.execute("DELETE FROM bindings WHERE updated_at <= ?", (time.time() - self.ttl,))
+
+
+class RedisSessionBackend:
+    """Stores session histories in Redis (or any local Redis-compatible stand-in) with a TTL"""
+    name = "redis"
+    persistent = True
+
+    def __init__(self, url=REDIS_URL, ttl=SESSION_TTL):
+        import redis  # optional dependency, only needed for this backend
+        self.ttl = int(ttl)
+        self._redis = redis.Redis.from_url(url)
+
+    def _key(self, session_id):
+        return f"recipe-chat:session:{session_id}"
+
+    def load(self, session_id):
+        data = self._redis.get(self._key(session_id))
+        if data is None:
+            return None
+        record = json.loads(data)
+        return record["history"], record["version"]
+
+    def save(self, session_id, history, version):
+        record = json.dumps({"history": history, "version": version})
+        self._redis.set(self._key(session_id), record, ex=self.ttl)
+
+    def version(self, session_id):
+        data = self._redis.get(self._key(session_id))
+        return json.loads(data)["version"] if data else None
+
+    def delete(self, session_id):
+        self._redis.delete(self._key(session_id))
+
+    def load_binding(self, session_id):
+        recipe_id = self._redis.get(self._key(session_id) + ":recipe")
+        return recipe_id.decode("utf-8") if recipe_id else None
+
+    def save_binding(self, session_id, recipe_id):
+        self._redis.set(self._key(session_id) + ":recipe", recipe_id, ex=self.ttl)
+
+
+def make_session_backend(name=SESSION_BACKEND):
+    """
+    Builds the session persistence backend named in SESSION_BACKEND.
+
+    Args:
+        name (str): "memory", "sqlite" or "redis"
+
+    Returns:
+        Session backend instance
+    """
+    if name == "sqlite":
+        return SQLiteSessionBackend()
+    if name == "redis":
+        return RedisSessionBackend()
+    if name == "memory":
+        return MemorySessionBackend()
+    raise ValueError(f"Unknown session backend: {name}")
+
+
+class SessionRecord:
+    """A live chat session plus its bookkeeping"""
+    __slots__ = ("chat", "last_access", "history_bytes", "version", "usage")
+
+    def __init__(self, chat, history_bytes=0, version=0.0):
+        self.chat = chat
+        self.last_access = time.time()
+        self.history_bytes = history_bytes
+        self.version = version
+        self.usage = TokenUsage()
+
+
+class SessionManager:
+    """
+    Holds live chat sessions with LRU/TTL eviction and a memory budget.
+
+    Sessions unused for longer than ttl are dropped, and the least recently
+    used ones are evicted when there are more than max_sessions or their
+    combined history exceeds max_history_bytes. After every turn a session's
+    history is compacted to token_budget tokens (see chat_history) and its
+    token usage is recorded. With a persistent backend, every turn is saved
+    so an evicted session, or one last used by another worker, is rebuilt
+    from its stored history on the next request.
+    """
+
+    def __init__(self, backend=None, max_sessions=SESSION_MAX, ttl=SESSION_TTL,
+                 max_history_bytes=SESSION_MAX_HISTORY_BYTES, token_budget=HISTORY_TOKEN_BUDGET):
+        self.backend = backend or MemorySessionBackend()
+        self.token_budget = token_budget
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_history_bytes = max_history_bytes
+        self._sessions = OrderedDict()
+        self._bindings = OrderedDict()  # session_id -> recipe_id
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        self._stats = {"created": 0, "restored": 0, "evicted": 0, "expired": 0, "compacted": 0}
+        self._flight = SingleFlight("session")
+
+    def __contains__(self, session_id):
+        with self._lock:
+            return session_id in self._sessions
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def bind(self, session_id, recipe_id):
+        """
+        Binds a client session to the recipe it is working on.
+
+        Args:
+            session_id (str): Client-supplied session id
+            recipe_id (str): Id of the recipe the session should use
+        """
+        with self._lock:
+            self._bindings.pop(session_id, None)
+            self._bindings[session_id] = recipe_id
+            while len(self._bindings) > self.max_sessions:
+                self._bindings.popitem(last=False)
+        self.backend.save_binding(session_id, recipe_id)
+
+    def bound_recipe(self, session_id):
+        """
+        Returns the id of the recipe a session is bound to, or None.
+
+        With a persistent backend the stored binding wins, so a recipe parsed
+        through another worker is picked up.
+        """
+        if self.backend.persistent:
+            recipe_id = self.backend.load_binding(session_id)
+            if recipe_id is not None:
+                return recipe_id
+        with self._lock:
+            return self._bindings.get(session_id)
+
+    def get_or_create(self, session_id, factory):
+        """
+        Returns the chat for a session, restoring or creating it if needed.
+
+        Concurrent calls for a session that isn't live yet share one restore
+        or factory call, so they all get the same chat.
+
+        Args:
+            session_id (str): Client-supplied session id
+            factory (callable): factory(history) -> chat; history is None for a brand new session
+
+        Returns:
+            chat session object
+        """
+        with self._lock:
+            self._expire()
+            record = self._sessions.get(session_id)
+            if record is not None:
+                self._sessions.move_to_end(session_id)
+                record.last_access = time.time()
+
+        # Another worker may have advanced this session since we last saw it
+        if record is not None and self.backend.persistent:
+            stored_version = self.backend.version(session_id)
+            if stored_version is not None and stored_version > record.version:
+                record = None
+
+        if record is not None:
+            return record.chat
+
+        # Concurrent first requests for a session share one restore or creation
+        return self._flight.do(session_id, self._restore_or_create, session_id, factory)
+
+    def _restore_or_create(self, session_id, factory):
+        stored = self.backend.load(session_id)
+        if stored is not None:
+            history, version = stored
+            chat = factory(history)
+            record = SessionRecord(chat, history_bytes(history), version)
+            record.usage.history_tokens = record.usage.peak_tokens = history_tokens(history)
+            self._insert(session_id, record)
+            self._stats["restored"] += 1
+            return chat
+
+        chat = factory(None)
+        self.put(session_id, chat)
+        self._stats["created"] += 1
+        return chat
+
+    def put(self, session_id, chat):
+        """Replaces a session's chat (e.g. after a reset) and saves it."""
+        self._insert(session_id, SessionRecord(chat))
+        self._save(session_id, None, turn=False)
+
+    def save(self, session_id, response=None):
+        """
+        Compacts and re-measures a session's history after a turn and persists it.
+
+        Call after every message sent through the session's chat.
+
+        Args:
+            session_id (str): Session id
+            response: The model's response, if the model answered the turn (for its token counts)
+        """
+        self._save(session_id, response, turn=True)
+
+    def _save(self, session_id, response, turn):
+        with self._lock:
+            record = self._sessions.get(session_id)
+        if record is None:
+            return
+        history, compacted = compact_chat(record.chat, self.token_budget)
+        size = history_bytes(history)
+        version = time.time()
+        self.backend.save(session_id, history, version)
+        with self._lock:
+            if self._sessions.get(session_id) is record:
+                self._total_bytes += size - record.history_bytes
+                record.history_bytes = size
+                record.version = version
+                record.usage.record(history_tokens(history), response, compacted, turn)
+                self._stats["compacted"] += compacted
+            self._evict()
+
+    def delete(self, session_id):
+        with self._lock:
+            record = self._sessions.pop(session_id, None)
+            if record is not None:
+                self._total_bytes -= record.history_bytes
+        self.backend.delete(session_id)
+
+    def usage(self, session_id):
+        """
+        Returns a live session's token usage, or None.
+
+        Returns:
+            dict: history tokens now and at peak, model-reported prompt and
+                reply tokens, turns, compactions and recent per-turn samples
+        """
+        with self._lock:
+            record = self._sessions.get(session_id)
+            return record.usage.to_dict() if record is not None else None
+
+    def stats(self):
+        """
+        Returns session counts and memory accounting.
+
+        Returns:
+            dict: live sessions, history bytes, limits and eviction counters
+        """
+        with self._lock:
+            self._expire()
+            stats = dict(self._stats)
+            stats.update({
+                "sessions": len(self._sessions),
+                "history_bytes": self._total_bytes,
+                "history_tokens": sum(record.usage.history_tokens for record in self._sessions.values()),
+                "token_budget": self.token_budget,
+                "max_sessions": self.max_sessions,
+                "max_history_bytes": self.max_history_bytes,
+                "ttl_sec": self.ttl,
+                "backend": self.backend.name
+            })
+        return stats
+
+    def _insert(self, session_id, record):
+        with self._lock:
+            old = self._sessions.pop(session_id, None)
+            if old is not None:
+                self._total_bytes -= old.history_bytes
+            self._sessions[session_id] = record
+            self._total_bytes += record.history_bytes
+            self._evict()
+
+    def _expire(self):
+        # Sessions are ordered by last use, so expired ones are at the front
+        cutoff = time.time() - self.ttl
+        while self._sessions:
+            session_id, record = next(iter(self._sessions.items()))
+            if record.last_access > cutoff:
+                break
+            self._sessions.popitem(last=False)
+            self._total_bytes -= record.history_bytes
+            self._stats["expired"] += 1
+
+    def _evict(self):
+        self._expire()
+        # Always keep the most recently used session, even if it alone is over budget
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > self.max_sessions or self._total_bytes > self.max_history_bytes
+        ):
+            _, record = self._sessions.popitem(last=False)
+            self._total_bytes -= record.history_bytes
+            self._stats["evicted"] += 1
@@ -0,0 +1,126 @@
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl  # POSIX only; without it lock files are skipped
+except ImportError:
+    fcntl = None
+
+# Directory for cross-worker lock files. When set, a call that isn't already
+# running in this process also takes an exclusive lock file for its key, so
+# the same URL is fetched and parsed by one worker at a time; the others then
+# find the result in the shared recipe cache. Empty (the default) disables it.
+SINGLE_FLIGHT_LOCK_DIR = os.getenv("SINGLE_FLIGHT_LOCK_DIR", "")
+
+# Every SingleFlight created, for flight_stats
+_flights = []
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into one.
+
+    The first caller for a key runs the function; callers arriving while it
+    runs wait for it and get the same result, or the same exception. Once
+    the call finishes the key is forgotten, so later calls run again (the
+    caches behind process_url and friends make those cheap).
+    """
+
+    def __init__(self, name, lock_dir=None):
+        self.name = name
+        self.lock_dir = lock_dir if fcntl is not None else None
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {"executed": 0, "shared": 0, "in_flight": 0}
+        _flights.append(self)
+
+    def do(self, key, func, *args, **kwargs):
+        """
+        Runs func(*args, **kwargs) unless a call for key is already in flight.
+
+        Args:
+            key (str): Identifies the work, e.g. a normalized URL
+            func (callable): The work to do
+
+        Returns:
+            func's result, possibly from another thread's call
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._stats["executed"] += 1
+            else:
+                self._stats["shared"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            with self._file_lock(key):
+                call.result = func(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    @contextmanager
+    def _file_lock(self, key):
+        if not self.lock_dir:
+            yield
+            return
+        name = f"{self.name}-{hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]}.lock"
+        with open(os.path.join(self.lock_dir, name), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def stats(self):
+        """
+        Returns call counters.
+
+        Returns:
+            dict: calls executed, calls that shared another's result, and calls in flight now
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._calls)
+        return stats
+
+
+def flight_stats():
+    """
+    Returns call counters for every SingleFlight, summed by name.
+
+    Returns:
+        dict: {name: {'executed': ..., 'shared': ..., 'in_flight': ...}}
+    """
+    totals = {}
+    for flight in list(_flights):
+        total = totals.setdefault(flight.name, {"executed": 0, "shared": 0, "in_flight": 0})
+        for key, value in flight.stats().items():
+            total[key] += value
+    return totals
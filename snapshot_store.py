@@ -0,0 +1,320 @@
+import gzip
+import hashlib
+import mmap
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from recipe_cache import normalize_url
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Raw HTML of fetched recipe pages, kept so a page can be parsed again without
+# the network (after a parser change, or to reproduce a slow page). Pages are
+# stored once per content hash, compressed, and indexed by normalized URL.
+SNAPSHOT_DIR = os.getenv(
+    "SNAPSHOT_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "snapshots")
+)
+# off: the network only; record: also store every page fetched (process_url and
+# batch_ingest then skip recipe-cache hits and conditional requests, so every
+# page they are asked for is fetched in full and stored);
+# replay: parse from stored pages only, never touching the network
+SNAPSHOT_MODE = os.getenv("SNAPSHOT_MODE", "off").lower()
+# zstd needs the zstandard package; gzip is always available
+SNAPSHOT_CODEC = os.getenv("SNAPSHOT_CODEC", "zstd" if zstandard is not None else "gzip").lower()
+SNAPSHOT_LEVEL = int(os.getenv("SNAPSHOT_LEVEL", 0))  # 0 for the codec's default below
+
+SNAPSHOT_MODES = ("off", "record", "replay")
+CODEC_EXTENSIONS = {"zstd": "zst", "gzip": "gz"}
+DEFAULT_LEVELS = {"zstd": 10, "gzip": 6}
+# Response headers kept with a snapshot and handed back on replay
+KEPT_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+
+class SnapshotMissing(LookupError):
+    """Replay was asked for a page that has never been recorded"""
+
+
+def _compress(codec, data, level):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def _decompress(codec, data):
+    # data may be an mmap; both decompressors read straight from the buffer
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data, wbits=31)
+
+
+class SnapshotResponse:
+    """A stored page, shaped like the requests.Response fields the parsers use"""
+    __slots__ = ("url", "content", "headers", "fetched_at")
+    status_code = 200
+    ok = True
+
+    def __init__(self, url, content, headers, fetched_at):
+        self.url = url
+        self.content = content
+        self.headers = headers
+        self.fetched_at = fetched_at
+
+
+class SnapshotStore:
+    """
+    Content-addressed, compressed store of raw recipe page HTML.
+
+    Each distinct page body is written once to objects/<ab>/<sha256>.<ext>,
+    compressed with zstd (or gzip without zstandard); URLs that served the
+    same HTML share the file. A SQLite index maps normalized URLs to the
+    hash and the headers the page came with. Pages are read back through
+    mmap, so decompression works on the page cache without an extra copy.
+    """
+
+    def __init__(self, path=SNAPSHOT_DIR, codec=SNAPSHOT_CODEC, level=SNAPSHOT_LEVEL):
+        if codec not in CODEC_EXTENSIONS:
+            raise ValueError(f"Unknown snapshot codec: {codec}")
+        if codec == "zstd" and zstandard is None:
+            raise ImportError("SNAPSHOT_CODEC=zstd needs the zstandard package")
+        self.path = path
+        self.codec = codec
+        self.level = level or DEFAULT_LEVELS[codec]
+        self._lock = threading.Lock()
+        self._stats = {"recorded": 0, "deduplicated": 0, "replayed": 0, "missing": 0}
+
+        os.makedirs(os.path.join(path, "objects"), exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(path, "index.sqlite3"), check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS snapshots (
+                url TEXT PRIMARY KEY,
+                source_url TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                codec TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                stored_size INTEGER NOT NULL,
+                content_type TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS snapshots_hash ON snapshots (content_hash);
+        """)
+
+    def _object_path(self, content_hash, codec):
+        return os.path.join(self.path, "objects", content_hash[:2], f"{content_hash}.{CODEC_EXTENSIONS[codec]}")
+
+    def _write_object(self, content_hash, codec, html):
+        # Returns the compressed size
+        data = _compress(codec, html, self.level)
+        path = self._object_path(content_hash, codec)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written under a temporary name so readers never see half a file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return len(data)
+
+    def put(self, url, html, headers=None):
+        """
+        Stores a fetched page.
+
+        Args:
+            url (str): URL the page was fetched from (normalized internally)
+            html (bytes): Raw page body
+            headers (dict): Response headers; Content-Type, ETag and Last-Modified are kept
+
+        Returns:
+            str: sha256 of the page body
+        """
+        content_hash = hashlib.sha256(html).hexdigest()
+        headers = headers or {}
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT codec, stored_size FROM snapshots WHERE content_hash = ? LIMIT 1", (content_hash,)
+            ).fetchone()
+        if row is not None and os.path.exists(self._object_path(content_hash, row[0])):
+            codec, stored_size = row
+            written = False
+        else:
+            codec, stored_size = self.codec, self._write_object(content_hash, self.codec, html)
+            written = True
+
+        key = normalize_url(url)
+        # The index update, the orphan check and deleting an orphan are one
+        # write transaction, so a put that reuses a page and a put that drops
+        # it (in this or another process) can't interleave
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if not os.path.exists(self._object_path(content_hash, codec)):
+                    # Another put dropped the page since it was looked up or written; store it again
+                    codec, stored_size = self.codec, self._write_object(content_hash, self.codec, html)
+                    written = True
+                previous = self._conn.execute(
+                    "SELECT content_hash, codec FROM snapshots WHERE url = ?", (key,)
+                ).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO snapshots (url, source_url, content_hash, codec, size, stored_size, "
+                    "content_type, etag, last_modified, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, url, content_hash, codec, len(html), stored_size,
+                     headers.get("Content-Type"), headers.get("ETag"), headers.get("Last-Modified"), time.time())
+                )
+                # The URL's old page, if it changed and no other URL serves it, is deleted
+                if previous is not None and previous[0] != content_hash:
+                    shared = self._conn.execute(
+                        "SELECT 1 FROM snapshots WHERE content_hash = ? LIMIT 1", (previous[0],)
+                    ).fetchone()
+                    if shared is None:
+                        try:
+                            os.remove(self._object_path(*previous))
+                        except FileNotFoundError:
+                            pass
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._stats["recorded" if written else "deduplicated"] += 1
+        return content_hash
+
+    def get(self, url):
+        """
+        Reads a stored page back.
+
+        Args:
+            url (str): Recipe URL (normalized internally)
+
+        Returns:
+            SnapshotResponse or None if the URL was never recorded
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_hash, codec, content_type, etag, last_modified, fetched_at "
+                "FROM snapshots WHERE url = ?", (normalize_url(url),)
+            ).fetchone()
+        if row is None:
+            self._count("missing")
+            return None
+        content_hash, codec, content_type, etag, last_modified, fetched_at = row
+        try:
+            with open(self._object_path(content_hash, codec), "rb") as f, \
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                html = _decompress(codec, data)
+        except FileNotFoundError:
+            self._count("missing")
+            return None
+        self._count("replayed")
+        headers = {
+            name: value for name, value in zip(KEPT_HEADERS, (content_type, etag, last_modified))
+            if value is not None
+        }
+        return SnapshotResponse(url, html, headers, fetched_at)
+
+    def urls(self):
+        """Returns every recorded URL, as originally fetched, in index order."""
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT source_url FROM snapshots ORDER BY url")]
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self):
+        """
+        Returns store size and counters.
+
+        Returns:
+            dict: URLs and distinct pages stored, raw and compressed bytes,
+                compression ratio, pages written (recorded), puts that reused a
+                stored page (deduplicated), and replayed/missing counts
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            urls = self._conn.execute("SELECT COUNT(*) FROM snapshots").fetchone()[0]
+            # Each distinct page counted once, however many URLs share it
+            pages, size, stored_size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(stored_size), 0) FROM "
+                "(SELECT MAX(size) AS size, MAX(stored_size) AS stored_size FROM snapshots GROUP BY content_hash)"
+            ).fetchone()
+        stats.update({
+            "urls": urls,
+            "pages": pages,
+            "bytes": size,
+            "stored_bytes": stored_size,
+            "compression_ratio": round(size / stored_size, 2) if stored_size else 0.0,
+            "codec": self.codec,
+            "path": self.path
+        })
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_snapshot_mode = SNAPSHOT_MODE if SNAPSHOT_MODE in SNAPSHOT_MODES else "off"
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_snapshot_store():
+    """
+    Returns the process-wide SnapshotStore at SNAPSHOT_DIR, creating it on first use.
+
+    Returns:
+        SnapshotStore
+    """
+    global _default_store
+    if _default_store is None:
+        with _default_store_lock:
+            if _default_store is None:
+                _default_store = SnapshotStore()
+    return _default_store
+
+
+def snapshot_mode():
+    """The current snapshot mode: "off", "record" or "replay" (SNAPSHOT_MODE by default)."""
+    return _snapshot_mode
+
+
+def set_snapshot_mode(mode):
+    """Switches snapshot mode for this process (e.g. from a CLI flag)."""
+    global _snapshot_mode
+    if mode not in SNAPSHOT_MODES:
+        raise ValueError(f"Unknown snapshot mode: {mode}")
+    _snapshot_mode = mode
+
+
+def record_page(url, response):
+    """Stores a fetched page if it is a complete 200 response."""
+    if response.status_code == 200 and response.content:
+        get_snapshot_store().put(url, response.content, response.headers)
+
+
+def replay_page(url):
+    """
+    Returns a recorded page in place of fetching it.
+
+    Args:
+        url (str): Recipe URL
+
+    Returns:
+        SnapshotResponse
+
+    Raises:
+        SnapshotMissing: if the URL has no snapshot
+    """
+    response = get_snapshot_store().get(url)
+    if response is None:
+        raise SnapshotMissing(f"No snapshot for URL: {url}")
+    return response
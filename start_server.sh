@@ -1,6 +1,13 @@
 #!/bin/bash
 
 # Start the Flask server for Recipe Chat
+# ./start_server.sh --prod runs the async API on uvicorn instead (see serve.py)
+
+if [ "$1" == "--prod" ]; then
+    shift
+    echo "Starting Recipe Chat production server..."
+    exec python3 serve.py "$@"
+fi
 
 echo "Starting Recipe Chat server..."
 echo "Server will be available at: http://localhost:5000"
@@ -0,0 +1,124 @@
+import re
+
+from data_classes import Step
+from nlp_pipeline import COOKING_METHODS, annotate_steps, process_texts, uses_model
+from quantities import parse_ingredient
+
+# Verbs that start an instruction without being a cooking method themselves
+INSTRUCTION_VERBS = {"let", "allow", "make", "set", "use", "repeat", "return", "keep", "check", "adjust", "position"}
+METHOD_NAMES = '|'.join(sorted(COOKING_METHODS, key=len, reverse=True))
+ACTION_NAMES = '|'.join(sorted(COOKING_METHODS | INSTRUCTION_VERBS, key=len, reverse=True))
+# Sentence ends: ". " / "! " / "? " before a capital letter, and semicolons before
+# a cooking verb ("; drain"). "1.5 cups" and "(175 degrees C)." don't match.
+SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+(?=[A-Z(])|\s*;\s*(?=(?i:' + METHOD_NAMES + r')\b)')
+# Explicit sequencing inside a sentence: "..., then mix", "... and then let cool". "Add the eggs,
+# then vanilla" lists what to add, so the word after "then" must be a verb.
+THEN_BREAK = re.compile(r'\s*(?:,\s*(?:and\s+)?then|\band\s+then|\bthen)\s+(?=(?:' + ACTION_NAMES + r')\b)',
+                        re.IGNORECASE)
+# ", and stir in ..." starts a new action when the next word is a cooking verb
+METHOD_BREAK = re.compile(r',\s+and\s+(?=(?:' + METHOD_NAMES + r')\b)', re.IGNORECASE)
+# Fragments this short ("drain", "serve") are still steps; shorter than this they are noise
+MIN_STEP_LENGTH = 3
+# Coordinated verbs only start a new step when they bring their own object or phrase
+ACTION_DEPENDENCIES = {"dobj", "obj", "prep", "advmod", "advcl", "npadvmod", "xcomp"}
+
+
+def _clean(text):
+    text = text.strip(" ,;:-\n\t")
+    if not text:
+        return text
+    text = text[0].upper() + text[1:]
+    if text[-1] not in ".!?)":
+        text += "."
+    return text
+
+
+def _split_sentence(sentence):
+    # Rule-based split on "then" and ", and <method>"
+    parts = []
+    for part in THEN_BREAK.split(sentence):
+        parts.extend(METHOD_BREAK.split(part))
+    return parts
+
+
+def _split_on_parse(doc):
+    """
+    Splits a parsed sentence at verbs coordinated with the root ("Drain the pasta and toss it with the sauce").
+
+    "Cook and stir until browned" stays one step: the first verb has no
+    phrase of its own, so the two verbs describe one action.
+    """
+    starts = []
+    for token in doc:
+        if token.dep_ != "conj" or token.pos_ != "VERB" or token.head.dep_ != "ROOT":
+            continue
+        if not any(child.dep_ in ACTION_DEPENDENCIES for child in token.children):
+            continue
+        if not any(child.dep_ in ACTION_DEPENDENCIES and child.i < token.i for child in token.head.children):
+            continue
+        start = token.i
+        # Take the "and" / "," in front of the verb out of both halves
+        while start > 0 and (doc[start - 1].dep_ == "cc" or doc[start - 1].is_punct):
+            start -= 1
+        starts.append((start, token.i))
+    if not starts:
+        return [doc.text]
+    parts = []
+    previous = 0
+    for start, verb in starts:
+        parts.append(doc[previous:start].text)
+        previous = verb
+    parts.append(doc[previous:].text)
+    return parts
+
+
+def atomize_steps(instructions):
+    """
+    Splits instructions into atomic steps, one action each, without a model call.
+
+    Instructions are split into sentences, then on explicit sequencing
+    ("then", ", and <cooking verb>") and, when the spaCy model is installed,
+    at verbs coordinated with the sentence's main verb. The result depends
+    only on the text, so every session sees the same numbering.
+
+    Args:
+        instructions (list): Instruction strings
+
+    Returns:
+        list: Atomic step strings, in order
+    """
+    fragments = []
+    for instruction in instructions:
+        for sentence in SENTENCE_BREAK.split(instruction):
+            fragments.extend(_split_sentence(sentence))
+    fragments = [fragment for fragment in (fragment.strip() for fragment in fragments) if fragment]
+
+    if uses_model():
+        parsed = []
+        for doc in process_texts(fragments):
+            parsed.extend(_split_on_parse(doc))
+        fragments = parsed
+
+    steps = [_clean(fragment) for fragment in fragments]
+    return [step for step in steps if len(step.rstrip(".!?")) >= MIN_STEP_LENGTH]
+
+
+def parse_instructions(steps, ingredients):
+    """
+    Turns atomic step strings into Step objects.
+
+    Methods, tools, time, temperature and the recipe ingredients each step
+    uses are filled in by nlp_pipeline.annotate_steps.
+
+    Args:
+        steps (list): Atomic step strings, from atomize_steps
+        ingredients (list): The recipe's ingredient strings
+
+    Returns:
+        list: Step objects numbered from 1
+    """
+    names = [parse_ingredient(ingredient).name for ingredient in ingredients]
+    return annotate_steps(
+        [Step(number, text) for number, text in enumerate(steps, 1)],
+        [name for name in names if name]
+    )
@@ -0,0 +1,98 @@
+import html
+import json
+import re
+
+# Matches the body of every <script type="application/ld+json"> block. Running this
+# regex over the raw bytes is far cheaper than building a DOM for the whole page.
+LD_JSON_SCRIPT = re.compile(
+    rb'<script\b[^>]*?\btype\s*=\s*["\']?application/ld\+json["\']?[^>]*>(.*?)</script\s*>',
+    re.IGNORECASE | re.DOTALL
+)
+TAG = re.compile(r'<[^>]+>')
+WHITESPACE = re.compile(r'\s+')
+
+
+def clean_text(text):
+    """Unescapes HTML entities, strips inline tags and collapses whitespace."""
+    text = TAG.sub(' ', html.unescape(text))
+    return WHITESPACE.sub(' ', text).strip()
+
+
+def iter_recipe_nodes(data):
+    """
+    Yields every schema.org Recipe object in a parsed JSON-LD document.
+
+    Handles top-level lists, "@graph" containers and Recipes nested as a
+    page's "mainEntity", and "@type" given either as a string or a list.
+    """
+    if isinstance(data, list):
+        for item in data:
+            yield from iter_recipe_nodes(item)
+    elif isinstance(data, dict):
+        node_type = data.get("@type")
+        types = node_type if isinstance(node_type, list) else [node_type]
+        if "Recipe" in types:
+            yield data
+        for key in ("@graph", "mainEntity", "mainEntityOfPage"):
+            if key in data:
+                yield from iter_recipe_nodes(data[key])
+
+
+def instruction_texts(instructions):
+    """
+    Flattens schema.org recipeInstructions into a list of step strings.
+
+    Accepts a single string (one step per line), a list of strings, HowToStep
+    objects, and HowToSection objects wrapping further steps.
+    """
+    if isinstance(instructions, str):
+        return [text for text in (clean_text(line) for line in instructions.splitlines()) if text]
+    if isinstance(instructions, dict):
+        if "itemListElement" in instructions:
+            return instruction_texts(instructions["itemListElement"])
+        return instruction_texts(instructions.get("text") or instructions.get("name") or "")
+    steps = []
+    if isinstance(instructions, list):
+        for item in instructions:
+            steps.extend(instruction_texts(item))
+    return steps
+
+
+def extract_jsonld_recipe(html_content):
+    """
+    Reads ingredients and instructions from a page's schema.org Recipe JSON-LD, if it has one.
+
+    Only the ld+json script blocks are scanned; no DOM is built.
+
+    Args:
+        html_content (bytes or str): Raw HTML of the recipe page
+
+    Returns:
+        dict: {"ingredients": [...], "instructions": [...]}, or None if the page
+        has no Recipe block with both ingredients and instructions
+    """
+    if isinstance(html_content, str):
+        html_content = html_content.encode("utf-8")
+
+    for match in LD_JSON_SCRIPT.finditer(html_content):
+        raw = match.group(1).strip()
+        # Some CMSes wrap the JSON in an HTML comment or CDATA section
+        for wrapper in (b'<!--', b'-->', b'<![CDATA[', b']]>'):
+            raw = raw.replace(wrapper, b'')
+        try:
+            data = json.loads(raw.decode("utf-8", errors="replace"), strict=False)
+        except ValueError:
+            continue
+
+        for recipe in iter_recipe_nodes(data):
+            ingredients = recipe.get("recipeIngredient") or recipe.get("ingredients") or []
+            if isinstance(ingredients, str):
+                ingredients = [ingredients]
+            ingredients = [text for text in (clean_text(item) for item in ingredients if isinstance(item, str)) if text]
+            instructions = instruction_texts(recipe.get("recipeInstructions") or [])
+            if ingredients and instructions:
+                return {
+                    "ingredients": ingredients,
+                    "instructions": instructions
+                }
+    return None
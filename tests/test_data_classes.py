@@ -0,0 +1,50 @@
+"""
+Round trips through the binary recipe format (recipe_to_bytes / recipe_from_bytes).
+
+    python -m pytest tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_classes import Ingredient, Step, recipe_from_bytes, recipe_to_bytes  # noqa: E402
+
+
+class RecipeBytesTest(unittest.TestCase):
+    def round_trip(self, ingredients, steps=()):
+        url, decoded_ingredients, decoded_steps = recipe_from_bytes(
+            recipe_to_bytes("https://www.allrecipes.com/recipe/1/", ingredients, list(steps)))
+        self.assertEqual(url, "https://www.allrecipes.com/recipe/1/")
+        return decoded_ingredients, decoded_steps
+
+    def test_raw_string_quantities(self):
+        ingredients = [
+            Ingredient("sugar", "½", "cup"),
+            Ingredient("flour", "1 1/2", "cups", quantity_max="2"),
+            Ingredient("salt", "a pinch", None, note="to taste"),
+        ]
+        decoded, _ = self.round_trip(ingredients)
+        self.assertEqual([i.to_dict() for i in decoded], [
+            {"name": "sugar", "quantity": "½", "measurement_unit": "cup", "quantity_max": None, "size": "", "note": ""},
+            {"name": "flour", "quantity": "1 1/2", "measurement_unit": "cups", "quantity_max": "2", "size": "",
+             "note": ""},
+            {"name": "salt", "quantity": "a pinch", "measurement_unit": "", "quantity_max": None, "size": "",
+             "note": "to taste"},
+        ])
+
+    def test_numeric_and_missing_quantities(self):
+        decoded, _ = self.round_trip([Ingredient("eggs", 2, None), Ingredient("water", 1.5, "cups", 2.0),
+                                      Ingredient("pepper", None, None)])
+        self.assertEqual([(i.quantity, i.quantity_max) for i in decoded], [(2.0, None), (1.5, 2.0), (None, None)])
+
+    def test_steps(self):
+        steps = [Step(1, "Preheat the oven to 350°F.", tools=["oven"], temperature="350°F"),
+                 Step(2, "Bake for 20 minutes.", ingredients=["batter"], time={"duration": "20 minutes"})]
+        _, decoded = self.round_trip([], steps)
+        self.assertEqual([step.to_dict() for step in decoded], [step.to_dict() for step in steps])
+
+
+if __name__ == "__main__":
+    unittest.main()
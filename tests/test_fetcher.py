@@ -0,0 +1,123 @@
+"""
+Fetcher against a local stub HTTP server: retries, Retry-After cap,
+read timeout and the per-host concurrency limit.
+
+    python -m pytest tests
+"""
+import os
+import sys
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fetcher import Fetcher  # noqa: E402
+
+
+class StubServer:
+    """
+    Serves scripted responses on 127.0.0.1.
+
+    Each path maps to a list of (status, headers, delay) replies used in turn;
+    the last one repeats. Counts requests and the most in flight at once.
+    """
+
+    def __init__(self, routes):
+        self.routes = routes
+        self.hits = {}
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stub.lock:
+                    count = stub.hits.get(self.path, 0)
+                    stub.hits[self.path] = count + 1
+                    stub.active += 1
+                    stub.max_active = max(stub.max_active, stub.active)
+                replies = stub.routes[self.path]
+                status, headers, delay = replies[min(count, len(replies) - 1)]
+                try:
+                    time.sleep(delay)
+                    body = b"<html>ok</html>"
+                    self.send_response(status)
+                    for name, value in headers.items():
+                        self.send_header(name, value)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    with stub.lock:
+                        stub.active -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FetcherTest(unittest.TestCase):
+    def serve(self, routes):
+        server = StubServer(routes)
+        self.addCleanup(server.close)
+        return server
+
+    def fetcher(self, **kwargs):
+        kwargs.setdefault("backoff_factor", 0)
+        fetcher = Fetcher(**kwargs)
+        self.addCleanup(fetcher.close)
+        return fetcher
+
+    def test_retries_server_errors(self):
+        server = self.serve({"/page": [(503, {}, 0), (500, {}, 0), (200, {}, 0)]})
+        response = self.fetcher(max_retries=3).fetch(server.url + "/page")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(server.hits["/page"], 3)
+
+    def test_gives_up_after_max_retries(self):
+        server = self.serve({"/page": [(503, {}, 0)]})
+        response = self.fetcher(max_retries=2).fetch(server.url + "/page")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(server.hits["/page"], 3)
+
+    def test_retry_after_is_capped(self):
+        server = self.serve({"/page": [(429, {"Retry-After": "3600"}, 0), (200, {}, 0)]})
+        start = time.monotonic()
+        response = self.fetcher(max_retries=2, max_retry_after=0.2).fetch(server.url + "/page")
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(time.monotonic() - start, 2)
+
+    def test_read_timeout(self):
+        server = self.serve({"/slow": [(200, {}, 1.0)]})
+        start = time.monotonic()
+        with self.assertRaises(requests.RequestException):
+            self.fetcher(max_retries=0, read_timeout=0.2).fetch(server.url + "/slow")
+        self.assertLess(time.monotonic() - start, 1.0)
+
+    def test_per_host_limit(self):
+        server = self.serve({"/page": [(200, {}, 0.2)]})
+        fetcher = self.fetcher(max_per_host=2)
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            statuses = list(pool.map(lambda _: fetcher.fetch(server.url + "/page").status_code, range(6)))
+        self.assertEqual(statuses, [200] * 6)
+        self.assertEqual(server.max_active, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+"""
+Recipes indexed before the first search: uncached ones are held for the
+index, but only up to SEARCH_PENDING_MAX, so memory stays bounded.
+
+    python -m pytest tests
+"""
+import os
+import sys
+import tracemalloc
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import recipe_index  # noqa: E402
+
+
+def make_recipe(n):
+    return {
+        "ingredients": [f"{n} cups flour", "2 eggs", "1 teaspoon salt"],
+        "instructions": [f"Bake recipe {n} at 350°F for 20 minutes.", "Let it cool."],
+        "steps": [{"step_number": 1, "description": f"Bake recipe {n}."}]
+    }
+
+
+class PendingRecipesTest(unittest.TestCase):
+    def setUp(self):
+        patches = [
+            mock.patch.object(recipe_index, "_default_index", None),
+            mock.patch.object(recipe_index, "_pending", recipe_index.OrderedDict()),
+            mock.patch.object(recipe_index, "SEARCH_PENDING_MAX", 50),
+            # Built from no recipe cache, so only the pending recipes are indexed
+            mock.patch.object(recipe_index, "get_recipe_cache", lambda: None),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_pending_recipes_are_capped(self):
+        for n in range(500):
+            recipe_index.index_recipe(make_recipe(n), f"https://www.allrecipes.com/recipe/{n}/")
+        self.assertEqual(len(recipe_index._pending), 50)
+
+        index = recipe_index.get_recipe_index()
+        self.assertEqual(len(index), 50)
+        self.assertEqual(len(recipe_index._pending), 0)
+        newest = recipe_index.recipe_hash(make_recipe(499))
+        oldest = recipe_index.recipe_hash(make_recipe(0))
+        self.assertIn(newest, index)
+        self.assertNotIn(oldest, index)
+
+    def test_cached_recipes_are_not_held(self):
+        recipe_index.index_recipe(make_recipe(1), cached=True)
+        self.assertEqual(len(recipe_index._pending), 0)
+
+    def test_memory_stays_bounded(self):
+        tracemalloc.start()
+        self.addCleanup(tracemalloc.stop)
+        for n in range(200):
+            recipe_index.index_recipe(make_recipe(n))
+        held = tracemalloc.get_traced_memory()[0]
+        for n in range(200, 5000):
+            recipe_index.index_recipe(make_recipe(n))
+        self.assertLess(tracemalloc.get_traced_memory()[0], held * 1.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
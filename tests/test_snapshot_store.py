@@ -0,0 +1,98 @@
+"""
+SnapshotStore: deduplication, deleting pages no URL uses any more, and
+concurrent puts that share and drop the same page.
+
+    python -m pytest tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import snapshot_store  # noqa: E402
+from recipe_cache import normalize_url  # noqa: E402
+from snapshot_store import SnapshotStore  # noqa: E402
+
+
+class SnapshotStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path, True)
+        self.store = SnapshotStore(self.path, codec="gzip")
+        self.addCleanup(self.store.close)
+
+    def objects(self):
+        return sorted(name for _, _, names in os.walk(os.path.join(self.path, "objects")) for name in names)
+
+    def test_deduplicates_and_counts_written_pages(self):
+        self.store.put("https://www.allrecipes.com/recipe/1/", b"<html>one</html>")
+        self.store.put("https://www.allrecipes.com/recipe/2/", b"<html>one</html>")
+        stats = self.store.stats()
+        self.assertEqual((stats["recorded"], stats["deduplicated"], stats["urls"], stats["pages"]), (1, 1, 2, 1))
+        self.assertEqual(len(self.objects()), 1)
+
+    def test_rerecording_deletes_unused_pages(self):
+        self.store.put("https://www.allrecipes.com/recipe/1/", b"<html>one</html>")
+        self.store.put("https://www.allrecipes.com/recipe/2/", b"<html>one</html>")
+        self.store.put("https://www.allrecipes.com/recipe/1/", b"<html>two</html>")
+        # Still used by recipe 2
+        self.assertEqual(len(self.objects()), 2)
+        self.store.put("https://www.allrecipes.com/recipe/2/", b"<html>three</html>")
+        self.assertEqual(len(self.objects()), 2)
+        self.assertEqual(self.store.get("https://www.allrecipes.com/recipe/1/").content, b"<html>two</html>")
+        self.assertEqual(self.store.get("https://www.allrecipes.com/recipe/2/").content, b"<html>three</html>")
+
+    def test_reused_page_dropped_mid_put(self):
+        # A put that finds a page already stored, while another put re-records
+        # the only URL using that page and so drops it
+        self.store.put("https://www.allrecipes.com/recipe/1/", b"<html>one</html>")
+        slow = threading.Event()
+        dropped = threading.Event()
+
+        def normalize(url):
+            # Runs between the lookup and the index update
+            if slow.is_set():
+                slow.clear()
+                self.store.put("https://www.allrecipes.com/recipe/1/", b"<html>two</html>")
+                dropped.set()
+            return normalize_url(url)
+
+        slow.set()
+        with mock.patch.object(snapshot_store, "normalize_url", normalize):
+            self.store.put("https://www.allrecipes.com/recipe/2/", b"<html>one</html>")
+        self.assertTrue(dropped.is_set())
+        self.assertEqual(self.store.get("https://www.allrecipes.com/recipe/2/").content, b"<html>one</html>")
+        self.assertEqual(self.store.get("https://www.allrecipes.com/recipe/1/").content, b"<html>two</html>")
+
+    def test_concurrent_puts_never_lose_a_page(self):
+        # One thread re-records a URL onto a new page each time, dropping the
+        # last one, while another records new URLs with the page being dropped
+        pages = [f"<html>{n}</html>".encode() for n in range(201)]
+        barrier = threading.Barrier(2)
+
+        def rerecord():
+            for n in range(200):
+                self.store.put("https://www.allrecipes.com/recipe/0/", pages[n])
+                barrier.wait()
+                self.store.put("https://www.allrecipes.com/recipe/0/", pages[n + 1])
+
+        def record():
+            for n in range(200):
+                barrier.wait()
+                self.store.put(f"https://www.allrecipes.com/recipe/{n + 1}/", pages[n])
+
+        threads = [threading.Thread(target=rerecord), threading.Thread(target=record)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for url in self.store.urls():
+            self.assertIsNotNone(self.store.get(url), url)
+
+if __name__ == "__main__":
+    unittest.main()